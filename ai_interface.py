@@ -1,8 +1,15 @@
 # ai_interface.py (最终版 - 完全不打印Qwen思考过程 + 颜色日志)
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterator
+from urllib.parse import urlsplit
 import traceback # 移到顶部
 
 # 假设 terminal_colors.py 在项目根目录或者Python可以找到的路径下
@@ -25,13 +32,30 @@ except ImportError:
     def grey(text: str) -> str: return text
     def bold(text: str) -> str: return text
 
+import game_config
 from game_config import DEFAULT_API_ENDPOINT, DEFAULT_API_KEY, DEFAULT_MODEL_NAME
 from response_parser import parse_ai_response # 仍然需要它来处理其他模型的<think>标签或做通用清理
+from llm_response_cache import get_llm_cache, make_cache_key
+from ai_resilience import (
+    ApiCallError, get_circuit_breaker, get_endpoint_health, get_latency_tracker, is_endpoint_failure, parse_retry_after,
+    API_ERROR_TIMEOUT, API_ERROR_CONNECTION, API_ERROR_RATE_LIMITED, API_ERROR_SERVER, API_ERROR_CLIENT,
+    API_ERROR_BAD_RESPONSE, API_ERROR_CIRCUIT_OPEN, API_ERROR_REPLAY_MISS, API_ERROR_UNKNOWN
+)
+from game_logger import LogMessage, is_log_enabled, resolve_log_message, emit_log_line
 
 MODULE_COLOR = Colors.BLUE # AIComms 用蓝色
 
-def _log_ai_comms(message: str, level: str = "INFO", player_config_name: Optional[str] = None):
+# 按端点 (scheme://host:port) 缓存的 requests.Session，所有玩家和回合共享同一连接池
+_http_sessions: Dict[str, requests.Session] = {}
+_http_sessions_lock = threading.Lock()
+# 对 response_format 返回 400 的端点，之后的请求不再附带该字段
+_endpoints_without_response_format: set = set()
+
+def _log_ai_comms(message: LogMessage, level: str = "INFO", player_config_name: Optional[str] = None):
     """AI通信模块的日志记录器。"""
+    if not is_log_enabled(level):
+        return
+    message = resolve_log_message(message)
     level_colored = colorize(level, log_level_color(level))
     prefix_module = colorize("[AIComms:", MODULE_COLOR)
 
@@ -40,7 +64,44 @@ def _log_ai_comms(message: str, level: str = "INFO", player_config_name: Optiona
         p_name_colored = colorize(player_config_name, Colors.BRIGHT_MAGENTA) # AI玩家名用亮品红
         prefix += f" ({p_name_colored})"
     
-    print(f"{prefix} {message}")
+    emit_log_line(f"{prefix} {message}")
+
+def _endpoint_pool_key(endpoint: str) -> str:
+    """同一 scheme://host:port 下的不同路径共用一个连接池。"""
+    parts = urlsplit(endpoint)
+    return f"{parts.scheme}://{parts.netloc}" if parts.netloc else endpoint
+
+def _get_pooled_session(endpoint: str) -> requests.Session:
+    """获取(必要时创建)该端点的共享会话，使多次调用复用 TCP/TLS 连接。"""
+    pool_key = _endpoint_pool_key(endpoint)
+    with _http_sessions_lock:
+        session = _http_sessions.get(pool_key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=game_config.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=game_config.HTTP_POOL_MAXSIZE
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if not game_config.HTTP_KEEP_ALIVE:
+                session.headers["Connection"] = "close"
+            _http_sessions[pool_key] = session
+            _log_ai_comms(f"为端点 {colorize(pool_key, Colors.BLUE)} 创建了连接池 (maxsize={game_config.HTTP_POOL_MAXSIZE})。", "DEBUG")
+        return session
+
+def close_all_http_sessions() -> None:
+    """关闭所有端点的连接池。游戏循环结束时调用；之后的调用会按需重新建立连接池。"""
+    with _http_sessions_lock:
+        sessions = list(_http_sessions.items())
+        _http_sessions.clear()
+    for pool_key, session in sessions:
+        try:
+            session.close()
+        except Exception as e_close:
+            _log_ai_comms(colorize(f"关闭端点 {pool_key} 的连接池时出错: {e_close}", Colors.YELLOW), "WARN")
+    if sessions:
+        _log_ai_comms(f"已关闭 {bold(str(len(sessions)))} 个端点连接池。", "DEBUG")
 
 def make_api_call_to_ai(
     player_config_name: str,
@@ -50,17 +111,124 @@ def make_api_call_to_ai(
     model_name: Optional[str] = None,
     response_handler_type: str = "standard",
     player_display_name_for_parser: str = "AI玩家",
-    timeout_seconds: int = 180
+    timeout_seconds: Optional[float] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    early_stop: Optional[Callable[[str], Optional[int]]] = None,
+    generation_params: Optional[Dict[str, Any]] = None,
+    action_type: Optional[str] = None
 ) -> Tuple[Optional[str], Optional[str]]:
     """
     向指定的AI API发送请求，并根据handler_type处理响应。
     对于 "qwen_stream_with_thinking"，会直接解析SSE并分离思考与回答，不打印思考过程。
     对于其他类型，会依赖 parse_ai_response进行处理。
+    response_format: 原样放入请求体的 OpenAI 兼容约束输出 (例如 JSON Schema)；端点拒绝 (HTTP 400) 时自动去掉重试一次。
+    on_token: 提供且处理器在 STREAMING_RESPONSE_HANDLERS 中时以SSE请求，每收到一段回答正文(不含思考内容)就回调一次；
+              返回值仍是完整的回答。回放录制结果时整段回答回调一次。
+    early_stop: 同样以SSE请求，每收到一段回答后以目前的全部回答调用；返回整数时立即断开连接 (服务端随之停止生成)，
+                回答截断为该长度。录制的是截断后的回答。
+    generation_params: 原样放入请求体的生成参数 (max_tokens、stop、temperature、enable_thinking 等，见 game_config.ACTION_GENERATION_PROFILES)。
+    timeout_seconds: 缺省时按 (端点, 模型, action_type) 的历史耗时自适应 (见 ai_resilience.LatencyTracker)；每次请求的耗时都会记入统计。
+    启用了 LLM_CACHE_MODE 时，先经过录制/回放层 (见 llm_response_cache)。
+    实际的网络请求经过端点的熔断器 (见 ai_resilience)；返回的错误信息是带有错误类别的 ApiCallError。
     """
     endpoint_to_use = api_endpoint or DEFAULT_API_ENDPOINT
-    key_to_use = api_key if api_key is not None else DEFAULT_API_KEY
     model_to_use = model_name or DEFAULT_MODEL_NAME
 
+    cache = get_llm_cache()
+    if cache is None:
+        return _request_through_circuit_breaker(player_config_name, messages, endpoint_to_use, model_to_use, action_type, timeout_seconds,
+                                    api_key, response_handler_type, player_display_name_for_parser, response_format, on_token,
+                                    early_stop, generation_params)
+
+    cache_key = make_cache_key(model_to_use, endpoint_to_use, messages, response_handler_type, response_format, generation_params)
+    if cache.reads_enabled:
+        cached_text = cache.lookup(cache_key)
+        if cached_text is not None:
+            _log_ai_comms(f"回放录制的响应 (key {grey(cache_key[:12])})。", "DEBUG", player_config_name)
+            if on_token is not None:
+                on_token(cached_text)
+            return cached_text, None
+        if not cache.writes_enabled:
+            _log_ai_comms(colorize(f"回放缓存未命中 (key {cache_key[:12]})，replay 模式下不访问网络。", Colors.YELLOW), "WARN", player_config_name)
+            return None, ApiCallError(f"LLM回放缓存未命中 (key {cache_key[:12]})", API_ERROR_REPLAY_MISS)
+
+    response_text, api_error_message = _request_through_circuit_breaker(player_config_name, messages, endpoint_to_use, model_to_use,
+                                                            action_type, timeout_seconds, api_key, response_handler_type,
+                                                            player_display_name_for_parser, response_format, on_token, early_stop,
+                                                            generation_params)
+    if response_text is not None and not api_error_message and cache.writes_enabled:
+        try:
+            cache.store(cache_key, model_to_use, endpoint_to_use, response_handler_type, messages, response_text)
+        except OSError as e_store:
+            _log_ai_comms(colorize(f"录制响应失败: {e_store}", Colors.YELLOW), "WARN", player_config_name)
+    return response_text, api_error_message
+
+
+def get_endpoint_status(api_endpoint: Optional[str]) -> Optional[Dict[str, Any]]:
+    """端点的熔断状态 (见 ai_resilience.CircuitBreaker.health)；该端点还没有发出过请求时返回 None。"""
+    return get_endpoint_health().get(_endpoint_pool_key(api_endpoint or DEFAULT_API_ENDPOINT))
+
+
+def _request_through_circuit_breaker(
+    player_config_name: str,
+    messages: List[Dict[str, str]],
+    endpoint_to_use: str,
+    model_to_use: str,
+    action_type: Optional[str],
+    timeout_seconds: Optional[float],
+    api_key: Optional[str],
+    response_handler_type: str,
+    player_display_name_for_parser: str,
+    *request_args: Any
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    端点熔断时立即返回 circuit_open 错误，否则发出请求并把结果记入熔断器。
+    请求耗时记入 (端点, 模型, 行动类型) 的耗时统计；超时的请求以当时的超时作为删失样本记入，连接失败等不记。
+    """
+    breaker = get_circuit_breaker(_endpoint_pool_key(endpoint_to_use))
+    if not breaker.allow_request():
+        return None, ApiCallError(
+            f"端点 {breaker.endpoint} 熔断中 (连续失败 {breaker.consecutive_failures} 次)，{breaker.retry_in():.0f}s 后再试探",
+            API_ERROR_CIRCUIT_OPEN
+        )
+    latency_tracker = get_latency_tracker()
+    latency_key = (_endpoint_pool_key(endpoint_to_use), model_to_use, action_type or "other")
+    timeout_to_use = timeout_seconds if timeout_seconds is not None else latency_tracker.timeout_for(latency_key)
+    started_at = time.monotonic()
+    response_text, api_error_message = _request_ai_response(player_config_name, messages, endpoint_to_use, api_key, model_to_use,
+                                                            response_handler_type, player_display_name_for_parser, timeout_to_use,
+                                                            *request_args)
+    error_kind = getattr(api_error_message, "kind", None)
+    if error_kind == API_ERROR_TIMEOUT:
+        latency_tracker.record(latency_key, timeout_to_use, censored=True)
+    elif not api_error_message or error_kind == API_ERROR_BAD_RESPONSE: # 收到了完整响应
+        latency_tracker.record(latency_key, time.monotonic() - started_at)
+    if api_error_message and is_endpoint_failure(api_error_message):
+        if breaker.record_failure():
+            _log_ai_comms(colorize(f"端点 {breaker.endpoint} 连续失败 {breaker.consecutive_failures} 次，熔断 {breaker.cooldown_seconds:.0f}s。", Colors.RED), "WARN", player_config_name)
+    elif breaker.record_success():
+        _log_ai_comms(colorize(f"端点 {breaker.endpoint} 已恢复。", Colors.GREEN), "INFO", player_config_name)
+    return response_text, api_error_message
+
+
+def _request_ai_response(
+    player_config_name: str,
+    messages: List[Dict[str, str]],
+    endpoint_to_use: str,
+    api_key: Optional[str],
+    model_to_use: str,
+    response_handler_type: str,
+    player_display_name_for_parser: str,
+    timeout_seconds: float,
+    response_format: Optional[Dict[str, Any]] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    early_stop: Optional[Callable[[str], Optional[int]]] = None,
+    generation_params: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[str], Optional[str]]:
+    """实际发出HTTP请求并解析响应 (不经过录制/回放层)。"""
+    key_to_use = api_key if api_key is not None else DEFAULT_API_KEY
+
     headers = {
         "Content-Type": "application/json",
     }
@@ -71,13 +239,21 @@ def make_api_call_to_ai(
         "model": model_to_use,
         "messages": messages,
     }
+    if response_format is not None and _endpoint_pool_key(endpoint_to_use) not in _endpoints_without_response_format:
+        payload["response_format"] = response_format
 
     is_qwen_deep_think_stream = response_handler_type == "qwen_stream_with_thinking"
+    is_token_stream = (on_token is not None or early_stop is not None) and not is_qwen_deep_think_stream and \
+        response_handler_type in game_config.STREAMING_RESPONSE_HANDLERS
     
     if is_qwen_deep_think_stream:
         payload["stream"] = True
         payload["enable_thinking"] = True
         _log_ai_comms(f"为Qwen深度思考流启用了 '{green('enable_thinking: True')}' (顶层参数)。", "DEBUG", player_config_name)
+    elif is_token_stream:
+        payload["stream"] = True
+    if generation_params:
+        payload.update(generation_params) # 可以覆盖上面的 enable_thinking
     
     _log_ai_comms(
         f"向模型 '{colorize(model_to_use, Colors.CYAN)}' @ '{colorize(endpoint_to_use, Colors.BLUE)}' 发送请求. "
@@ -85,10 +261,11 @@ def make_api_call_to_ai(
         "DEBUG", player_config_name
     )
     if messages:
-        _log_ai_comms(f"最后消息预览 (user prompt): {grey(messages[-1]['content'][:150])}{grey('...') if len(messages[-1]['content']) > 150 else ''}", "TRACE", player_config_name)
+        _log_ai_comms(lambda: f"最后消息预览 (user prompt): {grey(messages[-1]['content'][:150])}{grey('...') if len(messages[-1]['content']) > 150 else ''}", "TRACE", player_config_name)
 
+    response_obj = None
     try:
-        response_obj = requests.post( # Renamed to response_obj to avoid conflict with 'response' in except block
+        response_obj = _get_pooled_session(endpoint_to_use).post( # Renamed to response_obj to avoid conflict with 'response' in except block
             endpoint_to_use,
             headers=headers,
             json=payload,
@@ -99,6 +276,7 @@ def make_api_call_to_ai(
 
         final_ai_output_text: Optional[str] = None
         api_call_error_message: Optional[str] = None
+        finish_reasons: List[str] = []
 
         if is_qwen_deep_think_stream:
             qwen_reasoning_content_parts = []
@@ -107,34 +285,23 @@ def make_api_call_to_ai(
 
             _log_ai_comms(colorize("开始接收Qwen SSE深度思考流...", Colors.GREEN), "DEBUG", player_config_name)
             
-            for line_bytes in response_obj.iter_lines():
-                if line_bytes:
-                    decoded_line = line_bytes.decode('utf-8', errors='replace').strip()
-                    if decoded_line.startswith("data:"):
-                        json_data_string = decoded_line[len("data:"):].strip()
-                        if json_data_string == "[DONE]":
-                            _log_ai_comms(colorize("Qwen SSE流结束标记 [DONE] 收到。", Colors.GREEN), "DEBUG", player_config_name)
+            for delta in _iter_sse_deltas(response_obj, player_config_name, finish_reasons):
+                current_reasoning_chunk = delta.get("reasoning_content")
+                if current_reasoning_chunk is not None:
+                    qwen_reasoning_content_parts.append(str(current_reasoning_chunk))
+                current_answer_chunk = delta.get("content")
+                if current_answer_chunk is not None:
+                    if not is_qwen_answering_started and str(current_answer_chunk).strip():
+                        _log_ai_comms(colorize("Qwen开始正式回复...", Colors.CYAN), "DEBUG", player_config_name)
+                        is_qwen_answering_started = True
+                    qwen_answer_content_parts.append(str(current_answer_chunk))
+                    if on_token is not None and current_answer_chunk:
+                        on_token(str(current_answer_chunk))
+                    if early_stop is not None and current_answer_chunk:
+                        decided_answer = _decided_answer_prefix(early_stop, qwen_answer_content_parts, player_config_name)
+                        if decided_answer is not None:
+                            qwen_answer_content_parts = [decided_answer]
                             break
-                        if not json_data_string: continue
-                        try:
-                            chunk = json.loads(json_data_string)
-                            if not chunk.get("choices"):
-                                if chunk.get("usage"):
-                                    _log_ai_comms(f"Qwen Usage data received: {colorize(str(chunk['usage']), Colors.BRIGHT_BLACK)}", "DEBUG", player_config_name)
-                                continue
-                            delta = chunk.get("choices", [{}])[0].get("delta", {})
-                            current_reasoning_chunk = delta.get("reasoning_content")
-                            if current_reasoning_chunk is not None:
-                                qwen_reasoning_content_parts.append(str(current_reasoning_chunk))
-                            current_answer_chunk = delta.get("content")
-                            if current_answer_chunk is not None:
-                                if not is_qwen_answering_started and str(current_answer_chunk).strip():
-                                    _log_ai_comms(colorize("Qwen开始正式回复...", Colors.CYAN), "DEBUG", player_config_name)
-                                    is_qwen_answering_started = True
-                                qwen_answer_content_parts.append(str(current_answer_chunk))
-                        except json.JSONDecodeError:
-                            _log_ai_comms(colorize(f"无法解析Qwen SSE流中的JSON块: {json_data_string}", Colors.YELLOW), "WARN", player_config_name)
-                            continue
             
             final_reasoning_text = "".join(qwen_reasoning_content_parts)
             final_answer_text = "".join(qwen_answer_content_parts)
@@ -149,6 +316,26 @@ def make_api_call_to_ai(
                      api_call_error_message += colorize(" (但记录到有思考过程)", Colors.BRIGHT_BLACK)
             else:
                 final_ai_output_text = final_answer_text.strip()
+
+        elif is_token_stream:
+            answer_content_parts = []
+            for delta in _iter_sse_deltas(response_obj, player_config_name, finish_reasons):
+                current_answer_chunk = delta.get("content") # reasoning_content 不推送
+                if current_answer_chunk:
+                    answer_content_parts.append(str(current_answer_chunk))
+                    if on_token is not None:
+                        on_token(str(current_answer_chunk))
+                    if early_stop is not None:
+                        decided_answer = _decided_answer_prefix(early_stop, answer_content_parts, player_config_name)
+                        if decided_answer is not None:
+                            answer_content_parts = [decided_answer]
+                            break
+            final_answer_text = "".join(answer_content_parts)
+            _log_ai_comms(f"SSE流解析完毕. 回复内容长度: {bold(str(len(final_answer_text)))}", "DEBUG", player_config_name)
+            if not final_answer_text.strip():
+                api_call_error_message = "AI流式回复内容为空"
+            else:
+                final_ai_output_text = final_answer_text.strip()
         
         else: # Not Qwen Deep Think Stream
             try:
@@ -156,6 +343,9 @@ def make_api_call_to_ai(
                      raw_response_data_for_parser = response_obj.text # For general streaming (non-Qwen specific)
                 else:
                     raw_response_data_for_parser = response_obj.json()
+                    response_choices = raw_response_data_for_parser.get("choices") if isinstance(raw_response_data_for_parser, dict) else None
+                    if response_choices and isinstance(response_choices[0], dict) and response_choices[0].get("finish_reason"):
+                        finish_reasons.append(response_choices[0]["finish_reason"])
 
                 final_ai_output_text = parse_ai_response(
                     response_data=raw_response_data_for_parser,
@@ -171,7 +361,9 @@ def make_api_call_to_ai(
                 api_call_error_message = f"响应解析器错误: {e_parse}"
 
         if api_call_error_message:
-            return None, api_call_error_message
+            return None, ApiCallError(api_call_error_message, API_ERROR_BAD_RESPONSE)
+        if "length" in finish_reasons: # 达到 max_tokens 上限，GM审核和历史中看到的是不完整的回复
+            _log_ai_comms(colorize("回复达到长度上限被截断 (finish_reason=length)，内容可能不完整。", Colors.YELLOW), "WARN", player_config_name)
         
         if not final_ai_output_text or \
            (isinstance(final_ai_output_text, str) and (
@@ -180,27 +372,155 @@ def make_api_call_to_ai(
            )):
             error_detail = f"最终AI输出内容为空或为解析器错误提示: '{colorize(final_ai_output_text if final_ai_output_text else '空响应', Colors.YELLOW)}'"
             _log_ai_comms(error_detail, "WARN", player_config_name)
-            return None, f"AI响应处理失败: {final_ai_output_text if final_ai_output_text else '空响应'}"
+            return None, ApiCallError(f"AI响应处理失败: {final_ai_output_text if final_ai_output_text else '空响应'}", API_ERROR_BAD_RESPONSE)
         
         return str(final_ai_output_text).strip(), None
 
     except requests.exceptions.Timeout:
-        _log_ai_comms(colorize(f"API调用超时 ({timeout_seconds}s)。", Colors.RED), "ERROR", player_config_name)
-        return None, f"API调用超时({timeout_seconds}s)"
+        _log_ai_comms(colorize(f"API调用超时 ({timeout_seconds:.1f}s)。", Colors.RED), "ERROR", player_config_name)
+        return None, ApiCallError(f"API调用超时({timeout_seconds:.1f}s)", API_ERROR_TIMEOUT)
     except requests.exceptions.RequestException as e_req:
+        if "response_format" in payload and getattr(e_req, "response", None) is not None and e_req.response.status_code == 400:
+            _log_ai_comms(colorize(f"端点 {endpoint_to_use} 不接受 response_format (HTTP 400)，之后改为普通文本请求。", Colors.YELLOW), "WARN", player_config_name)
+            _endpoints_without_response_format.add(_endpoint_pool_key(endpoint_to_use))
+            return _request_ai_response(player_config_name, messages, endpoint_to_use, api_key, model_to_use,
+                                        response_handler_type, player_display_name_for_parser, timeout_seconds,
+                                        on_token=on_token, early_stop=early_stop, generation_params=generation_params)
         error_msg = colorize(f"API调用时发生网络或请求错误: {e_req}", Colors.RED)
         _log_ai_comms(error_msg, "ERROR", player_config_name)
         error_response_text = ""
+        status_code, retry_after, error_kind = None, None, API_ERROR_CONNECTION # 没有响应: 无法连接或连接中断
         # Check if e_req.response exists (it's an optional attribute)
         if hasattr(e_req, 'response') and e_req.response is not None:
+            status_code = e_req.response.status_code
+            retry_after = parse_retry_after(e_req.response.headers.get("Retry-After"))
+            error_kind = API_ERROR_RATE_LIMITED if status_code == 429 else API_ERROR_SERVER if status_code >= 500 else API_ERROR_CLIENT
             try:
                 server_error_detail = e_req.response.json() if e_req.response.headers.get('Content-Type') == 'application/json' else e_req.response.text
                 error_response_text = colorize(f" (服务器响应: {e_req.response.status_code} {str(server_error_detail)[:150]}...)", Colors.BRIGHT_RED)
             except json.JSONDecodeError:
                  error_response_text = colorize(f" (服务器响应: {e_req.response.status_code} {e_req.response.text[:150]}...)", Colors.BRIGHT_RED)
-        return None, f"API网络/请求错误: {str(e_req)}{error_response_text}"
+        return None, ApiCallError(f"API网络/请求错误: {str(e_req)}{error_response_text}", error_kind, status_code, retry_after)
     except Exception as e_unknown:
         _log_ai_comms(colorize(f"API调用或响应处理时发生未知严重错误: {e_unknown}", Colors.BOLD + Colors.RED), "CRITICAL", player_config_name)
         tb_str = traceback.format_exc()
         _log_ai_comms(colorize(tb_str, Colors.BRIGHT_RED), "CRITICAL", player_config_name) # Colorize traceback too
-        return None, f"API未知严重错误: {str(e_unknown)}"
\ No newline at end of file
+        return None, ApiCallError(f"API未知严重错误: {str(e_unknown)}", API_ERROR_UNKNOWN)
+    finally:
+        if response_obj is not None:
+            response_obj.close() # 流式响应提前结束时也要归还连接到连接池
+
+
+def _iter_sse_deltas(response_obj: requests.Response, player_config_name: Optional[str] = None,
+                     finish_reasons: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    逐个产出OpenAI兼容SSE流中 choices[0].delta 字典，读到 [DONE] 为止；无法解析的块记录警告后跳过。
+    给出 finish_reasons 时，流中出现的 finish_reason 依次追加到其中。
+    """
+    for line_bytes in response_obj.iter_lines():
+        if not line_bytes:
+            continue
+        decoded_line = line_bytes.decode('utf-8', errors='replace').strip()
+        if not decoded_line.startswith("data:"):
+            continue
+        json_data_string = decoded_line[len("data:"):].strip()
+        if json_data_string == "[DONE]":
+            _log_ai_comms(colorize("SSE流结束标记 [DONE] 收到。", Colors.GREEN), "DEBUG", player_config_name)
+            return
+        if not json_data_string:
+            continue
+        try:
+            chunk = json.loads(json_data_string)
+        except json.JSONDecodeError:
+            _log_ai_comms(colorize(f"无法解析SSE流中的JSON块: {json_data_string}", Colors.YELLOW), "WARN", player_config_name)
+            continue
+        if not chunk.get("choices"):
+            if chunk.get("usage"):
+                _log_ai_comms(f"Usage data received: {colorize(str(chunk['usage']), Colors.BRIGHT_BLACK)}", "DEBUG", player_config_name)
+            continue
+        if finish_reasons is not None and chunk["choices"][0].get("finish_reason"):
+            finish_reasons.append(chunk["choices"][0]["finish_reason"])
+        yield chunk["choices"][0].get("delta") or {}
+
+def _decided_answer_prefix(early_stop: Callable[[str], Optional[int]], answer_parts: List[str],
+                           player_config_name: Optional[str] = None) -> Optional[str]:
+    """用 early_stop 判定目前的回答；已经确定时返回截断后的回答 (调用方随即结束读取流)。"""
+    answer_so_far = "".join(answer_parts)
+    decided_length = early_stop(answer_so_far)
+    if decided_length is None:
+        return None
+    _log_ai_comms(f"回答已确定，提前结束SSE流 (保留 {bold(str(decided_length))} 个字符)。", "DEBUG", player_config_name)
+    return answer_so_far[:decided_length]
+
+
+class AsyncAIClient:
+    """
+    make_api_call_to_ai 的 asyncio 版本，用于让相互独立的玩家决策同时等待模型。
+    每个请求在线程池中执行同步实现 (共享同一套连接池)，因此支持全部 response_handler_type，
+    包括 Qwen SSE 深度思考流；并按端点用 asyncio.Semaphore 限制同时在途的请求数。
+    """
+    def __init__(self, max_concurrency_per_endpoint: Optional[int] = None, max_workers: Optional[int] = None):
+        self.max_concurrency_per_endpoint = max_concurrency_per_endpoint or game_config.ASYNC_MAX_CONCURRENCY_PER_ENDPOINT
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or game_config.ASYNC_MAX_WORKERS,
+            thread_name_prefix="ai-call"
+        )
+        # Semaphore 绑定在创建它的事件循环上，因此按事件循环分别缓存
+        self._semaphores_by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+        self._semaphores_lock = threading.Lock()
+
+    def _get_endpoint_semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        pool_key = _endpoint_pool_key(endpoint)
+        with self._semaphores_lock:
+            loop_semaphores = self._semaphores_by_loop.setdefault(loop, {})
+            semaphore = loop_semaphores.get(pool_key)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrency_per_endpoint)
+                loop_semaphores[pool_key] = semaphore
+            return semaphore
+
+    async def call(self, player_config_name: str, messages: List[Dict[str, str]], **call_kwargs: Any) -> Tuple[Optional[str], Optional[str]]:
+        """与 make_api_call_to_ai 参数和返回值相同的可等待调用。"""
+        endpoint_to_use = call_kwargs.get("api_endpoint") or DEFAULT_API_ENDPOINT
+        async with self._get_endpoint_semaphore(endpoint_to_use):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                partial(make_api_call_to_ai, player_config_name, messages, **call_kwargs)
+            )
+
+    async def call_many(self, calls: List[Dict[str, Any]]) -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        并发执行多个调用，结果顺序与 calls 一致。
+        calls 中每一项都是 make_api_call_to_ai 的关键字参数字典 (必须包含 player_config_name 和 messages)。
+        """
+        return list(await asyncio.gather(*(self.call(**call) for call in calls)))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_default_async_client: Optional[AsyncAIClient] = None
+_default_async_client_lock = threading.Lock()
+
+def get_async_ai_client() -> AsyncAIClient:
+    """返回进程内共享的 AsyncAIClient (按需创建)。"""
+    global _default_async_client
+    with _default_async_client_lock:
+        if _default_async_client is None:
+            _default_async_client = AsyncAIClient()
+        return _default_async_client
+
+async def make_api_call_to_ai_async(player_config_name: str, messages: List[Dict[str, str]], **call_kwargs: Any) -> Tuple[Optional[str], Optional[str]]:
+    """make_api_call_to_ai 的可等待版本，使用共享客户端的端点并发限制。"""
+    return await get_async_ai_client().call(player_config_name, messages, **call_kwargs)
+
+def run_api_calls_concurrently(calls: List[Dict[str, Any]]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    供同步代码(游戏流程线程)使用的入口: 同时发出 calls 中的全部请求并阻塞到全部返回。
+    总耗时约等于其中最慢的一个请求，而不是所有请求耗时之和。
+    """
+    if not calls:
+        return []
+    return asyncio.run(get_async_ai_client().call_many(calls))
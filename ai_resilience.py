@@ -0,0 +1,270 @@
+# ai_resilience.py
+"""
+API调用的错误分类、重试策略和按端点的熔断器。
+
+- ApiCallError: make_api_call_to_ai 返回的错误信息 (仍是字符串，附带错误类别、HTTP状态码和 Retry-After)；
+- RetryPolicy: 按错误类别决定是否重试，等待时间指数增长并加随机抖动，避免多个玩家同时重试；
+- CircuitBreaker: 同一端点连续失败达到阈值后熔断，冷却期内的请求立即失败，之后放行一个试探请求，
+  成功则恢复。get_endpoint_health() 汇报各端点的状态；
+- LatencyTracker: 按 (端点, 模型, 行动类型) 记录最近的请求耗时，由耗时分位数推出该类请求的超时，
+  get_latency_stats() 汇报各键的分位数和当前超时。
+"""
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple, Deque
+
+import game_config
+
+# 错误类别 (game_config.API_RETRY_RULES 的键)
+API_ERROR_TIMEOUT = "timeout" # 请求超时
+API_ERROR_CONNECTION = "connection" # 无法连接或连接中断 (例如服务正在重启)
+API_ERROR_RATE_LIMITED = "rate_limited" # HTTP 429
+API_ERROR_SERVER = "server_error" # HTTP 5xx
+API_ERROR_CLIENT = "client_error" # 其他 HTTP 4xx，重试通常无济于事
+API_ERROR_BAD_RESPONSE = "bad_response" # 收到了响应但无法解析或内容为空
+API_ERROR_CIRCUIT_OPEN = "circuit_open" # 端点熔断中，请求未发出
+API_ERROR_REPLAY_MISS = "replay_miss" # 回放模式下缓存未命中
+API_ERROR_UNKNOWN = "unknown"
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class ApiCallError(str):
+    """带有错误类别的API错误信息。继承 str，原有按字符串处理错误信息的代码不受影响。"""
+
+    def __new__(cls, message: str, kind: str = API_ERROR_UNKNOWN, status_code: Optional[int] = None,
+                retry_after: Optional[float] = None) -> "ApiCallError":
+        error = super().__new__(cls, message)
+        error.kind = kind
+        error.status_code = status_code
+        error.retry_after = retry_after # 服务端要求的最短等待秒数 (Retry-After)
+        return error
+
+
+def get_error_kind(error_message: Optional[str]) -> str:
+    """错误信息的类别；普通字符串视为 unknown。"""
+    return getattr(error_message, "kind", API_ERROR_UNKNOWN)
+
+
+def is_endpoint_failure(error_message: Optional[str]) -> bool:
+    """该错误是否说明端点本身不可用 (game_config.CIRCUIT_BREAKER_FAILURE_KINDS)；内容问题不算。"""
+    return get_error_kind(error_message) in game_config.CIRCUIT_BREAKER_FAILURE_KINDS
+
+
+def parse_retry_after(header_value: Optional[str]) -> Optional[float]:
+    """解析以秒表示的 Retry-After 头；HTTP日期格式或无法解析时返回 None。"""
+    try:
+        return max(0.0, float(header_value)) if header_value is not None else None
+    except ValueError:
+        return None
+
+
+class RetryPolicy:
+    """
+    按错误类别的重试规则: rules 为 {类别: 最多自动重试次数}，未列出的类别按 unknown 处理。
+    第 n 次重试前等待 min(max_delay, base_delay * multiplier**(n-1))，再在 [1-jitter, 1] 倍之间随机缩放；
+    服务端给出 Retry-After 时至少等待那么久。
+    """
+
+    def __init__(self, rules: Optional[Dict[str, int]] = None, base_delay: Optional[float] = None,
+                 multiplier: Optional[float] = None, max_delay: Optional[float] = None,
+                 jitter: Optional[float] = None, seed: Optional[int] = None):
+        self.rules = dict(game_config.API_RETRY_RULES if rules is None else rules)
+        self.base_delay = game_config.API_RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.multiplier = game_config.API_RETRY_MULTIPLIER if multiplier is None else multiplier
+        self.max_delay = game_config.API_RETRY_MAX_DELAY if max_delay is None else max_delay
+        self.jitter = game_config.API_RETRY_JITTER if jitter is None else jitter
+        self._rng = random.Random(seed) # 独立的随机数，不影响按种子复现的游戏随机性
+        self._rng_lock = threading.Lock()
+
+    def max_retries(self, error_message: Optional[str]) -> int:
+        kind = get_error_kind(error_message)
+        return self.rules.get(kind, self.rules.get(API_ERROR_UNKNOWN, 0))
+
+    def next_delay(self, error_message: Optional[str], retries_done: int) -> Optional[float]:
+        """已经重试 retries_done 次后，返回下一次重试前的等待秒数；不应再重试时返回 None。"""
+        if retries_done >= self.max_retries(error_message):
+            return None
+        delay = min(self.max_delay, self.base_delay * (self.multiplier ** retries_done))
+        with self._rng_lock:
+            delay *= 1.0 - self.jitter * self._rng.random()
+        retry_after = getattr(error_message, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    """单个端点的熔断器 (线程安全)。"""
+
+    def __init__(self, endpoint: str, failure_threshold: Optional[int] = None, cooldown_seconds: Optional[float] = None):
+        self.endpoint = endpoint
+        self.failure_threshold = game_config.CIRCUIT_BREAKER_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        self.cooldown_seconds = game_config.CIRCUIT_BREAKER_COOLDOWN if cooldown_seconds is None else cooldown_seconds
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """熔断中返回 False；冷却期结束后只放行一个试探请求。"""
+        with self._lock:
+            if self.state == CIRCUIT_CLOSED:
+                return True
+            if self.state == CIRCUIT_OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = CIRCUIT_HALF_OPEN
+            if self.state == CIRCUIT_HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self) -> bool:
+        """记录一次端点正常的响应；由熔断恢复为正常时返回 True。"""
+        with self._lock:
+            self.stats["successes"] += 1
+            recovered = self.state != CIRCUIT_CLOSED
+            self.state = CIRCUIT_CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+            return recovered
+
+    def record_failure(self) -> bool:
+        """记录一次端点故障；这次失败使端点进入熔断时返回 True。"""
+        with self._lock:
+            self.stats["failures"] += 1
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == CIRCUIT_HALF_OPEN or \
+               (self.state == CIRCUIT_CLOSED and self.consecutive_failures >= self.failure_threshold > 0):
+                self.state = CIRCUIT_OPEN
+                self.opened_at = time.monotonic()
+                self.stats["opened"] += 1
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """距离下一次试探请求还有多少秒 (未熔断时为 0)。"""
+        with self._lock:
+            if self.state != CIRCUIT_OPEN:
+                return 0.0
+            return max(0.0, self.cooldown_seconds - (time.monotonic() - self.opened_at))
+
+    def health(self) -> Dict[str, Any]:
+        retry_in = self.retry_in()
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures,
+                    "retry_in_s": round(retry_in, 1), **self.stats}
+
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint_key: str) -> CircuitBreaker:
+    """返回端点 (scheme://host:port) 的熔断器，按需创建；同一端点的所有玩家共享。"""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(endpoint_key)
+        if breaker is None:
+            breaker = CircuitBreaker(endpoint_key)
+            _circuit_breakers[endpoint_key] = breaker
+        return breaker
+
+
+def get_endpoint_health() -> Dict[str, Dict[str, Any]]:
+    """当前进程中各端点的熔断状态和成功/失败/拒绝计数。"""
+    with _circuit_breakers_lock:
+        breakers = list(_circuit_breakers.values())
+    return {breaker.endpoint: breaker.health() for breaker in breakers}
+
+
+def reset_circuit_breakers() -> None:
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
+
+
+class LatencyTracker:
+    """
+    按 (端点, 模型, 行动类型) 保存最近 window_size 次请求的耗时 (线程安全)。
+    样本足够多后，超时取 ADAPTIVE_TIMEOUT_PERCENTILE 分位数 × ADAPTIVE_TIMEOUT_FACTOR，限制在 [最小值, 默认超时] 之间；
+    样本不足时使用默认超时。超时的请求只知道耗时不少于当时的超时，作为删失样本按该值记入；
+    同一键连续超时时，超时再按 2 的幂放宽，直到有请求成功。
+    """
+
+    def __init__(self, window_size: Optional[int] = None):
+        self.window_size = game_config.ADAPTIVE_TIMEOUT_WINDOW if window_size is None else window_size
+        self._samples: Dict[Tuple[str, str, str], Deque[Tuple[float, bool]]] = {} # 键 -> [(秒, 是否删失)]
+        self._consecutive_timeouts: Dict[Tuple[str, str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: Tuple[str, str, str], seconds: float, censored: bool = False) -> None:
+        """记录一次请求耗时；censored 表示请求超时，真实耗时至少为 seconds。"""
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = deque(maxlen=self.window_size)
+                self._samples[key] = samples
+            samples.append((seconds, censored))
+            self._consecutive_timeouts[key] = self._consecutive_timeouts.get(key, 0) + 1 if censored else 0
+
+    def timeout_for(self, key: Tuple[str, str, str]) -> float:
+        """该键下一次请求应使用的超时(秒)。"""
+        with self._lock:
+            samples = list(self._samples.get(key, ()))
+            consecutive_timeouts = self._consecutive_timeouts.get(key, 0)
+        default_timeout = game_config.API_TIMEOUT_SECONDS
+        if not game_config.ADAPTIVE_TIMEOUTS or len(samples) < game_config.ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+            return float(default_timeout)
+        timeout = _percentile(sorted(seconds for seconds, _ in samples), game_config.ADAPTIVE_TIMEOUT_PERCENTILE) \
+            * game_config.ADAPTIVE_TIMEOUT_FACTOR * (2 ** consecutive_timeouts)
+        return min(default_timeout, max(game_config.ADAPTIVE_TIMEOUT_MIN_SECONDS, timeout))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各键的样本数、删失(超时)数、p50/p90/p99 耗时和当前超时；键格式为 "端点 | 模型 | 行动类型"。"""
+        with self._lock:
+            snapshot = {key: list(samples) for key, samples in self._samples.items()}
+        result = {}
+        for key, samples in sorted(snapshot.items()):
+            durations = sorted(seconds for seconds, _ in samples)
+            result[" | ".join(key)] = {
+                "samples": len(samples),
+                "timeouts": sum(1 for _, censored in samples if censored),
+                "p50_s": round(_percentile(durations, 50), 3),
+                "p90_s": round(_percentile(durations, 90), 3),
+                "p99_s": round(_percentile(durations, 99), 3),
+                "timeout_s": round(self.timeout_for(key), 1),
+            }
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._consecutive_timeouts.clear()
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    """最近秩法分位数；sorted_values 为空时返回 0。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percentile / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+_latency_tracker = LatencyTracker()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """当前进程共享的耗时统计。"""
+    return _latency_tracker
+
+
+def get_latency_stats() -> Dict[str, Dict[str, Any]]:
+    return _latency_tracker.stats()
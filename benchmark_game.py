@@ -0,0 +1,354 @@
+# benchmark_game.py
+"""
+整局游戏的端到端基准：在进程内启动 mock_llm_server，以无人值守模式运行若干局 run_game_loop，
+统计每个游戏阶段、每种行动类型的耗时，以及 Prompt 构建、响应解析/校验、日志输出和API调用所占的时间，
+以及模拟服务端前缀缓存的命中率 (Prompt中可复用已缓存KV的比例)，
+并可与保存的基准线比较，用于发现 werewolf_prompts / GameState 等引擎代码的性能回退。
+
+用法示例:
+    python benchmark_game.py --games 5 --players 9 --save-baseline benchmarks/baseline.json
+    python benchmark_game.py --games 5 --players 9 --baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Callable
+
+import game_config
+import game_flow_manager
+import player_interaction
+import ai_interface
+from game_state import GameState
+from game_setup import initialize_game
+from ui_adapter import create_ui_adapter, set_current_ui_adapter
+from game_logger import StreamLogSink, configure_logging, get_log_level, get_log_sink
+from mock_llm_server import start_mock_server
+from ai_resilience import get_latency_tracker, get_latency_stats
+
+SECTION_PROMPT_BUILD = "prompt_build"
+SECTION_PARSE = "parse_validate"
+SECTION_LOGGING = "logging"
+SECTION_API = "api_call"
+
+
+class BenchmarkRecorder:
+    """累计各类耗时。同一线程内同一类别的嵌套调用只计最外层，避免重复计时。"""
+
+    def __init__(self):
+        self.totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self, group: str, key: str, seconds: float) -> None:
+        with self._lock:
+            self.totals[group][key] += seconds
+            self.counts[group][key] += 1
+
+    def timed(self, group: str, key_func: Callable[..., str], func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            active = getattr(self._local, "active", None)
+            if active is None:
+                active = self._local.active = set()
+            key = key_func(*args, **kwargs)
+            marker = (group, key)
+            if marker in active:
+                return func(*args, **kwargs)
+            active.add(marker)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                active.discard(marker)
+                self.add(group, key, time.perf_counter() - started)
+        return wrapper
+
+    def summary(self, group: str) -> Dict[str, Dict[str, float]]:
+        return {
+            key: {"total_s": round(total, 6), "count": self.counts[group][key],
+                  "mean_ms": round(total / self.counts[group][key] * 1000, 4) if self.counts[group][key] else 0.0}
+            for key, total in sorted(self.totals[group].items())
+        }
+
+
+class PhaseTimedGameState(GameState):
+    """在 current_game_phase 每次切换时记录上一阶段持续的时间。"""
+
+    def __init__(self, recorder: BenchmarkRecorder):
+        self._recorder = recorder
+        self._phase = None
+        self._phase_started = time.perf_counter()
+        super().__init__()
+
+    @property
+    def current_game_phase(self):
+        return self._phase
+
+    @current_game_phase.setter
+    def current_game_phase(self, new_phase):
+        if new_phase == self._phase:
+            return
+        now = time.perf_counter()
+        if self._phase is not None:
+            self._recorder.add("phase", str(self._phase), now - self._phase_started)
+        self._phase, self._phase_started = new_phase, now
+
+    def finish_phase_timing(self) -> None:
+        if self._phase is not None:
+            self._recorder.add("phase", str(self._phase), time.perf_counter() - self._phase_started)
+            self._phase_started = time.perf_counter()
+
+
+class TimingLogSink(StreamLogSink):
+    """写到 stream，并把每次写出的耗时计入 logging (所有模块的日志都经过 game_logger 的 sink)。"""
+
+    def __init__(self, recorder: BenchmarkRecorder, stream):
+        super().__init__(stream)
+        self._recorder = recorder
+
+    def write(self, line: str) -> None:
+        started = time.perf_counter()
+        try:
+            super().write(line)
+        finally:
+            self._recorder.add("section", SECTION_LOGGING, time.perf_counter() - started)
+
+
+@contextlib.contextmanager
+def _instrumented(recorder: BenchmarkRecorder, output_stream):
+    """临时替换模块属性以计时，退出时恢复。日志写到 output_stream，写出耗时由 TimingLogSink 计入 logging。"""
+    patches = []
+
+    def patch(owner, name, replacement):
+        patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def action_key(*args, **kwargs):
+        return kwargs.get("action_type") or (args[2] if len(args) > 2 else "unknown")
+
+    def batch_key(*args, **kwargs):
+        requests_ = kwargs.get("decision_requests") or (args[1] if len(args) > 1 else [])
+        return f"batch:{requests_[0][1]}" if requests_ else "batch"
+
+    section = lambda name: (lambda *a, **k: name)
+
+    # 每个行动的完整耗时 (含GM审核/重试)。game_flow_manager 通过名字导入，需要替换它持有的引用
+    patch(game_flow_manager, "get_ai_decision_with_gm_approval",
+          recorder.timed("action", action_key, game_flow_manager.get_ai_decision_with_gm_approval))
+    patch(game_flow_manager, "get_ai_decisions_with_batch_gm_approval",
+          recorder.timed("action", batch_key, game_flow_manager.get_ai_decisions_with_batch_gm_approval))
+    # 引擎各部分
+    patch(player_interaction, "generate_action_turn",
+          recorder.timed("section", section(SECTION_PROMPT_BUILD), player_interaction.generate_action_turn))
+    patch(player_interaction, "assemble_prompt_messages",
+          recorder.timed("section", section(SECTION_PROMPT_BUILD), player_interaction.assemble_prompt_messages))
+    patch(player_interaction, "_validate_ai_response",
+          recorder.timed("section", section(SECTION_PARSE), player_interaction._validate_ai_response))
+    patch(ai_interface, "parse_ai_response",
+          recorder.timed("section", section(SECTION_PARSE), ai_interface.parse_ai_response))
+    patch(player_interaction, "make_api_call_to_ai",
+          recorder.timed("section", section(SECTION_API), player_interaction.make_api_call_to_ai))
+    previous_sink = get_log_sink()
+    configure_logging(sink=TimingLogSink(recorder, output_stream))
+    try:
+        yield
+    finally:
+        configure_logging(sink=previous_sink)
+        for owner, name, original in reversed(patches):
+            setattr(owner, name, original)
+
+
+def run_benchmark(num_games: int = 3, num_players: int = 9, base_seed: int = 0, latency: float = 0.0,
+                  tokens_per_second: float = 0.0, show_output: bool = False,
+                  log_level: Optional[str] = None, structured_decisions: bool = False,
+                  decision_rationale: bool = False, early_stop_decisions: Optional[bool] = None,
+                  decision_profiles: bool = False) -> Dict[str, Any]:
+    """
+    运行 num_games 局并返回汇总后的计时结果 (可JSON序列化)。log_level 默认为 game_config.LOG_LEVEL_HEADLESS；
+    structured_decisions 为所有玩家开启结构化决策 (见 game_config.STRUCTURED_DECISIONS)；
+    decision_rationale 让模拟模型在目标选择后附上理由，early_stop_decisions 覆盖 game_config.EARLY_STOP_DECISIONS；
+    decision_profiles 为所有玩家使用 game_config.DECISION_GENERATION_PROFILES 作为 generation_profiles。
+    """
+    if num_players not in game_config.ROLE_DISTRIBUTIONS:
+        raise ValueError(f"不支持的玩家人数: {num_players}")
+    previous_early_stop = game_config.EARLY_STOP_DECISIONS
+    if early_stop_decisions is not None:
+        game_config.EARLY_STOP_DECISIONS = early_stop_decisions
+    server = start_mock_server(seed=base_seed, latency=latency, tokens_per_second=tokens_per_second,
+                               decision_rationale=decision_rationale)
+    recorder = BenchmarkRecorder()
+    get_latency_tracker().reset() # latency 只统计本次基准的请求
+    games: List[Dict[str, Any]] = []
+    log_level = log_level or game_config.LOG_LEVEL_HEADLESS
+    previous_log_level = get_log_level()
+    configure_logging(log_level)
+    config_fd, config_path = tempfile.mkstemp(prefix="bench_players_", suffix=".json")
+    try:
+        with os.fdopen(config_fd, "w", encoding="utf-8") as f:
+            json.dump([{"name": f"PlayerAI{i + 1}", "api_endpoint": server.url, "api_key": "EMPTY",
+                        "model": "mock-model", "response_handler_type": "standard",
+                        "structured_decisions": structured_decisions,
+                        "generation_profiles": game_config.DECISION_GENERATION_PROFILES if decision_profiles else None}
+                       for i in range(num_players)], f)
+
+        output_stream = sys.stdout if show_output else open(os.devnull, "w", encoding="utf-8")
+        try:
+            with _instrumented(recorder, output_stream):
+                for game_index in range(num_games):
+                    random.seed(base_seed + game_index)
+                    game_state = PhaseTimedGameState(recorder)
+                    if not initialize_game(game_state, config_path):
+                        raise RuntimeError("基准对局初始化失败")
+                    ui_adapter = create_ui_adapter("headless")
+                    ui_adapter.set_game_state(game_state)
+                    set_current_ui_adapter(ui_adapter)
+                    started = time.perf_counter()
+                    game_flow_manager.run_game_loop(game_state, ui_adapter=ui_adapter)
+                    game_state.finish_phase_timing()
+                    games.append({"seed": base_seed + game_index, "wall_s": round(time.perf_counter() - started, 4),
+                                  "days": game_state.game_day, "winner": game_state.game_winner_message})
+        finally:
+            if output_stream is not sys.stdout:
+                output_stream.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.remove(config_path)
+        configure_logging(previous_log_level)
+        early_stop_decisions, game_config.EARLY_STOP_DECISIONS = game_config.EARLY_STOP_DECISIONS, previous_early_stop
+
+    total_wall = sum(g["wall_s"] for g in games)
+    sections = recorder.summary("section")
+    api_total = sections.get(SECTION_API, {}).get("total_s", 0.0)
+    return {
+        "settings": {"games": num_games, "players": num_players, "base_seed": base_seed,
+                     "latency": latency, "tokens_per_second": tokens_per_second,
+                     "log_level": log_level, "structured_decisions": structured_decisions,
+                     "decision_rationale": decision_rationale, "early_stop_decisions": early_stop_decisions,
+                     "decision_profiles": decision_profiles, "python": sys.version.split()[0]},
+        "total_wall_s": round(total_wall, 4),
+        "engine_wall_s": round(total_wall - api_total, 4), # 去掉等待模型的时间后，引擎自身的耗时
+        "requests": server.stats["requests"],
+        "structured_requests": server.stats["structured"],
+        "aborted_streams": server.stats["aborted"],
+        "prefix_cache": server.prefix_cache.stats(),
+        "latency": get_latency_stats(),
+        "games": games,
+        "phases": recorder.summary("phase"),
+        "actions": recorder.summary("action"),
+        "sections": sections,
+    }
+
+
+def _flatten_metrics(result: Dict[str, Any]) -> Dict[str, float]:
+    metrics = {"total_wall_s": result["total_wall_s"], "engine_wall_s": result["engine_wall_s"]}
+    for group in ("phases", "actions", "sections"):
+        for key, stats in result.get(group, {}).items():
+            metrics[f"{group}.{key}.total_s"] = stats["total_s"]
+    return metrics
+
+
+def compare_to_baseline(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float = 0.2,
+                        min_seconds: float = 0.005) -> List[Dict[str, Any]]:
+    """
+    逐项比较耗时。变慢超过 threshold (比例) 且绝对差超过 min_seconds 的指标标记为回退。
+    设置不同 (局数/人数/种子) 的结果不具可比性，调用方应自行保证一致。
+    """
+    current, previous = _flatten_metrics(result), _flatten_metrics(baseline)
+    rows = []
+    for name in sorted(set(current) | set(previous)):
+        now, before = current.get(name), previous.get(name)
+        ratio = (now / before) if now is not None and before else None
+        regressed = (ratio is not None and ratio > 1 + threshold and now - before > min_seconds)
+        rows.append({"metric": name, "baseline": before, "current": now,
+                     "ratio": round(ratio, 3) if ratio is not None else None, "regressed": regressed})
+    # 前缀缓存命中率越高越好，下降超过 threshold (比例) 视为回退
+    hit_now = (result.get("prefix_cache") or {}).get("hit_rate")
+    hit_before = (baseline.get("prefix_cache") or {}).get("hit_rate")
+    if hit_now is not None and hit_before:
+        rows.append({"metric": "prefix_cache.hit_rate", "baseline": hit_before, "current": hit_now,
+                     "ratio": round(hit_now / hit_before, 3), "regressed": hit_now < hit_before * (1 - threshold)})
+    return rows
+
+
+def _print_report(result: Dict[str, Any]) -> None:
+    structured_note = f" (其中结构化输出 {result['structured_requests']} 次)" if result.get("structured_requests") else ""
+    if result.get("aborted_streams"):
+        structured_note += f" (提前结束 {result['aborted_streams']} 次)"
+    print(f"\n=== 基准结果: {result['settings']['games']} 局, {result['settings']['players']} 人, 共 {result['requests']} 次请求{structured_note} ===")
+    print(f"总耗时 {result['total_wall_s']:.3f}s, 引擎耗时(不含API等待) {result['engine_wall_s']:.3f}s")
+    prefix_cache = result.get("prefix_cache") or {}
+    if prefix_cache.get("prompt_chars"):
+        print(f"前缀缓存命中率 {prefix_cache['hit_rate']:.1%} ({prefix_cache['cached_chars']}/{prefix_cache['prompt_chars']} 字符可复用)")
+    for title, group in (("游戏阶段", "phases"), ("行动类型", "actions"), ("引擎各部分", "sections")):
+        print(f"\n--- {title} ---")
+        for key, stats in sorted(result[group].items(), key=lambda item: -item[1]["total_s"]):
+            print(f"  {key:<32} 总计 {stats['total_s']:>9.4f}s  次数 {stats['count']:>6}  平均 {stats['mean_ms']:>9.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI狼人杀 - 整局游戏端到端性能基准")
+    parser.add_argument("--games", type=int, default=3, help="对局数 (默认: 3)")
+    parser.add_argument("--players", type=int, default=9, help=f"玩家人数 (默认: 9, 可选: {sorted(game_config.ROLE_DISTRIBUTIONS)})")
+    parser.add_argument("--seed", type=int, default=0, help="基础随机种子 (默认: 0)")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟模型的每请求延迟(秒)，默认0以突出引擎耗时")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="模拟模型的生成速度，0表示不限速")
+    parser.add_argument("--output", type=str, default=None, help="把本次结果写入JSON文件")
+    parser.add_argument("--save-baseline", type=str, default=None, help="把本次结果保存为基准线")
+    parser.add_argument("--baseline", type=str, default=None, help="与该基准线比较，发现回退时以状态码1退出")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定回退的变慢比例 (默认: 0.2 即20%%)")
+    parser.add_argument("--show-output", action="store_true", help="显示对局的完整终端输出 (会影响日志耗时)")
+    parser.add_argument("--log-level", type=str, default=game_config.LOG_LEVEL_HEADLESS,
+                        help=f"对局期间的日志级别 (默认: {game_config.LOG_LEVEL_HEADLESS}，与无人值守模式相同)")
+    parser.add_argument("--structured-decisions", action="store_true", help="目标选择类行动使用结构化输出 (response_format)")
+    parser.add_argument("--decision-rationale", action="store_true", help="模拟模型在目标选择后换行附上理由")
+    parser.add_argument("--early-stop", action="store_true", help="开启决策流的提前结束 (game_config.EARLY_STOP_DECISIONS)")
+    parser.add_argument("--decision-profiles", action="store_true", help="决策类行动使用 game_config.DECISION_GENERATION_PROFILES (换行停止、短上限)")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.games, args.players, args.seed, args.latency, args.tokens_per_second, args.show_output,
+                           args.log_level, args.structured_decisions, args.decision_rationale,
+                           True if args.early_stop else None, args.decision_profiles)
+    _print_report(result)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"\n结果已保存到 {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if any(baseline.get("settings", {}).get(key) != result["settings"][key] for key in ("games", "players", "log_level", "structured_decisions",
+                                                                                       "decision_rationale", "early_stop_decisions",
+                                                                                       "decision_profiles")):
+            print(f"\n警告: 基准线的设置 {baseline.get('settings')} 与本次不同，比较结果可能没有意义。")
+        rows = compare_to_baseline(result, baseline, args.threshold)
+        regressions = [row for row in rows if row["regressed"]]
+        print(f"\n--- 与基准线 {args.baseline} 比较 (阈值 +{args.threshold:.0%}) ---")
+        for row in rows:
+            if row["ratio"] is None:
+                continue
+            flag = "  <-- 回退" if row["regressed"] else ""
+            unit = "" if row["metric"] == "prefix_cache.hit_rate" else "s"
+            print(f"  {row['metric']:<48} {row['baseline']:>9.4f}{unit} -> {row['current']:>9.4f}{unit}  x{row['ratio']:.2f}{flag}")
+        if regressions:
+            print(f"\n发现 {len(regressions)} 项性能回退。")
+            sys.exit(1)
+        print("\n未发现性能回退。")
+
+
+if __name__ == "__main__":
+    main()
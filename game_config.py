@@ -34,6 +34,11 @@ ROLE_DISTRIBUTIONS = {
 
 # 定义所有游戏内实际使用的角色名 (必须与 ROLE_DISTRIBUTIONS 中的名称一致)
 ALL_POSSIBLE_ROLES = ["平民", "狼人", "预言家", "女巫", "猎人"]
+# 胜负判断按阵营计数 (GameState 维护各阵营存活人数，见 game_rules_engine.check_for_win_conditions)
+FACTION_WOLF = "wolf"
+FACTION_GOD = "god"
+FACTION_VILLAGER = "villager"
+ROLE_FACTIONS = {"狼人": FACTION_WOLF, "预言家": FACTION_GOD, "女巫": FACTION_GOD, "猎人": FACTION_GOD, "平民": FACTION_VILLAGER}
 
 # --- AI & API Configuration ---
 DEFAULT_API_ENDPOINT = "http://localhost:1234/v1/chat/completions" # 示例 OpenAI 兼容的 API 端点
@@ -41,6 +46,58 @@ DEFAULT_API_KEY = "EMPTY" # 如果 API 不需要 key，或 key 在其他地方
 DEFAULT_MODEL_NAME = "gpt-3.5-turbo" # 默认使用的模型名称
 CONFIG_FILENAME = "players_config.json" # AI 玩家配置文件的名称
 
+# --- HTTP 连接池 (ai_interface 按端点复用 keep-alive 连接) ---
+HTTP_POOL_CONNECTIONS = 4 # 每个端点会话缓存的连接池数量
+HTTP_POOL_MAXSIZE = 16 # 每个连接池保留的最大连接数 (并发请求时需要 >= 并发数)
+HTTP_KEEP_ALIVE = True # 是否保持连接复用；设为 False 时每次请求后关闭连接
+
+# --- API重试与熔断 (ai_resilience) ---
+API_RETRY_RULES = { # 各类错误自动重试的次数，用尽后由GM处理 (无人值守时跳过该行动)
+    "timeout": 1, "connection": 3, "rate_limited": 4, "server_error": 2, "bad_response": 1,
+    "client_error": 0, "circuit_open": 0, "replay_miss": 0, "unknown": 1,
+}
+API_RETRY_BASE_DELAY = 1.0 # 第一次重试前的等待(秒)，之后每次乘以 API_RETRY_MULTIPLIER
+API_RETRY_MULTIPLIER = 2.0
+API_RETRY_MAX_DELAY = 20.0 # 单次等待的上限(秒)
+API_RETRY_JITTER = 0.5 # 0~1，每次等待随机缩短至多这个比例，避免多个玩家同时重试
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5 # 同一端点连续失败这么多次后熔断，熔断期间的请求立即失败；0 表示不熔断
+CIRCUIT_BREAKER_COOLDOWN = 30.0 # 熔断后经过多少秒放行一个试探请求，成功即恢复
+CIRCUIT_BREAKER_FAILURE_KINDS = ("timeout", "connection", "server_error") # 计为端点故障的错误类别
+
+# --- API超时 (ai_resilience.LatencyTracker) ---
+API_TIMEOUT_SECONDS = 180 # 默认超时(秒)，也是自适应超时的上限；调用时显式传入 timeout_seconds 则以传入值为准
+ADAPTIVE_TIMEOUTS = True # 按 (端点, 模型, 行动类型) 的历史耗时推出超时，卡住的连接几秒内就能发现
+ADAPTIVE_TIMEOUT_PERCENTILE = 99 # 取最近耗时的这个分位数
+ADAPTIVE_TIMEOUT_FACTOR = 3.0 # 超时 = 分位数 × 该倍数
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20 # 样本少于这个数时使用 API_TIMEOUT_SECONDS
+ADAPTIVE_TIMEOUT_MIN_SECONDS = 10.0 # 自适应超时的下限(秒)
+ADAPTIVE_TIMEOUT_WINDOW = 200 # 每个键保留最近多少次请求的耗时
+
+# --- 异步AI客户端 (ai_interface.AsyncAIClient) ---
+ASYNC_MAX_CONCURRENCY_PER_ENDPOINT = 8 # 每个端点同时在途的最大请求数 (应 <= HTTP_POOL_MAXSIZE)
+ASYNC_MAX_WORKERS = 16 # 执行阻塞HTTP调用的线程池大小
+
+# --- LLM响应录制/回放 (llm_response_cache) ---
+LLM_CACHE_MODE = "off" # "off" 关闭; "record" 请求模型并录制; "replay" 只回放录制结果(不访问网络，未命中即报错); "auto" 命中回放、未命中录制
+LLM_CACHE_DIR = "llm_cache" # 录制结果目录，每个请求一个JSON文件
+
+# --- 并发决策 (game_flow_manager) ---
+CONCURRENT_DAY_VOTING = False # 白天投票时同时向所有存活玩家发出请求，全部返回后再批量交给GM审核 (终端和Web界面都可一键采纳全部有效投票)
+CONCURRENT_WOLF_NOMINATIONS = False # 夜晚同时向所有提名狼人发出请求，只有决策狼人的最终袭击决定需要等待提名结果
+OVERLAP_NIGHT_ROLES = False # 夜晚开始时就在后台发出预言家查验请求，与狼人/女巫的行动(含GM审核)重叠进行
+
+# --- 无人值守自动审核 (ui_adapter.AutopilotPolicy，用于 --headless / --autopilot) ---
+AUTOPILOT_MAX_INVALID_RETRIES = 2 # 无效响应自动让AI修正重试的次数，用尽后跳过该行动(视为弃权)
+
+# --- 日志 (game_logger) ---
+LOG_LEVEL = "DEBUG" # 终端/Web模式的日志级别: TRACE(含每个Prompt的完整消息列表) / DEBUG / INFO / WARN / ERROR / CRITICAL / OFF
+LOG_LEVEL_HEADLESS = "WARN" # --headless、批量对局和性能基准使用的日志级别
+LOG_BUFFER_MAX_LINES = 256 # 无人值守/批量对局的日志缓冲 (game_logger.BufferedLogSink) 攒够这么多行才写出
+LOG_BUFFER_FLUSH_SECONDS = 1.0 # 不足时由后台线程每隔这么多秒写出一次
+
+# --- 历史压缩 (history_compactor) ---
+PLAYER_HISTORY_TOKEN_BUDGET = 6000 # 每个玩家发给模型的历史token上限(估算值)，超出时较早的天折叠为摘要；0 或 None 不限制。可在玩家配置中用 history_token_budget 单独覆盖
+
 # --- Game Phase Constants ---
 PHASE_GAME_SETUP = "GAME_SETUP"
 PHASE_START_GAME = "START_GAME" # 游戏正式开始的标志，在setup之后
@@ -81,4 +138,45 @@ ACTION_WITCH_SAVE = "witch_save" # 女巫使用解药
 ACTION_WITCH_POISON = "witch_poison" # 女巫使用特殊药剂
 ACTION_HUNTER_SHOOT = "hunter_shoot" # 猎人开枪
 # 如果有其他需要AI决策的行动，例如狼人内部讨论提名，也可以在这里定义常量。
-# ACTION_WOLF_NOMINATE = "wolf_nominate" (示例)
\ No newline at end of file
+# ACTION_WOLF_NOMINATE = "wolf_nominate" (示例)
+
+# --- 结构化决策 (player_interaction 为目标选择类行动请求受约束的输出) ---
+STRUCTURED_DECISIONS = False # 开启后通过 response_format (JSON Schema) 要求模型只回复 {"choice": 可选项之一}；可在玩家配置中用 structured_decisions 单独开关
+STRUCTURED_DECISION_ACTIONS = (
+    ACTION_VOTE, ACTION_WOLF_NOMINATE, ACTION_WOLF_KILL, ACTION_PROPHET_CHECK,
+    ACTION_WITCH_SAVE, ACTION_WITCH_POISON, ACTION_HUNTER_SHOOT,
+)
+STRUCTURED_DECISION_HANDLERS = ("standard", "content_with_separate_reasoning") # 回复正文中带 <think> 或走Qwen深度思考流的模型不适用
+
+# --- 提前结束决策流 (player_interaction 在回复中出现确定的合法选择后断开SSE流) ---
+EARLY_STOP_DECISIONS = False # 开启后目标选择类行动以流式请求，回答的第一行写完且本身是合法目标或不行动关键词时立即断开，省去之后理由的生成时间；批量对局和基准可用 --early-stop 开启
+EARLY_STOP_ACTIONS = STRUCTURED_DECISION_ACTIONS
+
+# --- 按行动类型的生成参数 (player_interaction 根据行动类型选取，原样放入请求体) ---
+# "default" 适用于所有行动，再由具体行动的配置覆盖；可在玩家配置中用同样结构的 generation_profiles 逐项覆盖，值为 None 表示不发送该参数。
+# 常用参数: max_tokens、stop、temperature、top_p、enable_thinking (Qwen等模型的思考开关)。
+# 默认不发送任何生成参数，沿用模型和服务端自己的设置；回复因 max_tokens 被截断 (finish_reason 为 length) 时 ai_interface 会记录警告。
+ACTION_GENERATION_PROFILES = {"default": {}}
+# 可选的决策类配置: 投票和夜间行动只需回复一个目标或关键词，发言不受限制。
+# 可整体赋给 ACTION_GENERATION_PROFILES，或复制到玩家的 generation_profiles；benchmark_game.py 的 --decision-profiles 使用它。
+_DECISION_PROFILE = {"max_tokens": 48, "stop": ["\n"], "temperature": 0.3}
+DECISION_GENERATION_PROFILES = {
+    "default": {},
+    ACTION_VOTE: _DECISION_PROFILE,
+    ACTION_WOLF_NOMINATE: _DECISION_PROFILE,
+    ACTION_WOLF_KILL: _DECISION_PROFILE,
+    ACTION_PROPHET_CHECK: _DECISION_PROFILE,
+    ACTION_WITCH_SAVE: {**_DECISION_PROFILE, "max_tokens": 16},
+    ACTION_WITCH_POISON: _DECISION_PROFILE,
+    ACTION_HUNTER_SHOOT: _DECISION_PROFILE,
+}
+# 这些处理器的模型在回答前先输出思考内容，思考也计入 max_tokens 并可能含有 stop 序列，
+# 因此除非该行动的配置显式设置 enable_thinking: False，否则不对它们发送 max_tokens 和 stop
+THINKING_RESPONSE_HANDLERS = ("qwen_stream_with_thinking", "think_tags_in_content", "content_with_separate_reasoning")
+GENERATION_CAP_PARAMS = ("max_tokens", "stop")
+
+# --- 流式显示 (Gradio 界面逐token显示AI发言) ---
+STREAM_SPEECHES_TO_UI = True # 界面支持时(Gradio)，发言类行动以SSE请求并逐token显示；GM仍在完整文本生成后审核
+STREAMED_ACTIONS = (ACTION_SPEECH, ACTION_LAST_WORDS)
+STREAMING_RESPONSE_HANDLERS = ("standard", "content_with_separate_reasoning", "qwen_stream_with_thinking") # <think> 标签混在正文中的模型不逐token显示，也不提前结束
+GRADIO_UI_REFRESH_SECONDS = 0.25 # Gradio 界面轮询刷新聊天记录的间隔，决定流式文本在页面上出现的延迟
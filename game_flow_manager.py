@@ -39,17 +39,20 @@ from game_config import (
     PLAYER_IS_POISONED_KEY, VOTE_SKIP,
     ACTION_WOLF_KILL, ACTION_WOLF_NOMINATE
 )
-from player_interaction import get_ai_decision_with_gm_approval
+from player_interaction import get_ai_decision_with_gm_approval, get_ai_decisions_with_batch_gm_approval, start_ai_response_prefetch
+from ai_interface import close_all_http_sessions
 from game_rules_engine import check_for_win_conditions, determine_speech_order, tally_votes_and_handle_ties
+from game_logger import LogMessage, is_log_enabled, resolve_log_message, emit_log_line
 
 MODULE_COLOR = Colors.GREEN
 
-def _log_flow_event(message: str, level: str = "INFO", day: Optional[int]=None, phase: Optional[str]=None, game_state_ref: Optional[GameState]=None):
+def _log_flow_event(message: LogMessage, level: str = "INFO", day: Optional[int]=None, phase: Optional[str]=None, game_state_ref: Optional[GameState]=None):
     ui_adapter = get_current_ui_adapter()
     
     if ui_adapter and is_gradio_mode():
-        ui_adapter.log_flow_event(message, level, day, phase)
-    else:
+        ui_adapter.log_flow_event(resolve_log_message(message), level, day, phase) # 观战者看到的对局进程不受 LOG_LEVEL 影响
+    elif is_log_enabled(level):
+        message = resolve_log_message(message)
         level_colored = colorize(level, log_level_color(level))
         prefix_module = colorize("[FlowManager:", MODULE_COLOR)
         prefix = f"\n{prefix_module}{level_colored}]"
@@ -57,7 +60,7 @@ def _log_flow_event(message: str, level: str = "INFO", day: Optional[int]=None,
             prefix += f" [{colorize('Day ' + str(day), Colors.BOLD)}]"
         if phase:
             prefix += f" [{game_phase_color(phase)}]"
-        print(f"{prefix} {message}")
+        emit_log_line(f"{prefix} {message}")
 
 
 def _announce_to_all_alive(game_state: GameState, message: str, is_gm_broadcast: bool = True):
@@ -92,23 +95,41 @@ def run_night_phase(game_state: GameState) -> Optional[str]:
     game_state.current_round_deaths = []
     game_state.set_player_poisoned_status(None, False)
 
+    # 预言家的查验不依赖狼人目标和女巫的决定，且夜晚结算前其Prompt所需的状态不会改变，
+    # 因此可以提前发出请求；审核和结果记录仍按原顺序进行，最终游戏状态与顺序执行一致。
+    prophet_prefetch_future = None
+    if game_config.OVERLAP_NIGHT_ROLES:
+        prophets_for_prefetch = game_state.get_players_by_role("预言家", alive_only=True)
+        if prophets_for_prefetch:
+            prophet_prefetch_future = start_ai_response_prefetch(game_state, prophets_for_prefetch[0], game_config.ACTION_PROPHET_CHECK)
+
     _log_flow_event(f"{role_color('狼人')}请睁眼，请依次表达袭击意向，并由决策狼人最终决定。", "INFO", game_state.game_day, game_state_ref=game_state)
-    alive_wolves_config_names = [name for name, data in game_state.players_data.items() if data["role"] == "狼人" and data["status"] == PLAYER_STATUS_ALIVE]
+    alive_wolves_config_names = game_state.get_players_by_role("狼人", alive_only=True)
     wolf_final_target = None
     if not alive_wolves_config_names:
         _log_flow_event(colorize("所有狼人已出局，夜晚跳过狼人行动。", Colors.YELLOW), "INFO", game_state.game_day, game_state_ref=game_state)
     else:
-        sorted_alive_wolves = sorted(alive_wolves_config_names, key=lambda wolf_name: game_state.players_data[wolf_name]["player_number"])
+        sorted_alive_wolves = alive_wolves_config_names # 已按编号排序
         decision_maker_wolf = sorted_alive_wolves[-1] if sorted_alive_wolves else None
         nominating_wolves = sorted_alive_wolves[:-1] if len(sorted_alive_wolves) > 1 else []
         if decision_maker_wolf:
             dm_display = _get_colored_player_display_name(game_state, decision_maker_wolf, True)
             _log_flow_event(f"{role_color('狼人')}内部讨论开始。决策者: {dm_display}。", "DEBUG", game_state.game_day, game_state_ref=game_state)
+        action_specific_info_for_nomination = {"decision_maker_name": decision_maker_wolf}
+        concurrent_nominations: Optional[Dict[str, Optional[Any]]] = None
+        if game_config.CONCURRENT_WOLF_NOMINATIONS and len(nominating_wolves) > 1:
+            # 提名只依赖游戏状态，不依赖其他狼人的提名，因此可以同时发出
+            _log_flow_event(f"并发收集 {bold(str(len(nominating_wolves)))} 名狼人的袭击意向。", "INFO", game_state.game_day, game_state_ref=game_state)
+            concurrent_nominations = get_ai_decisions_with_batch_gm_approval(
+                game_state, [(wolf_name, ACTION_WOLF_NOMINATE, action_specific_info_for_nomination) for wolf_name in nominating_wolves]
+            )
         for wolf_name_to_nominate in nominating_wolves:
             nom_wolf_display = _get_colored_player_display_name(game_state, wolf_name_to_nominate, True)
-            _log_flow_event(f"请狼人 {nom_wolf_display} 表达袭击意向。", "INFO", game_state.game_day, game_state_ref=game_state)
-            action_specific_info_for_nomination = {"decision_maker_name": decision_maker_wolf}
-            nominated_target = get_ai_decision_with_gm_approval(game_state, wolf_name_to_nominate, ACTION_WOLF_NOMINATE, action_specific_info=action_specific_info_for_nomination)
+            if concurrent_nominations is not None:
+                nominated_target = concurrent_nominations.get(wolf_name_to_nominate)
+            else:
+                _log_flow_event(f"请狼人 {nom_wolf_display} 表达袭击意向。", "INFO", game_state.game_day, game_state_ref=game_state)
+                nominated_target = get_ai_decision_with_gm_approval(game_state, wolf_name_to_nominate, ACTION_WOLF_NOMINATE, action_specific_info=action_specific_info_for_nomination)
             game_state.wolf_nominations_this_night[wolf_name_to_nominate] = nominated_target
             if nominated_target and game_state.get_player_info(nominated_target):
                 target_display_nom = _get_colored_player_display_name(game_state, nominated_target)
@@ -150,7 +171,7 @@ def run_night_phase(game_state: GameState) -> Optional[str]:
                  _log_flow_event(f"{colorize('GM参考', Colors.BRIGHT_BLACK)}：本轮狼人提名意向 - {'; '.join(nominations_summary_parts)}", "DEBUG", game_state.game_day, game_state_ref=game_state)
 
     _log_flow_event(f"{role_color('女巫')}请睁眼。", "INFO", game_state.game_day, game_state_ref=game_state)
-    alive_witches = [name for name, data in game_state.players_data.items() if data["role"] == "女巫" and data["status"] == PLAYER_STATUS_ALIVE]
+    alive_witches = game_state.get_players_by_role("女巫", alive_only=True)
     if alive_witches:
         witch_player_name = alive_witches[0]
         witch_display = _get_colored_player_display_name(game_state, witch_player_name, True)
@@ -194,11 +215,12 @@ def run_night_phase(game_state: GameState) -> Optional[str]:
         _log_flow_event(colorize("女巫已出局或不存在。", Colors.YELLOW), "INFO", game_state.game_day, game_state_ref=game_state)
 
     _log_flow_event(f"{role_color('预言家')}请睁眼，请选择一名玩家查验身份。", "INFO", game_state.game_day, game_state_ref=game_state)
-    alive_prophets = [name for name, data in game_state.players_data.items() if data["role"] == "预言家" and data["status"] == PLAYER_STATUS_ALIVE]
+    alive_prophets = game_state.get_players_by_role("预言家", alive_only=True)
     if alive_prophets:
         prophet_player_name = alive_prophets[0]
         prophet_display = _get_colored_player_display_name(game_state, prophet_player_name, True)
-        prophet_target = get_ai_decision_with_gm_approval(game_state, prophet_player_name, game_config.ACTION_PROPHET_CHECK)
+        prophet_prefetched_response = prophet_prefetch_future.result() if prophet_prefetch_future is not None else None
+        prophet_target = get_ai_decision_with_gm_approval(game_state, prophet_player_name, game_config.ACTION_PROPHET_CHECK, prefetched_response=prophet_prefetched_response)
         if prophet_target:
             target_info = game_state.get_player_info(prophet_target)
             is_wolf = target_info["role"] == "狼人" if target_info else False
@@ -210,7 +232,7 @@ def run_night_phase(game_state: GameState) -> Optional[str]:
                 prophet_player_data["prophet_check_history"].append({"day": game_state.game_day, "target": prophet_target, "is_wolf": is_wolf})
             target_display_prophet = _get_colored_player_display_name(game_state, prophet_target)
             result_colored = colorize("狼人阵营成员", Colors.RED) if is_wolf else colorize("好人阵营成员", Colors.GREEN)
-            prophet_personal_history_msg = f"夜晚{game_state.game_day}你查验了 {target_display_prophet}，他是 {result_colored}。"
+            prophet_personal_history_msg = f"夜晚{game_state.game_day}你查验了 {game_state.get_player_display_name(prophet_target)}，他是 {'狼人阵营成员' if is_wolf else '好人阵营成员'}。"
             game_state.add_player_message_to_history(prophet_player_name, prophet_personal_history_msg, role="system", action_type="prophet_result_private")
             _log_flow_event(f"{prophet_display}查验了 {target_display_prophet}，其身份是 {result_colored}。", "INFO", game_state.game_day, game_state_ref=game_state)
         else:
@@ -226,6 +248,7 @@ def run_night_phase(game_state: GameState) -> Optional[str]:
     if poison_kill_target and game_state.get_player_status(poison_kill_target) == PLAYER_STATUS_ALIVE:
         game_state.update_player_status(poison_kill_target, PLAYER_STATUS_DEAD, reason=f"夜晚{game_state.game_day}被女巫能力作用")
     game_state.last_night_events["final_deaths_this_night"] = list(game_state.current_round_deaths)
+    game_state.bump_state_version()
     
     ui_adapter = get_current_ui_adapter()
     if ui_adapter and is_gradio_mode():
@@ -310,15 +333,27 @@ def run_day_phase(game_state: GameState) -> Optional[str]:
                  _announce_to_all_alive(game_state, f"玩家 {speaker_display_speech} 选择不发言或被跳过。")
                  game_state.round_speeches_log.append({"player": speaker_name, "speech": "(选择不发言)"})
             game_state.last_round_final_speaker = speaker_name
+    if game_state.round_speeches_log:
+        game_state.add_game_event_log("SpeechRound", f"第{game_state.game_day}天发言结束。", {"speeches": list(game_state.round_speeches_log)})
 
     game_state.current_game_phase = PHASE_VOTE
     _announce_to_all_alive(game_state, bold("发言结束，现在开始投票。") + "请投票选出你认为是“狼人伙伴”的玩家。")
     votes_this_round: Dict[str, str] = {}
-    alive_voters = game_state.get_alive_players()
-    for voter_name in sorted(alive_voters, key=lambda name: game_state.players_data[name]["player_number"]):
+    sorted_alive_voters = game_state.get_alive_players() # 已按编号排序
+    concurrent_vote_targets: Optional[Dict[str, Optional[Any]]] = None
+    if game_config.CONCURRENT_DAY_VOTING and len(sorted_alive_voters) > 1:
+        # 每位投票者看到的都是同一份发言记录，且看不到彼此的投票，因此可以同时发出全部请求
+        _log_flow_event(f"并发收集 {bold(str(len(sorted_alive_voters)))} 名玩家的投票。", "DEBUG", game_state.game_day, game_state_ref=game_state)
+        concurrent_vote_targets = get_ai_decisions_with_batch_gm_approval(
+            game_state, [(voter_name, game_config.ACTION_VOTE, None) for voter_name in sorted_alive_voters]
+        )
+    for voter_name in sorted_alive_voters:
         if game_state.get_player_status(voter_name) != PLAYER_STATUS_ALIVE: continue
         voter_display = _get_colored_player_display_name(game_state, voter_name)
-        vote_target = get_ai_decision_with_gm_approval(game_state, voter_name, game_config.ACTION_VOTE)
+        if concurrent_vote_targets is not None:
+            vote_target = concurrent_vote_targets.get(voter_name)
+        else:
+            vote_target = get_ai_decision_with_gm_approval(game_state, voter_name, game_config.ACTION_VOTE)
         if vote_target:
             votes_this_round[voter_name] = vote_target
             target_display_vote = colorize("弃票", Colors.GREEN) if vote_target == VOTE_SKIP else _get_colored_player_display_name(game_state, vote_target)
@@ -329,6 +364,8 @@ def run_day_phase(game_state: GameState) -> Optional[str]:
     game_state.votes_current_round = votes_this_round
 
     player_voted_out, was_tie_and_no_one_out = tally_votes_and_handle_ties(game_state, votes_this_round)
+    game_state.add_game_event_log("VoteRound", f"第{game_state.game_day}天投票结束。",
+                                  {"votes": dict(votes_this_round), "voted_out": player_voted_out, "tie": was_tie_and_no_one_out})
     if was_tie_and_no_one_out:
         _announce_to_all_alive(game_state, "投票出现平票，本轮无人出局。")
     elif player_voted_out:
@@ -378,6 +415,13 @@ def run_day_phase(game_state: GameState) -> Optional[str]:
 
 
 def run_game_loop(game_state: GameState, ui_adapter):
+    try:
+        _run_game_loop_until_winner(game_state, ui_adapter)
+    finally:
+        close_all_http_sessions() # 游戏结束(包括异常/中断)时释放所有端点的keep-alive连接
+
+
+def _run_game_loop_until_winner(game_state: GameState, ui_adapter):
     if ui_adapter:
         from ui_adapter import set_current_ui_adapter
         set_current_ui_adapter(ui_adapter)
@@ -0,0 +1,154 @@
+# game_logger.py
+"""
+统一的日志后端。
+
+各模块保留自己的 _log_xxx 函数和前缀格式，但都先用 is_log_enabled 判断级别：低于当前级别的日志
+在拼接颜色和前缀之前就返回。消息也可以是返回字符串的无参函数，只有确实需要输出时才会调用，
+适合 TRACE/DEBUG 级别的大段内容 (完整消息列表、请求预览等)。
+
+格式化好的行交给可替换的 sink：
+- StreamLogSink: 默认，写到当前的 sys.stdout (与 print 相同，redirect_stdout 照常生效)；
+- BufferedLogSink: 攒够若干行或超过一定时间才一次性写出 (后台线程按时写出，不必等下一行)，无人值守和批量对局使用；结束时需要 flush_log_sink()；
+- MemoryLogSink: 只在内存中保留最近若干行，不做任何IO，出错时可以取出作为现场；
+- NullLogSink:   全部丢弃。
+"""
+import atexit
+import sys
+import threading
+from collections import deque
+from typing import Callable, List, Optional, Union
+
+import game_config
+
+LOG_LEVELS = {"TRACE": 5, "DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40, "CRITICAL": 50, "OFF": 100}
+_UNKNOWN_LEVEL_VALUE = LOG_LEVELS["INFO"] # 未登记的级别名 (例如游戏事件类型) 按 INFO 处理
+
+LogMessage = Union[str, Callable[[], str]]
+
+
+class StreamLogSink:
+    """写到指定的流；stream 为 None 时写到调用时的 sys.stdout。"""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, line: str) -> None:
+        print(line, file=self.stream)
+
+
+class BufferedLogSink:
+    """
+    先放进内存缓冲，攒够 max_lines 行时立即写出；不足时由后台线程每 flush_seconds 秒写出一次，
+    因此重试退避或卡住之前的最后一条警告也不会一直留在缓冲里。
+    stream 为 None 时写到写出时的 sys.stdout，因此在结束 redirect_stdout 之前要先 flush()。
+    缓冲中的行在写出之前不会出现，与直接 print 的输出之间可能有先后错位。
+    """
+
+    def __init__(self, stream=None, max_lines: Optional[int] = None, flush_seconds: Optional[float] = None):
+        self.stream = stream
+        self.max_lines = game_config.LOG_BUFFER_MAX_LINES if max_lines is None else max_lines
+        self.flush_seconds = game_config.LOG_BUFFER_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    def write(self, line: str) -> None:
+        with self._lock:
+            self._buffer.append(line)
+            if self._flusher is None and self.flush_seconds and self.flush_seconds > 0:
+                self._flusher = threading.Thread(target=self._flush_periodically, name="log-flusher", daemon=True)
+                self._flusher.start()
+            if len(self._buffer) < self.max_lines:
+                return
+            lines, self._buffer = self._buffer, []
+            self._write_lines(lines)
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.flush_seconds):
+            self.flush()
+
+    def close(self) -> None:
+        """写出剩余的行并停止后台线程。"""
+        self._closed.set()
+        self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            self._write_lines(lines)
+
+    def _write_lines(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        stream = self.stream or sys.stdout
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+
+
+class MemoryLogSink:
+    """只保留最近 max_lines 行。"""
+
+    def __init__(self, max_lines: int = 200):
+        self._lines = deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+
+    def write(self, line: str) -> None:
+        with self._lock:
+            self._lines.append(line)
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            return list(self._lines)
+
+
+class NullLogSink:
+    def write(self, line: str) -> None:
+        pass
+
+
+_threshold = LOG_LEVELS.get(game_config.LOG_LEVEL.upper(), _UNKNOWN_LEVEL_VALUE)
+_sink = StreamLogSink()
+
+
+def configure_logging(level: Optional[str] = None, sink=None) -> None:
+    """设置当前进程的日志级别和/或 sink；参数为 None 的部分保持不变。替换 sink 前先写出原 sink 中缓冲的行。"""
+    global _threshold, _sink
+    if level is not None:
+        if level.upper() not in LOG_LEVELS:
+            raise ValueError(f"不支持的日志级别: {level} (可选: {', '.join(LOG_LEVELS)})")
+        _threshold = LOG_LEVELS[level.upper()]
+    if sink is not None:
+        if sink is not _sink:
+            flush_log_sink()
+        _sink = sink
+
+
+def flush_log_sink() -> None:
+    """写出当前 sink 中缓冲的行 (不带缓冲的 sink 无需处理)。程序退出时也会自动调用。"""
+    flush = getattr(_sink, "flush", None)
+    if flush is not None:
+        flush()
+
+
+atexit.register(flush_log_sink)
+
+
+def get_log_sink():
+    return _sink
+
+
+def get_log_level() -> str:
+    return next(name for name, value in LOG_LEVELS.items() if value == _threshold)
+
+
+def is_log_enabled(level: str) -> bool:
+    return LOG_LEVELS.get(level, _UNKNOWN_LEVEL_VALUE) >= _threshold
+
+
+def resolve_log_message(message: LogMessage) -> str:
+    return message() if callable(message) else message
+
+
+def emit_log_line(line: str) -> None:
+    _sink.write(line)
@@ -26,18 +26,21 @@ except ImportError:
     def bold(text: str) -> str: return text
 
 from game_state import GameState
+from game_logger import LogMessage, is_log_enabled, resolve_log_message, emit_log_line
 from game_config import (
     PLAYER_STATUS_ALIVE, PLAYER_STATUS_DEAD,
-    ALL_POSSIBLE_ROLES,
+    ALL_POSSIBLE_ROLES, FACTION_WOLF, FACTION_GOD, FACTION_VILLAGER,
     VOTE_SKIP
 )
 
 MODULE_COLOR = Colors.YELLOW # RulesEngine 用黄色
 
-def _log_rules_event(message: str, level: str = "INFO", game_state_ref: Optional[GameState] = None): # game_state_ref for context if needed
+def _log_rules_event(message: LogMessage, level: str = "INFO", game_state_ref: Optional[GameState] = None): # game_state_ref for context if needed
+    if not is_log_enabled(level):
+        return
     level_colored = colorize(level, log_level_color(level))
     prefix_module = colorize("[RulesEngine:", MODULE_COLOR)
-    print(f"{prefix_module}{level_colored}] {message}")
+    emit_log_line(f"{prefix_module}{level_colored}] {resolve_log_message(message)}")
 
 def _get_colored_player_display_name_from_rules(game_state: GameState, player_config_name: Optional[str], show_role: bool = False) -> str:
     if not player_config_name:
@@ -48,29 +51,25 @@ def _get_colored_player_display_name_from_rules(game_state: GameState, player_co
 
 
 def check_for_win_conditions(game_state: GameState) -> Optional[str]:
-    alive_players_data = [p_data for p_data in game_state.players_data.values() if p_data["status"] == PLAYER_STATUS_ALIVE]
-    if not alive_players_data:
+    """按 GameState 维护的各阵营存活人数判断胜负，O(1)。"""
+    num_alive_total = game_state.count_alive_players()
+    if num_alive_total == 0:
         _log_rules_event(colorize("所有玩家都已出局，游戏平局或出现异常。", Colors.RED), "WARN", game_state_ref=game_state)
         game_state.game_winner_message = "异常平局：所有玩家都已出局" # Store for report
         return "异常平局"
 
-    num_alive_wolves = sum(1 for p in alive_players_data if p["role"] == "狼人")
-    num_alive_prophets = sum(1 for p in alive_players_data if p["role"] == "预言家")
-    num_alive_witches = sum(1 for p in alive_players_data if p["role"] == "女巫")
-    num_alive_hunters = sum(1 for p in alive_players_data if p["role"] == "猎人")
-    num_alive_villagers = sum(1 for p in alive_players_data if p["role"] == "平民")
-
-    num_alive_gods = num_alive_prophets + num_alive_witches + num_alive_hunters
+    num_alive_wolves = game_state.count_alive_by_faction(FACTION_WOLF)
+    num_alive_gods = game_state.count_alive_by_faction(FACTION_GOD)
+    num_alive_villagers = game_state.count_alive_by_faction(FACTION_VILLAGER)
     num_alive_good_guys = num_alive_gods + num_alive_villagers
 
-    log_msg = (
+    _log_rules_event(lambda: (
         f"胜利条件检查: {role_color('狼人')}-{bold(str(num_alive_wolves))}, "
-        f"神-{bold(str(num_alive_gods))} ({role_color('预言家')}{bold(str(num_alive_prophets))},"
-        f"{role_color('女巫')}{bold(str(num_alive_witches))},{role_color('猎人')}{bold(str(num_alive_hunters))}), "
+        f"神-{bold(str(num_alive_gods))} ({role_color('预言家')}{bold(str(game_state.count_alive_by_role('预言家')))},"
+        f"{role_color('女巫')}{bold(str(game_state.count_alive_by_role('女巫')))},{role_color('猎人')}{bold(str(game_state.count_alive_by_role('猎人')))}), "
         f"{role_color('平民')}-{bold(str(num_alive_villagers))}, "
-        f"总好人-{bold(str(num_alive_good_guys))}, 总存活-{bold(str(len(alive_players_data)))}"
-    )
-    _log_rules_event(log_msg, "DEBUG", game_state_ref=game_state)
+        f"总好人-{bold(str(num_alive_good_guys))}, 总存活-{bold(str(num_alive_total))}"
+    ), "DEBUG", game_state_ref=game_state)
 
     winner_message = None
     if num_alive_wolves == 0 and num_alive_good_guys > 0:
@@ -99,9 +98,7 @@ def check_for_win_conditions(game_state: GameState) -> Optional[str]:
 
 
 def determine_speech_order(game_state: GameState, last_night_dead_player: Optional[str] = None) -> List[str]:
-    alive_player_config_names = game_state.get_alive_players()
-    if not alive_player_config_names: return []
-    sorted_alive_players = sorted(alive_player_config_names, key=lambda name: game_state.players_data[name]["player_number"])
+    sorted_alive_players = game_state.get_alive_players() # 已按编号排序
     if not sorted_alive_players: return []
 
     start_player_config_name = None
@@ -179,7 +176,7 @@ def tally_votes_and_handle_ties(
         voter_display_colored = _get_colored_player_display_name_from_rules(game_state, voter)
         target_display_colored = colorize("弃票", Colors.GREEN) if target == VOTE_SKIP else _get_colored_player_display_name_from_rules(game_state, target)
         _log_rules_event(f"{voter_display_colored} 投给了 --> {target_display_colored}", "DEBUG", game_state_ref=game_state)
-        if target != VOTE_SKIP and target in game_state.players_data and game_state.players_data[target]["status"] == PLAYER_STATUS_ALIVE:
+        if target != VOTE_SKIP and game_state.is_player_alive(target):
             vote_counts[target] += 1
             num_actual_votes +=1
         elif target == VOTE_SKIP: pass
@@ -217,4 +214,5 @@ def tally_votes_and_handle_ties(
     player_voted_out = players_with_max_votes[0]
     player_voted_out_display_colored = _get_colored_player_display_name_from_rules(game_state, player_voted_out)
     _log_rules_event(f"玩家 {player_voted_out_display_colored} 被投票出局 (获得 {bold(str(max_votes))} 票)。", "INFO", game_state_ref=game_state)
-    return player_voted_out, False
\ No newline at end of file
+    return player_voted_out, False
+
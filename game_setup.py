@@ -24,20 +24,23 @@ except ImportError:
     # (add other colors if needed by this file)
 
 
-from game_state import GameState
+from game_state import GameState, Player
+from game_logger import LogMessage, is_log_enabled, resolve_log_message, emit_log_line
 from game_config import (
     CONFIG_FILENAME, ROLE_DISTRIBUTIONS, MIN_PLAYERS, ALL_POSSIBLE_ROLES,
     PHASE_START_GAME, PLAYER_STATUS_ALIVE,
     WITCH_HAS_SAVE_POTION_KEY, WITCH_HAS_POISON_POTION_KEY,
-    HUNTER_CAN_SHOOT_KEY, PLAYER_IS_POISONED_KEY
+    HUNTER_CAN_SHOOT_KEY
 )
 
 MODULE_COLOR = Colors.CYAN # Setup 用青色
 
-def _log_setup_event(message: str, level: str = "INFO"):
+def _log_setup_event(message: LogMessage, level: str = "INFO"):
+    if not is_log_enabled(level):
+        return
     level_colored = colorize(level, log_level_color(level))
     prefix_module = colorize("[Setup:", MODULE_COLOR)
-    print(f"{prefix_module}{level_colored}] {message}")
+    emit_log_line(f"{prefix_module}{level_colored}] {resolve_log_message(message)}")
 
 def _get_colored_player_display_name_from_setup(game_state: GameState, player_config_name: Optional[str], show_role_to_gm: bool = False) -> str:
     """专门为本模块使用的玩家名上色函数"""
@@ -128,38 +131,33 @@ def _assign_roles_and_populate_players_data(
             )
             _log_setup_event(warn_msg, "WARNING")
 
-        game_state.players_data[config_name] = {
-            "config_name": config_name,
-            "player_number": i + 1,
-            "role": assigned_role,
-            "status": PLAYER_STATUS_ALIVE,
-            "history": [],
-            "api_endpoint": player_config_entry.get("api_endpoint"),
-            "api_key": player_config_entry.get("api_key"),
-            "model": player_config_entry.get("model"),
-            "response_handler_type": player_config_entry.get("response_handler_type", "standard"),
-            WITCH_HAS_SAVE_POTION_KEY: True if assigned_role == "女巫" else None,
-            WITCH_HAS_POISON_POTION_KEY: True if assigned_role == "女巫" else None,
-            HUNTER_CAN_SHOOT_KEY: True if assigned_role == "猎人" else None,
-            PLAYER_IS_POISONED_KEY: False,
-            "times_checked_by_prophet": 0,
-            "is_confirmed_good_by_prophet": None,
-        }
+        game_state.register_player(config_name, Player.for_role(
+            config_name, i + 1, assigned_role,
+            api_endpoint=player_config_entry.get("api_endpoint"),
+            api_key=player_config_entry.get("api_key"),
+            model=player_config_entry.get("model"),
+            response_handler_type=player_config_entry.get("response_handler_type", "standard"),
+            history_token_budget=player_config_entry.get("history_token_budget"), # None 时使用 game_config.PLAYER_HISTORY_TOKEN_BUDGET
+            structured_decisions=player_config_entry.get("structured_decisions"), # None 时使用 game_config.STRUCTURED_DECISIONS
+            generation_profiles=player_config_entry.get("generation_profiles"), # 覆盖 game_config.ACTION_GENERATION_PROFILES 中的对应项
+            times_checked_by_prophet=0,
+            is_confirmed_good_by_prophet=None,
+        )) # 女巫的药、猎人的枪等能力字段由 Player.for_role 按角色设置
         # 使用辅助函数获取带颜色的玩家显示名
         player_display_colored = _get_colored_player_display_name_from_setup(game_state, config_name, True)
         _log_setup_event(f"{player_display_colored} (编号: {bold(str(i+1))})", "INFO")
 
-    wolf_count = sum(1 for p_data in game_state.players_data.values() if p_data['role'] == '狼人')
+    wolf_count = len(game_state.get_players_by_role('狼人'))
     wolf_count_colored = bold(str(wolf_count))
     _log_setup_event(f"提示：当前配置中有 {wolf_count_colored} 名{role_color('狼人')}。", "INFO")
     return True
 
 
-def initialize_game(game_state_instance: GameState) -> bool:
+def initialize_game(game_state_instance: GameState, config_filename: str = CONFIG_FILENAME) -> bool:
     _log_setup_event(bold("开始游戏初始化流程..."), "INFO")
     game_state_instance.current_game_phase = "GAME_SETUP_IN_PROGRESS"
 
-    raw_player_configs = _load_raw_player_configurations_from_file()
+    raw_player_configs = _load_raw_player_configurations_from_file(config_filename)
     if not raw_player_configs:
         _log_setup_event(colorize("无法加载玩家配置，初始化失败。", Colors.RED), "CRITICAL")
         return False
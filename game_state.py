@@ -1,10 +1,11 @@
 # game_state.py (修改版 - 颜色日志 + 为日志添加day/phase)
 import time
-from typing import List, Dict, Any, Optional, Tuple
+import unicodedata
+from typing import List, Dict, Any, Optional, Tuple, Union
 
 # 假设 terminal_colors.py 在项目根目录或者Python可以找到的路径下
 try:
-    from terminal_colors import colorize, Colors, grey, log_level_color, player_name_color, red, green
+    from terminal_colors import colorize, Colors, grey, log_level_color, player_name_color, red, green, strip_ansi_codes
 except ImportError:
     # Fallback if terminal_colors is not found
     def colorize(text: str, _color_code: str) -> str: return text
@@ -14,22 +15,173 @@ except ImportError:
     def player_name_color(name: str, _player_data=None, _game_state=None) -> str: return name
     def red(text: str) -> str: return text
     def green(text: str) -> str: return text
+    def strip_ansi_codes(text: str) -> str: return text if isinstance(text, str) else str(text)
 
 
 # 确保从 game_config 引入了所有需要的常量
 from game_config import (
     PHASE_GAME_SETUP, PLAYER_STATUS_ALIVE, PLAYER_STATUS_DEAD,
     WITCH_HAS_SAVE_POTION_KEY, WITCH_HAS_POISON_POTION_KEY,
-    HUNTER_CAN_SHOOT_KEY, PLAYER_IS_POISONED_KEY, VOTE_SKIP
+    HUNTER_CAN_SHOOT_KEY, PLAYER_IS_POISONED_KEY, VOTE_SKIP, ROLE_FACTIONS
 )
+from history_compactor import compact_player_history
+from game_logger import is_log_enabled, emit_log_line
 
 MODULE_COLOR_GAMELOG = Colors.BRIGHT_BLACK # GameLog 用灰色
 
+
+def normalize_player_reference(text: str) -> str:
+    """
+    统一AI回复中指代玩家的写法: NFKC (全角数字/字母转半角)、转小写，并去掉空白和标点 (括号、引号、句号等)。
+    "玩家3 (PlayerAI3)"、"【３号】"、"playerai3。" 分别变为 "玩家3playerai3"、"3号"、"playerai3"。
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(ch for ch in text if unicodedata.category(ch)[0] not in "PZC")
+
+
+def _player_reference_aliases(player_config_name: str, player_number: Optional[int]) -> List[str]:
+    name = normalize_player_reference(player_config_name)
+    aliases = [name]
+    if player_number is not None:
+        n = str(player_number)
+        aliases += [n, f"{n}号", f"玩家{n}", f"{n}号玩家", f"玩家{n}{name}", f"{n}号{name}", f"{n}{name}", f"{name}玩家{n}"]
+    return aliases
+
+
+class Player:
+    """
+    一名玩家的记录。固定字段用 __slots__ 存储，其余键放在 extras 里；
+    同时支持字典式访问 (player["role"]、player.get(...)、"key" in player)，原来按字典使用玩家数据的代码无需修改。
+    角色专属的能力字段 (女巫的药、猎人的枪) 只在对应角色上设置，未设置的字段视为不存在。
+    """
+    __slots__ = (
+        "config_name", "player_number", "role", "status", "history",
+        "api_endpoint", "api_key", "model", "response_handler_type", "history_token_budget", "structured_decisions",
+        "generation_profiles",
+        WITCH_HAS_SAVE_POTION_KEY, WITCH_HAS_POISON_POTION_KEY, HUNTER_CAN_SHOOT_KEY, PLAYER_IS_POISONED_KEY,
+        "times_checked_by_prophet", "is_confirmed_good_by_prophet", "prophet_check_history",
+        "extras",
+    )
+    _FIELDS = frozenset(__slots__) - {"extras"}
+
+    def __init__(self, config_name: str, player_number: int, role: str, status: str = PLAYER_STATUS_ALIVE, **fields: Any):
+        self.config_name = config_name
+        self.player_number = player_number
+        self.role = role
+        self.status = status
+        self.history: List[Dict[str, Any]] = []
+        self.extras: Dict[str, Any] = {}
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def for_role(cls, config_name: str, player_number: int, role: str, **fields: Any) -> "Player":
+        """按角色初始化能力字段的新玩家。"""
+        player = cls(config_name, player_number, role, **fields)
+        player[PLAYER_IS_POISONED_KEY] = False
+        if role == "女巫":
+            player[WITCH_HAS_SAVE_POTION_KEY] = True
+            player[WITCH_HAS_POISON_POTION_KEY] = True
+        elif role == "猎人":
+            player[HUNTER_CAN_SHOOT_KEY] = True
+        return player
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Player":
+        fields = {key: value for key, value in data.items() if key not in ("config_name", "player_number", "role", "status")}
+        return cls(data["config_name"], data["player_number"], data["role"], data.get("status", PLAYER_STATUS_ALIVE), **fields)
+
+    # --- 字典式访问 ---
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return self.extras[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in self._FIELDS:
+            setattr(self, key, value)
+        else:
+            self.extras[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in self._FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        else:
+            del self.extras[key]
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._FIELDS:
+            return hasattr(self, key)
+        return key in self.extras
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def keys(self) -> List[str]:
+        return [key for key in self.__slots__ if key != "extras" and hasattr(self, key)] + list(self.extras)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self) -> List[Any]:
+        return [self[key] for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __bool__(self) -> bool:
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def copy(self) -> "Player":
+        """快照: 字段浅拷贝，历史和查验记录复制为新列表，之后追加互不影响。"""
+        clone = Player.__new__(Player)
+        for key in self.__slots__:
+            if hasattr(self, key):
+                setattr(clone, key, getattr(self, key))
+        clone.history = list(self.history)
+        clone.extras = dict(self.extras)
+        if hasattr(self, "prophet_check_history"):
+            clone.prophet_check_history = list(self.prophet_check_history)
+        return clone
+
+    def __repr__(self) -> str:
+        return f"Player({self.to_dict()!r})"
+
+
 class GameState:
     def __init__(self):
-        self.players_data: Dict[str, Dict[str, Any]] = {}
+        self.players_data: Dict[str, Player] = {}
         self.ai_player_config_names: List[str] = []
+        # 玩家索引，由 register_player 建立、update_player_status 维护，避免热路径反复扫描 players_data
+        self._names_by_role: Dict[str, List[str]] = {} # 按编号排序
+        self._alive_names: set = set()
+        self._alive_names_sorted: Optional[List[str]] = None # 按编号排序的存活玩家，状态变化时置空重建
+        self._alive_count_by_role: Dict[str, int] = {}
+        self._alive_count_by_faction: Dict[str, int] = {} # 见 game_config.ROLE_FACTIONS，未登记阵营的角色不计入
+        self._name_by_number: Dict[int, str] = {}
+        self._name_by_alias: Dict[str, Optional[str]] = {} # 规范化后的别名 -> 配置名；多名玩家共用的别名为 None (有歧义，不匹配)
         self.game_day: int = 0
+        self.state_version: int = 0 # 影响Prompt公共段落的状态(玩家存活、夜晚事件)每次变化时递增，供 werewolf_prompts 的缓存判断是否失效
         self.current_game_phase: str = PHASE_GAME_SETUP
 
         self.last_night_events: Dict[str, Any] = {}
@@ -51,6 +203,9 @@ class GameState:
 
         self.reset_nightly_events() # 在所有相关属性定义后调用
 
+    def bump_state_version(self):
+        self.state_version += 1
+
     def reset_nightly_events(self):
         """重置每晚的事件记录。"""
         self.last_night_events = {
@@ -64,6 +219,7 @@ class GameState:
             "hunter_triggered_by_night_death": None
         }
         self.wolf_nominations_this_night.clear() # 使用 clear() 更安全
+        self.bump_state_version()
 
     def reset_daily_round_data(self):
         """重置每个白天发言/投票回合开始前的数据。"""
@@ -86,14 +242,78 @@ class GameState:
         log_entry["details"] = current_details # 使用更新后的 details
 
         self.game_log.append(log_entry)
-        
+
+        # 日志总是记录；只有级别开启时才格式化和输出 (Error 事件按 ERROR，其余按 INFO)
+        if not is_log_enabled("ERROR" if event_type == "Error" else "INFO"):
+            return
         # 为终端输出上色
         event_type_colored = colorize(event_type, log_level_color(event_type.upper())) # 尝试用日志级别颜色
         details_print_str = f" {grey(str(current_details))}" if current_details else ""
-        print(f"{colorize('[GameLog', MODULE_COLOR_GAMELOG)}|{event_type_colored}|{colorize(timestamp, Colors.BRIGHT_BLACK)}] {message}{details_print_str}")
+        emit_log_line(f"{colorize('[GameLog', MODULE_COLOR_GAMELOG)}|{event_type_colored}|{colorize(timestamp, Colors.BRIGHT_BLACK)}] {message}{details_print_str}")
+
+
+    def register_player(self, player_config_name: str, player_data: Union[Player, Dict[str, Any]]) -> Player:
+        """加入一名玩家 (字典会转换为 Player) 并更新索引。玩家的角色和编号之后不应再改变，状态只能通过 update_player_status 修改。"""
+        if not isinstance(player_data, Player):
+            player_data = Player.from_dict(player_data)
+        if player_config_name in self.players_data:
+            self._unindex_player(player_config_name)
+        self.players_data[player_config_name] = player_data
+        role = player_data.get("role")
+        number = player_data.get("player_number")
+        self._names_by_role.setdefault(role, []).append(player_config_name)
+        self._names_by_role[role].sort(key=self._player_number_key)
+        if number is not None:
+            self._name_by_number[number] = player_config_name
+        self._index_player_aliases(player_config_name)
+        if player_data.get("status") == PLAYER_STATUS_ALIVE:
+            self._mark_alive(player_config_name, role)
+        self.bump_state_version()
+        return player_data
+
+    def _unindex_player(self, player_config_name: str) -> None:
+        old_data = self.players_data[player_config_name]
+        role = old_data.get("role")
+        if player_config_name in self._names_by_role.get(role, []):
+            self._names_by_role[role].remove(player_config_name)
+        self._name_by_number.pop(old_data.get("player_number"), None)
+        self._name_by_alias.clear()
+        for other_name in self.players_data:
+            if other_name != player_config_name:
+                self._index_player_aliases(other_name)
+        self._mark_dead(player_config_name, role)
+
+    def _index_player_aliases(self, player_config_name: str) -> None:
+        for alias in _player_reference_aliases(player_config_name, self.players_data[player_config_name].get("player_number")):
+            if not alias:
+                continue
+            existing = self._name_by_alias.get(alias, player_config_name)
+            self._name_by_alias[alias] = player_config_name if existing == player_config_name else None
+
+    def _mark_alive(self, player_config_name: str, role: Optional[str]) -> None:
+        if player_config_name in self._alive_names:
+            return
+        self._alive_names.add(player_config_name)
+        self._alive_names_sorted = None
+        self._alive_count_by_role[role] = self._alive_count_by_role.get(role, 0) + 1
+        faction = ROLE_FACTIONS.get(role)
+        if faction:
+            self._alive_count_by_faction[faction] = self._alive_count_by_faction.get(faction, 0) + 1
+
+    def _mark_dead(self, player_config_name: str, role: Optional[str]) -> None:
+        if player_config_name not in self._alive_names:
+            return
+        self._alive_names.discard(player_config_name)
+        self._alive_names_sorted = None
+        self._alive_count_by_role[role] -= 1
+        faction = ROLE_FACTIONS.get(role)
+        if faction:
+            self._alive_count_by_faction[faction] -= 1
 
+    def _player_number_key(self, player_config_name: str) -> int:
+        return self.players_data[player_config_name].get("player_number", 0)
 
-    def get_player_info(self, player_config_name: str) -> Optional[Dict[str, Any]]:
+    def get_player_info(self, player_config_name: str) -> Optional[Player]:
         return self.players_data.get(player_config_name)
 
     def get_player_role(self, player_config_name: str) -> Optional[str]:
@@ -120,6 +340,11 @@ class GameState:
             return True
 
         player_info["status"] = new_status
+        if new_status == PLAYER_STATUS_ALIVE:
+            self._mark_alive(player_config_name, player_info.get("role"))
+        else:
+            self._mark_dead(player_config_name, player_info.get("role"))
+        self.bump_state_version()
         log_message = f"玩家 {player_display_for_log} 状态从 {old_status} 更新为 {new_status} (原因: {reason})"
         self.add_game_event_log(
             "StatusUpdate",
@@ -140,11 +365,46 @@ class GameState:
         return True
 
     def get_alive_players(self, exclude_self_config_name: Optional[str] = None) -> List[str]:
-        alive = [name for name, data in self.players_data.items() if data.get("status") == PLAYER_STATUS_ALIVE]
-        if exclude_self_config_name and exclude_self_config_name in alive:
+        """按编号排序的存活玩家 (返回新列表，调用方可以修改)。"""
+        if self._alive_names_sorted is None:
+            self._alive_names_sorted = sorted(self._alive_names, key=self._player_number_key)
+        alive = list(self._alive_names_sorted)
+        if exclude_self_config_name and exclude_self_config_name in self._alive_names:
             alive.remove(exclude_self_config_name)
         return alive
 
+    def is_player_alive(self, player_config_name: Optional[str]) -> bool:
+        return player_config_name in self._alive_names
+
+    def get_players_by_role(self, role: str, alive_only: bool = False) -> List[str]:
+        """按编号排序的某角色玩家。"""
+        names = self._names_by_role.get(role, [])
+        if alive_only:
+            return [name for name in names if name in self._alive_names]
+        return list(names)
+
+    def count_alive_players(self) -> int:
+        return len(self._alive_names)
+
+    def count_alive_by_role(self, role: str) -> int:
+        return self._alive_count_by_role.get(role, 0)
+
+    def count_alive_by_faction(self, faction: str) -> int:
+        """faction 取 game_config.FACTION_WOLF / FACTION_GOD / FACTION_VILLAGER。"""
+        return self._alive_count_by_faction.get(faction, 0)
+
+    def get_player_name_by_number(self, player_number: int) -> Optional[str]:
+        return self._name_by_number.get(player_number)
+
+    def find_player_by_reference(self, reference: str) -> Optional[str]:
+        """
+        把AI回复中的玩家指代解析为配置名: 配置名、编号、"N号"、"玩家N"、"玩家N 配置名" 等，
+        忽略大小写、全角/半角、空白和标点 (见 normalize_player_reference)。找不到或有歧义时返回 None。
+        """
+        if reference in self.players_data:
+            return reference
+        return self._name_by_alias.get(normalize_player_reference(reference))
+
     def get_player_display_name(self, player_config_name: Optional[str], show_role_to_gm: bool = False, show_number: bool = True) -> str:
         if not player_config_name:
             return "未知玩家"
@@ -169,13 +429,14 @@ class GameState:
         if player_info:
             if "history" not in player_info or not isinstance(player_info["history"], list):
                 player_info["history"] = []
+            content = strip_ansi_codes(content) # 历史会原样发给模型，不能带终端颜色码
             history_entry: Dict[str, Any] = {"role": role, "content": content}
-            meta: Dict[str, Any] = {}
+            meta: Dict[str, Any] = {"day": self.game_day} # 历史压缩按天折叠，见 history_compactor
             if action_type: meta["action_type"] = action_type
             if is_error: meta["is_error_response"] = True
             if is_accepted_invalid: meta["is_accepted_invalid"] = True
             if is_gm_override: meta["is_gm_override"] = True
-            if meta: history_entry["_meta"] = meta
+            history_entry["_meta"] = meta
             player_info["history"].append(history_entry)
             
             log_details = {
@@ -200,6 +461,10 @@ class GameState:
             return [{"role": entry["role"], "content": entry["content"]} for entry in player_info["history"] if "role" in entry and "content" in entry]
         return []
 
+    def get_compacted_player_history(self, player_config_name: str) -> List[Dict[str, Any]]:
+        """用于生成Prompt的历史 (保留 _meta)，超过该玩家的token预算时把较早的天折叠为摘要。"""
+        return compact_player_history(self, player_config_name)
+
     def use_witch_potion(self, witch_config_name: str, potion_type: str, target_player_name: Optional[str] = None): # 添加 target_player_name
         witch_info = self.get_player_info(witch_config_name)
         witch_display_name = self.get_player_display_name(witch_config_name)
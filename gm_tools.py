@@ -29,13 +29,16 @@ except ImportError:
 
 from game_state import GameState, PLAYER_STATUS_ALIVE, PLAYER_STATUS_DEAD
 import game_config # For role list, VOTE_SKIP etc.
+from game_logger import LogMessage, is_log_enabled, resolve_log_message, emit_log_line
 
 MODULE_COLOR = Colors.BRIGHT_YELLOW # GMTool 用亮黄色
 
-def _log_gm_tool(message: str, level: str = "INFO", game_state_ref: Optional[GameState] = None): # game_state_ref for context
+def _log_gm_tool(message: LogMessage, level: str = "INFO", game_state_ref: Optional[GameState] = None): # game_state_ref for context
+    if not is_log_enabled(level):
+        return
     level_colored = colorize(level, log_level_color(level))
     prefix_module = colorize("[GMTool:", MODULE_COLOR)
-    print(f"{prefix_module}{level_colored}] {message}")
+    emit_log_line(f"{prefix_module}{level_colored}] {resolve_log_message(message)}")
 
 def _get_colored_player_display_name_from_gm(game_state: GameState, player_config_name: Optional[str], show_role: bool = False) -> str:
     if not player_config_name:
@@ -1,34 +1,31 @@
 # gradio_game_controller.py (最终完整版)
 import threading
 import traceback
-import re
-from typing import Optional, Callable, Dict, Any, List
+from typing import Optional, Callable, Dict, Any, List, Tuple
 
 from gradio_interface import GradioGameInterface
-from ui_adapter import GradioUIAdapter, GMApprovalResult, set_current_ui_adapter
+from ui_adapter import GradioUIAdapter, GMApprovalResult, AutopilotPolicy, set_current_ui_adapter
 from game_state import GameState
 from game_setup import initialize_game
 from game_flow_manager import run_game_loop
 from assets_base64 import format_gm_action_message
+from terminal_colors import output_target, render_for_target, OUTPUT_TARGET_GRADIO # Gradio 界面只显示纯文本
 import game_config
 
-def strip_ansi_codes(text: str) -> str:
-    if not isinstance(text, str):
-        return str(text)
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
-
 class GradioGameController:
     # ... __init__, _setup_ui_adapter, create_interface, start_game 保持不变 ...
-    def __init__(self):
+    def __init__(self, autopilot: bool = False):
         self.interface = GradioGameInterface()
         self.game_state: Optional[GameState] = None
         self.ui_adapter: Optional[GradioUIAdapter] = None
         self.game_running = False
+        self.autopilot = autopilot
         self._setup_ui_adapter()
     
     def _setup_ui_adapter(self):
         self.ui_adapter = GradioUIAdapterImpl(self)
+        if self.autopilot:
+            self.ui_adapter.autopilot_policy = AutopilotPolicy()
         set_current_ui_adapter(self.ui_adapter)
         self.interface.set_ui_adapter(self.ui_adapter)
     
@@ -37,6 +34,10 @@ class GradioGameController:
     
     def start_game(self):
         if self.game_running: return
+        with output_target(OUTPUT_TARGET_GRADIO): # 游戏线程中 colorize 直接输出纯文本 (包括该线程的控制台日志)
+            self._run_game()
+
+    def _run_game(self):
         try:
             self.game_state = GameState()
             success = initialize_game(self.game_state)
@@ -59,16 +60,20 @@ class GradioGameController:
 
 class GradioUIAdapterImpl(GradioUIAdapter):
     # ... __init__, broadcast_message, get_gm_approval 保持不变 ...
+    supports_token_streaming = True
+
     def __init__(self, controller: GradioGameController):
         super().__init__()
         self.controller = controller
         self.interface = controller.interface
         self.message_history = []
         self.start_game_callback: Optional[Callable] = self.controller.start_game
+        # 正在(或刚刚完成)流式显示的回复: 玩家 -> [message_history 中的位置, 已收到的文本]
+        self._streaming_entries: Dict[str, List[Any]] = {}
     
     def broadcast_message(self, message: str, message_type: str = "info") -> None:
         try:
-            clean_message = strip_ansi_codes(message)
+            clean_message = _plain(message)
             if message_type == "ai_speech":
                 if ":" in clean_message and self.game_state:
                     parts = clean_message.split(":", 1)
@@ -87,15 +92,23 @@ class GradioUIAdapterImpl(GradioUIAdapter):
                        action_type: str, validation_error: Optional[str] = None,
                        parsed_value: Any = None, valid_choices: Optional[List[str]] = None) -> GMApprovalResult:
         try:
-            clean_ai_response = strip_ansi_codes(ai_response)
-            clean_validation_error = strip_ansi_codes(validation_error) if validation_error else None
-            clean_parsed_value = strip_ansi_codes(parsed_value) if parsed_value is not None else None
+            clean_ai_response = _plain(ai_response)
+            clean_validation_error = _plain(validation_error) if validation_error else None
+            clean_parsed_value = _plain(parsed_value) if parsed_value is not None else None
             
             if self.game_state:
                 player_display = self.game_state.get_player_display_name(player_config_name)
-                self.message_history.append((f"**{player_display}** (响应): {clean_ai_response}", None))
+                response_entry = (f"**{player_display}** (响应): {clean_ai_response}", None)
+                streaming_entry = self._streaming_entries.pop(player_config_name, None)
+                if streaming_entry is not None:
+                    self.message_history[streaming_entry[0]] = response_entry # 就地替换已流式显示的文本
+                else:
+                    self.message_history.append(response_entry)
 
-            result = self.interface.show_gm_approval(player_config_name, clean_ai_response, action_type, clean_validation_error, clean_parsed_value, valid_choices)
+            if self.autopilot_policy:
+                result = self.autopilot_policy.decide(player_config_name, action_type, clean_validation_error)
+            else:
+                result = self.interface.show_gm_approval(player_config_name, clean_ai_response, action_type, clean_validation_error, clean_parsed_value, valid_choices)
             
             action_msg = format_gm_action_message(result.action, self.game_state.get_player_display_name(player_config_name) if self.game_state else player_config_name)
             self.broadcast_message(action_msg, "gm_action")
@@ -104,6 +117,61 @@ class GradioUIAdapterImpl(GradioUIAdapter):
             print(f"Error in get_gm_approval: {e}\n{traceback.format_exc()}")
             return GMApprovalResult("accept")
     
+    def get_gm_api_error_decision(self, player_config_name: str, action_type: str, api_error_message: str,
+                                  attempts: int, endpoint_status: Optional[Dict[str, Any]] = None) -> GMApprovalResult:
+        """沿用审核面板: “确认”与“重试”都再次请求，“跳过”跳过该行动，手动输入作为该玩家的行动。"""
+        try:
+            player_display = self._stream_speaker(player_config_name)
+            error_summary = f"API调用持续失败 (已尝试 {attempts} 次): {_plain(api_error_message)}"
+            if endpoint_status:
+                error_summary += f"；端点状态: {endpoint_status.get('state')}，连续失败 {endpoint_status.get('consecutive_failures')} 次"
+            self.message_history.append((None, f"**GM**: {player_display} 的 {action_type} 请求失败，等待GM处理 (重试/手动输入/跳过)。"))
+            result = self.interface.show_gm_approval(player_config_name, "（无响应）", action_type, error_summary)
+            if result.action in ("accept", "accept_invalid"):
+                result = GMApprovalResult("retry")
+            self.broadcast_message(format_gm_action_message(result.action, player_display), "gm_action")
+            return result
+        except Exception as e:
+            print(f"Error in get_gm_api_error_decision: {e}\n{traceback.format_exc()}")
+            return GMApprovalResult("skip")
+
+    def get_gm_batch_approval(self, entries: List[Tuple[str, str, str, bool]]) -> bool:
+        try:
+            self.message_history.append((None, f"**GM**: {len(entries)} 个并发决策已返回，等待GM批量审核。"))
+            accept_all_valid = self.interface.show_gm_batch_approval(
+                [(name, action_type, _plain(preview), is_valid) for name, action_type, preview, is_valid in entries]
+            )
+            valid_count = sum(1 for _, _, _, is_valid in entries if is_valid)
+            self.broadcast_message(f"采纳全部 {valid_count} 个有效响应，其余逐个审核。" if accept_all_valid else "逐个审核全部响应。", "gm_action")
+            return accept_all_valid
+        except Exception as e:
+            print(f"Error in get_gm_batch_approval: {e}\n{traceback.format_exc()}")
+            return False
+
+    def begin_ai_stream(self, player_config_name: str, action_type: str) -> None:
+        self.message_history.append((f"**{self._stream_speaker(player_config_name)}** (生成中…): ", None))
+        self._streaming_entries[player_config_name] = [len(self.message_history) - 1, ""]
+
+    def append_ai_stream(self, player_config_name: str, token: str) -> None:
+        entry = self._streaming_entries.get(player_config_name)
+        if entry is None:
+            return
+        entry[1] += token
+        self.message_history[entry[0]] = (f"**{self._stream_speaker(player_config_name)}** (生成中…): {_plain(entry[1])}", None)
+
+    def end_ai_stream(self, player_config_name: str, final_text: Optional[str]) -> None:
+        entry = self._streaming_entries.get(player_config_name)
+        if entry is None:
+            return
+        if final_text is None:
+            self._streaming_entries.pop(player_config_name, None)
+            self.message_history[entry[0]] = (None, f"*{self._stream_speaker(player_config_name)} 的回复生成失败*")
+        else: # 保留位置，等待 get_gm_approval 换成审核用的完整文本
+            self.message_history[entry[0]] = (f"**{self._stream_speaker(player_config_name)}** (待审核): {_plain(final_text)}", None)
+
+    def _stream_speaker(self, player_config_name: str) -> str:
+        return self.game_state.get_player_display_name(player_config_name) if self.game_state else player_config_name
+
     def show_player_status(self, players_data: Dict[str, Dict[str, Any]], show_gm_view: bool = True) -> None:
         pass
     def show_game_log(self, game_log: List[Dict[str, Any]], count: int = 20) -> None:
@@ -124,7 +192,9 @@ class GradioUIAdapterImpl(GradioUIAdapter):
 
     # --- 新增的方法实现 ---
     def wait_for_continue(self, prompt: str) -> None:
-        """通知UI层显示“继续”按钮，并阻塞等待点击信号。"""
+        """通知UI层显示“继续”按钮，并阻塞等待点击信号。自动审核模式下直接继续。"""
+        if self.autopilot_policy:
+            return
         if self.interface and hasattr(self.interface, 'wait_for_ui_continue'):
             self.interface.wait_for_ui_continue(prompt)
         else:
@@ -134,5 +204,10 @@ class GradioUIAdapterImpl(GradioUIAdapter):
             time.sleep(3)
 
 
-def create_gradio_controller() -> GradioGameController:
-    return GradioGameController()
\ No newline at end of file
+def _plain(text: Any) -> str:
+    """其他线程 (如后台预取) 生成、已经上过色的文本，在进入界面前转为纯文本。"""
+    return render_for_target(str(text), OUTPUT_TARGET_GRADIO)
+
+
+def create_gradio_controller(autopilot: bool = False) -> GradioGameController:
+    return GradioGameController(autopilot=autopilot)
\ No newline at end of file
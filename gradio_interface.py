@@ -1,8 +1,9 @@
 # gradio_interface.py (最终修复版 - 解决Lambda闭包问题)
 import gradio as gr
+import html
 import time
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from queue import Queue, Empty
 import threading
 
@@ -19,6 +20,9 @@ class GradioGameInterface:
         self.approval_waiting = False
         self.approval_result_queue = Queue()
         self.current_approval_data = {}
+        self.batch_approval_waiting = False
+        self.batch_approval_result_queue = Queue()
+        self.current_batch_approval_entries: List[Tuple[str, str, str, bool]] = []
         self.continue_lock = threading.Lock()
         self.continue_event = threading.Event()
         self.is_waiting_for_continue = False
@@ -89,6 +93,29 @@ class GradioGameInterface:
             self.approval_waiting = False
         return result
 
+    def show_gm_batch_approval(self, entries: List[Tuple[str, str, str, bool]]) -> bool:
+        """显示一批并发决策 (玩家配置名, 行动类型, 响应摘要, 是否有效)，等待GM选择: True 为采纳全部有效响应，False 为逐个审核。"""
+        with self.approval_lock:
+            self.batch_approval_waiting = True
+            self.current_batch_approval_entries = list(entries)
+            while not self.batch_approval_result_queue.empty(): self.batch_approval_result_queue.get()
+        result = self.batch_approval_result_queue.get()
+        with self.approval_lock:
+            self.batch_approval_waiting = False
+        return result
+
+    def _format_batch_approval(self, entries: List[Tuple[str, str, str, bool]]) -> str:
+        valid_count = sum(1 for _, _, _, is_valid in entries if is_valid)
+        rows = []
+        for player_config_name, action_type, preview, is_valid in entries:
+            player_display = self.game_state.get_player_display_name(player_config_name) if self.game_state else player_config_name
+            status = "<span style='color:#155724;'>✅ 有效</span>" if is_valid else "<span style='color:#721c24;'>❌ 无效</span>"
+            rows.append(f"<tr><td>{html.escape(player_display)}</td><td>{html.escape(action_type)}</td><td><code>{html.escape(preview)}</code></td><td>{status}</td></tr>")
+        return (f"<div style='border: 2px solid #2E86AB; padding: 10px; border-radius: 8px;'>"
+                f"<h4 style='margin-top:0;'>批量审核 {len(entries)} 个并发决策 (有效 {valid_count} 个)</h4>"
+                f"<table style='width:100%;'><tr><th>玩家</th><th>行动</th><th>AI响应</th><th>校验</th></tr>{''.join(rows)}</table>"
+                f"<p><small>采纳全部有效响应后，无效的响应仍会逐个审核。</small></p></div>")
+
     def create_interface(self) -> gr.Blocks:
         with gr.Blocks(title="AI狼人杀 - Web版", theme=gr.themes.Soft(), css=self._get_custom_css()) as interface:
             
@@ -130,6 +157,12 @@ class GradioGameInterface:
                             gm_manual_input = gr.Textbox(lines=2)
                             gm_manual_submit_btn = gr.Button("✏️ 提交手动输入")
 
+                    with gr.Group(visible=False) as gm_batch_approval_area:
+                        gm_batch_approval_html = gr.HTML()
+                        with gr.Row():
+                            gm_batch_accept_btn = gr.Button("✅ 采纳全部有效响应", variant="primary")
+                            gm_batch_review_btn = gr.Button("🔍 逐个审核")
+
             # --- Event Handlers ---
             def start_game_thread():
                 threading.Thread(target=self.ui_adapter.start_game_callback, daemon=True).start()
@@ -146,7 +179,7 @@ class GradioGameInterface:
 
             def ui_update_loop(dummy_val):
                 while True:
-                    time.sleep(0.5)
+                    time.sleep(game_config.GRADIO_UI_REFRESH_SECONDS)
                     chat_history_list = self.ui_adapter.message_history if self.ui_adapter else []
                     status_html_val, info_html_val = "<p>...", self._format_game_info("...", "...", 0, 0)
                     if self.game_state:
@@ -160,7 +193,11 @@ class GradioGameInterface:
                         if self.is_waiting_for_continue:
                             show_continue_button = True
                     
+                    show_batch_approval, batch_approval_html = False, ""
                     with self.approval_lock:
+                        if self.batch_approval_waiting:
+                            show_batch_approval = True
+                            batch_approval_html = self._format_batch_approval(self.current_batch_approval_entries)
                         if self.approval_waiting:
                             show_approval = True
                             data = self.current_approval_data
@@ -182,14 +219,15 @@ class GradioGameInterface:
                         chat_history_list, status_html_val, info_html_val, 
                         gr.update(visible=show_approval), approval_html, 
                         gr.update(visible=show_choice_row),
-                        gr.update(visible=show_continue_button)
+                        gr.update(visible=show_continue_button),
+                        gr.update(visible=show_batch_approval), batch_approval_html
                     ) + tuple(button_updates)
                     yield yield_tuple
             
             all_outputs = [
                 chat_interface, player_status_html, game_info_html, 
                 gm_approval_area, gm_ai_response_html, gm_choice_buttons_row,
-                continue_btn
+                continue_btn, gm_batch_approval_area, gm_batch_approval_html
             ] + choice_buttons
 
             start_game_btn.click(start_game_thread, outputs=[start_game_btn, end_game_btn, dummy_state]).then(
@@ -239,6 +277,15 @@ class GradioGameInterface:
             gm_skip_btn.click(lambda: log_and_queue("skip"))
             gm_accept_invalid_btn.click(lambda: log_and_queue("accept_invalid"))
             gm_manual_submit_btn.click(lambda content: log_and_queue("manual", content), inputs=[gm_manual_input], outputs=[gm_manual_input])
+
+            def queue_batch_decision(accept_all_valid: bool):
+                if self.batch_approval_waiting:
+                    self.batch_approval_result_queue.put(accept_all_valid)
+                else:
+                    print("Warning: Batch action triggered but no game thread is waiting for batch approval.")
+
+            gm_batch_accept_btn.click(lambda: queue_batch_decision(True))
+            gm_batch_review_btn.click(lambda: queue_batch_decision(False))
             
             def handle_gm_tool(tool_name, player_name=None):
                 if not self.game_state: return gr.update(value="游戏未开始", visible=True)
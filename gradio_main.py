@@ -59,6 +59,7 @@ def main():
     parser.add_argument("--share", action="store_true", help="创建Gradio的公开分享链接")
     parser.add_argument("--no-browser", action="store_true", help="不自动在浏览器中打开")
     parser.add_argument("--debug", action="store_true", help="启用Gradio的调试模式")
+    parser.add_argument("--autopilot", action="store_true", help="自动审核AI响应 (有效即采纳，无效自动重试后跳过)，无需GM操作")
     
     args = parser.parse_args()
     
@@ -72,7 +73,7 @@ def main():
     try:
         # 2. 创建游戏控制器
         print("🚀 正在启动游戏控制器和界面...")
-        controller = create_gradio_controller()
+        controller = create_gradio_controller(autopilot=args.autopilot)
         
         # 3. 创建游戏界面
         app = controller.create_interface()
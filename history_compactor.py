@@ -0,0 +1,226 @@
+# history_compactor.py
+"""
+按token预算压缩玩家的消息历史。
+
+玩家历史随每次行动增长，而每次行动都会把历史重新发给模型。超过预算时，
+把较早的整天历史折叠成一条结构化摘要 (出局、身份声明、投票、查验以及该玩家自己的行动)，
+摘要数据来自 game_log (SpeechRound/VoteRound/StatusUpdate) 和预言家的查验记录，只包含该玩家本应知道的信息；最近的若干天保持原样。
+
+已结束的天不会再变化，每局游戏的 game_log 按天索引、每个玩家每天的摘要和token数只计算一次；
+折叠的天数不变时返回同一个摘要条目对象，werewolf_prompts 因此可以继续增量渲染。
+"""
+import re
+import threading
+import weakref
+from typing import List, Dict, Any, Optional, Tuple
+
+import game_config
+
+_CJK_RE = re.compile(r"[⺀-鿿豈-﫿＀-￯]")
+_ROLE_CLAIM_RE = re.compile(r"我(?:就)?是(?:真的?)?(预言家|女巫|猎人|平民|好人|狼人)")
+
+# 历史中只作记录、不代表玩家自己决策的条目
+_NON_DECISION_ACTION_TYPES = {"speech_taken", "last_words_broadcast_night", "last_words_broadcast_vote",
+                              "gm_correction_for_ai", "prophet_result_private"}
+_ACTION_LABELS = {
+    game_config.ACTION_SPEECH: "发言", game_config.ACTION_LAST_WORDS: "遗言", game_config.ACTION_VOTE: "投票",
+    game_config.ACTION_WOLF_NOMINATE: "提名袭击", game_config.ACTION_WOLF_KILL: "袭击决定",
+    game_config.ACTION_PROPHET_CHECK: "查验", game_config.ACTION_WITCH_SAVE: "解药",
+    game_config.ACTION_WITCH_POISON: "夜晚能力药剂", game_config.ACTION_HUNTER_SHOOT: "猎人能力",
+}
+
+DIGEST_HEADER = "--- 往日摘要 (较早的对话已按天压缩) ---"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数: 中日韩字符约1个token，其余字符约4个一个token。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def get_history_token_budget(player_info: Dict[str, Any]) -> Optional[int]:
+    """玩家配置中的 history_token_budget 优先，否则使用 game_config.PLAYER_HISTORY_TOKEN_BUDGET。0/None 表示不限制。"""
+    budget = player_info.get("history_token_budget")
+    if budget is None:
+        budget = game_config.PLAYER_HISTORY_TOKEN_BUDGET
+    return budget or None
+
+
+def _group_entries_by_day(history: List[Dict[str, Any]]) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    """按 _meta.day 分组并保持顺序；缺少 day 的条目(旧数据)归入前一条所在的天。"""
+    groups: List[Tuple[int, List[Dict[str, Any]]]] = []
+    current_day = 0
+    for entry in history:
+        current_day = entry.get("_meta", {}).get("day", current_day)
+        if groups and groups[-1][0] == current_day:
+            groups[-1][1].append(entry)
+        else:
+            groups.append((current_day, [entry]))
+    return groups
+
+
+def _short_name(game_state, player_config_name: Optional[str]) -> str:
+    """摘要里用 N号 指代玩家，比完整显示名省token。"""
+    player_info = game_state.get_player_info(player_config_name) if player_config_name else None
+    if player_info and "player_number" in player_info:
+        return f"{player_info['player_number']}号"
+    return player_config_name or "无"
+
+
+def _digest_day(game_state, player_config_name: str, day: int, own_entries: List[Dict[str, Any]],
+                day_events: List[Dict[str, Any]]) -> List[str]:
+    """day_events: game_log 中属于这一天的事件 (见 _HistoryDigestCache.events_for_day)。"""
+    lines = []
+    deaths, votes_line, claims, checks = [], None, [], []
+    for log_entry in day_events:
+        details = log_entry.get("details", {})
+        event_type = log_entry.get("event_type")
+        if event_type == "StatusUpdate" and details.get("new_status") == game_config.PLAYER_STATUS_DEAD:
+            reason = str(details.get("reason", ""))
+            how = "被投票出局" if "投票" in reason else "被猎人带走" if "猎人" in reason else "夜晚出局" # 不泄露夜晚的具体死因
+            deaths.append(f"{_short_name(game_state, details.get('player'))}({how})")
+        elif event_type == "VoteRound":
+            voters_by_target: Dict[str, List[str]] = {}
+            for voter, target in details.get("votes", {}).items():
+                target_label = "弃票" if target == game_config.VOTE_SKIP else _short_name(game_state, target)
+                voters_by_target.setdefault(target_label, []).append(_short_name(game_state, voter))
+            vote_parts = [f"{target}<-{'/'.join(voters)}" for target, voters in voters_by_target.items()]
+            outcome = "平票无人出局" if details.get("tie") else f"{_short_name(game_state, details.get('voted_out'))}出局" if details.get("voted_out") else "无人出局"
+            votes_line = f"投票: {', '.join(vote_parts)}; 结果: {outcome}"
+        elif event_type == "SpeechRound":
+            for speech_entry in details.get("speeches", []):
+                match = _ROLE_CLAIM_RE.search(str(speech_entry.get("speech", "")))
+                if match:
+                    claims.append(f"{_short_name(game_state, speech_entry.get('player'))}自称{match.group(1)}")
+    player_info = game_state.get_player_info(player_config_name) or {}
+    for check in player_info.get("prophet_check_history", []): # 只有预言家本人有查验记录
+        if check.get("day") == day:
+            checks.append(f"{_short_name(game_state, check.get('target'))}是{'狼人阵营' if check.get('is_wolf') else '好人阵营'}")
+
+    if deaths: lines.append(f"出局: {', '.join(deaths)}")
+    if claims: lines.append(f"身份声明: {', '.join(claims)}")
+    if votes_line: lines.append(votes_line)
+    if checks: lines.append(f"你的查验结果: {', '.join(checks)}")
+
+    own_actions = []
+    for entry in own_entries:
+        action_type = entry.get("_meta", {}).get("action_type")
+        if entry.get("role") != "assistant" or action_type in _NON_DECISION_ACTION_TYPES or entry.get("_meta", {}).get("is_error_response"):
+            continue
+        base_action = action_type[len("gm_override_"):] if action_type and action_type.startswith("gm_override_") else action_type
+        content = str(entry.get("content", "")).replace("\n", " ")
+        own_actions.append(f"{_ACTION_LABELS.get(base_action, base_action or '行动')}: {content[:40]}{'...' if len(content) > 40 else ''}")
+    if own_actions:
+        lines.append(f"你的行动: {'; '.join(own_actions)}")
+    return [f"第{day}天 " + (lines[0] if lines else "无公开事件")] + [f"  {line}" for line in lines[1:]]
+
+
+class _HistoryDigestCache:
+    """
+    一局游戏的摘要缓存 (线程安全，预取的请求会在后台线程生成Prompt):
+    - game_log 按 details.day 增量索引；
+    - (玩家, 天, 条目数) -> (原文token数, 摘要行, 摘要token数)，只对已结束的天使用；
+    - 玩家 -> ((折叠天数, 最后折叠的天), 摘要条目)。
+    """
+
+    def __init__(self):
+        self._events_by_day: Dict[Any, List[Dict[str, Any]]] = {}
+        self._indexed_log_len = 0
+        self._day_summaries: Dict[Tuple[str, int, int], Tuple[int, List[str], int]] = {}
+        self._digest_entries: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+
+    def events_for_day(self, game_state, day: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            game_log = game_state.game_log
+            if len(game_log) < self._indexed_log_len: # 日志被替换或截断，重新索引
+                self._events_by_day, self._indexed_log_len = {}, 0
+            for log_entry in game_log[self._indexed_log_len:]:
+                self._events_by_day.setdefault(log_entry.get("details", {}).get("day"), []).append(log_entry)
+            self._indexed_log_len = len(game_log)
+            return list(self._events_by_day.get(day, []))
+
+    def day_summary(self, game_state, player_config_name: str, day: int,
+                    entries: List[Dict[str, Any]]) -> Tuple[int, List[str], int]:
+        """已结束的一天: (原文token数, 摘要行, 摘要token数)。"""
+        key = (player_config_name, day, len(entries))
+        with self._lock:
+            summary = self._day_summaries.get(key)
+            if summary is None:
+                digest_lines = _digest_day(game_state, player_config_name, day, entries, self.events_for_day(game_state, day))
+                summary = (sum(estimate_tokens(entry["content"]) for entry in entries), digest_lines,
+                           estimate_tokens("\n".join(digest_lines)) + 1)
+                self._day_summaries[key] = summary
+            return summary
+
+    def digest_entry(self, player_config_name: str, key: Tuple[int, int], build: Any) -> Dict[str, Any]:
+        """折叠的天数和最后折叠的天与上次相同时返回同一个摘要条目对象。"""
+        with self._lock:
+            cached = self._digest_entries.get(player_config_name)
+            if cached is None or cached[0] != key:
+                cached = (key, {"role": "user", "content": build(), "_meta": {"action_type": "history_digest"}})
+                self._digest_entries[player_config_name] = cached
+            return cached[1]
+
+
+_DIGEST_CACHES: "weakref.WeakKeyDictionary[Any, _HistoryDigestCache]" = weakref.WeakKeyDictionary()
+_DIGEST_CACHES_LOCK = threading.Lock()
+
+
+def _get_digest_cache(game_state) -> _HistoryDigestCache:
+    """该局游戏的摘要缓存；游戏对象被回收时随之释放。"""
+    with _DIGEST_CACHES_LOCK:
+        cache = _DIGEST_CACHES.get(game_state)
+        if cache is None:
+            cache = _DIGEST_CACHES[game_state] = _HistoryDigestCache()
+        return cache
+
+
+def compact_player_history(game_state, player_config_name: str, token_budget: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    返回用于Prompt的历史条目 (原样的历史字典，带 _meta 供 werewolf_prompts 区分回合与记录；
+    未压缩的部分和摘要条目都是跨调用稳定的同一批对象，werewolf_prompts.PlayerPromptContext 据此增量渲染)。
+    总token数超过预算时，从最早的一天开始折叠为摘要，直到 摘要 + 剩余原文 放得进预算；最新一天的历史总是保留原文。
+    """
+    player_info = game_state.get_player_info(player_config_name)
+    if not player_info:
+        return []
+    history = [entry for entry in player_info.get("history", []) if "role" in entry and "content" in entry]
+    budget = token_budget if token_budget is not None else get_history_token_budget(player_info)
+    if not budget:
+        return history
+
+    groups = _group_entries_by_day(history)
+    if len(groups) < 2:
+        return history
+    cache = _get_digest_cache(game_state)
+    closed_days = [cache.day_summary(game_state, player_config_name, day, entries) for day, entries in groups[:-1]]
+    raw_tokens = [summary[0] for summary in closed_days] + [sum(estimate_tokens(entry["content"]) for entry in groups[-1][1])]
+    full_tokens = sum(raw_tokens)
+    if full_tokens <= budget:
+        return history
+    digest_tokens = [summary[2] for summary in closed_days]
+
+    # 折叠前 k 天的代价 = 摘要(前k天) + 原文(其余)。取能放进预算的最小 k；都放不进时取总量最小的 k
+    header_tokens = estimate_tokens(DIGEST_HEADER)
+    best_k, best_total = 0, full_tokens
+    for k in range(1, len(groups)):
+        total = header_tokens + sum(digest_tokens[:k]) + sum(raw_tokens[k:])
+        if total <= budget:
+            best_k, best_total = k, total
+            break
+        if total < best_total:
+            best_k, best_total = k, total
+    if best_k == 0:
+        return history
+
+    digest_entry = cache.digest_entry(
+        player_config_name, (best_k, groups[best_k - 1][0]),
+        lambda: "\n".join([DIGEST_HEADER] + [line for summary in closed_days[:best_k] for line in summary[1]])
+    )
+    compacted = [digest_entry]
+    for _, entries in groups[best_k:]:
+        compacted.extend(entries)
+    return compacted
@@ -0,0 +1,134 @@
+# llm_response_cache.py
+"""
+make_api_call_to_ai 之下的录制/回放层。
+
+- record: 正常请求模型，并把每个成功的 请求->响应 对写入磁盘；
+- replay: 只从磁盘读取，不访问网络，未命中时返回错误；
+- auto:   命中则回放，未命中则请求并录制；
+- off:    关闭 (默认)。
+
+键是 模型名 + 端点 + 响应处理类型 + messages (以及约束输出、生成参数) 的 sha256，每个键一个JSON文件，
+因此录制结果可以直接提交、比较或在不同机器间复制。
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import List, Dict, Any, Optional
+
+import game_config
+
+CACHE_MODE_OFF = "off"
+CACHE_MODE_RECORD = "record"
+CACHE_MODE_REPLAY = "replay"
+CACHE_MODE_AUTO = "auto"
+CACHE_MODES = (CACHE_MODE_OFF, CACHE_MODE_RECORD, CACHE_MODE_REPLAY, CACHE_MODE_AUTO)
+
+
+def make_cache_key(model: str, endpoint: str, messages: List[Dict[str, str]], response_handler_type: str = "standard",
+                   response_format: Optional[Dict[str, Any]] = None,
+                   generation_params: Optional[Dict[str, Any]] = None) -> str:
+    request_fields: Dict[str, Any] = {"model": model, "endpoint": endpoint, "handler": response_handler_type, "messages": messages}
+    if response_format is not None: # 不带约束输出的请求沿用原来的键，已录制的结果仍然有效
+        request_fields["response_format"] = response_format
+    if generation_params: # max_tokens、temperature 等会改变回复的参数同样区分
+        request_fields["generation_params"] = generation_params
+    canonical = json.dumps(
+        request_fields,
+        ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """按键存取录制的响应。读过的条目保存在内存中，同一进程内重复命中不再读盘。"""
+
+    def __init__(self, mode: str, cache_dir: str):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"不支持的LLM缓存模式: {mode} (可选: {', '.join(CACHE_MODES)})")
+        self.mode = mode
+        self.cache_dir = cache_dir
+        self._memory: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    @property
+    def reads_enabled(self) -> bool:
+        return self.mode in (CACHE_MODE_REPLAY, CACHE_MODE_AUTO)
+
+    @property
+    def writes_enabled(self) -> bool:
+        return self.mode in (CACHE_MODE_RECORD, CACHE_MODE_AUTO)
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def lookup(self, key: str) -> Optional[str]:
+        """返回录制的响应文本；未命中返回 None。"""
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is None:
+            path = self._path_for(key)
+            if os.path.exists(path):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        entry = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    entry = None
+            if entry is not None:
+                with self._lock:
+                    self._memory[key] = entry
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry.get("response_text")
+
+    def store(self, key: str, model: str, endpoint: str, response_handler_type: str,
+              messages: List[Dict[str, str]], response_text: str) -> None:
+        entry = {
+            "model": model,
+            "endpoint": endpoint,
+            "handler": response_handler_type,
+            "messages": messages,
+            "response_text": response_text,
+        }
+        path = self._path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path) # 原子替换，多进程并发录制同一键也不会留下半个文件
+        with self._lock:
+            self._memory[key] = entry
+            self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode, "cache_dir": self.cache_dir, "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+
+_active_cache: Optional[LLMResponseCache] = None
+_active_cache_initialized = False
+_active_cache_lock = threading.Lock()
+
+
+def configure_llm_cache(mode: Optional[str] = None, cache_dir: Optional[str] = None) -> Optional[LLMResponseCache]:
+    """(重新)设置当前进程使用的缓存；参数缺省时取 game_config 中的值。mode 为 off 时关闭缓存。"""
+    global _active_cache, _active_cache_initialized
+    mode = mode or game_config.LLM_CACHE_MODE
+    cache_dir = cache_dir or game_config.LLM_CACHE_DIR
+    with _active_cache_lock:
+        _active_cache = None if mode == CACHE_MODE_OFF else LLMResponseCache(mode, cache_dir)
+        _active_cache_initialized = True
+        return _active_cache
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """返回当前进程的缓存；首次调用时按 game_config 初始化。关闭时返回 None。"""
+    if not _active_cache_initialized:
+        configure_llm_cache()
+    return _active_cache
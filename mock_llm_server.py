@@ -0,0 +1,350 @@
+# mock_llm_server.py
+"""
+本地模拟的 OpenAI 兼容 /v1/chat/completions 服务，用于在没有GPU的情况下对编排层做压测和延迟基准。
+
+- 普通请求返回 JSON (choices[0].message.content)，可选 <think> 标签或独立的 reasoning_content 字段；
+- stream=true 时返回 SSE，enable_thinking=true 时先输出 reasoning_content 再输出 content (与Qwen一致)；
+- 延迟、生成速度 (token/秒) 和错误率可配置；
+- 回复是脚本化的: 从 Prompt 中找出当前行动的有效目标并从中选择，因此整局游戏可以正常推进；
+- 请求带 response_format (JSON Schema 中 choice 字段的 enum) 时，按约束解码的效果回复 {"choice": 枚举值之一}；
+- 按请求中的 stop 和 max_tokens 截断回答 (1个字符按1个token计)；
+- 可选在目标选择后另起一行附上理由 (模拟先给答案再解释的模型)；客户端提前断开SSE流时停止生成并计入 aborted；
+- 模拟服务端的自动前缀缓存 (与 vLLM 的按块前缀缓存相同的判定方式)，统计每个请求有多少Prompt可以复用之前计算过的KV。
+
+用法示例:
+    python mock_llm_server.py --port 1234 --latency 0.2 --tokens-per-second 50 --error-rate 0.02
+然后在 players_config.json 中把 api_endpoint 设为 http://127.0.0.1:1234/v1/chat/completions
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Tuple
+
+THINK_STYLE_NONE = "none" # 只返回回答
+THINK_STYLE_TAGS = "tags" # 回答前加 <think>...</think> (对应 think_tags_in_content)
+THINK_STYLE_SEPARATE = "separate" # message 中带独立的 reasoning_content 字段 (对应 content_with_separate_reasoning)
+
+_ANSI_ESCAPE_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+_PLAYER_ENTRY_RE = re.compile(r"玩家(\d+)\s*\(([^()\s]+)\)")
+_QUOTED_OPTION_RE = re.compile(r"'([^'\s]+)'")
+
+# 行动指示中列出有效目标的行 (与 werewolf_prompts 中的措辞对应)
+_TARGET_LIST_MARKERS = ("可选的投票目标", "可供你提名", "袭击目标:", "尚未查验过的存活玩家", "可选的目标")
+_SPEECH_LINES = [
+    "我认为目前信息还不够多，我先听听大家的看法，重点关注发言前后矛盾的人。",
+    "我是好人，昨晚的情况让我觉得有人在刻意带节奏，大家投票时要谨慎。",
+    "我的看法是先不要急着下结论，我会根据后面的发言再决定投给谁。",
+]
+_DECISION_RATIONALE_TAIL = "从目前的发言来看，这个选择对我们阵营最有利，之后我会继续观察其他玩家的表现再调整判断。"
+_LAST_WORDS_LINES = [
+    "我是好人，希望大家能找出真正的狼人，注意那些一直划水的玩家。",
+    "我出局了，但请大家相信我的判断，继续关注投票最积极的人。",
+]
+
+
+def _strip_ansi(text: str) -> str:
+    return _ANSI_ESCAPE_RE.sub('', text) if isinstance(text, str) else str(text)
+
+
+def _apply_generation_limits(answer: str, payload: Dict[str, Any]) -> Tuple[str, str]:
+    """模拟服务端的 stop 序列和 max_tokens 上限 (只作用于回答部分)，返回 (回答, finish_reason)。"""
+    stop = payload.get("stop")
+    for sequence in ([stop] if isinstance(stop, str) else stop or []):
+        if sequence and sequence in answer:
+            answer = answer[:answer.index(sequence)]
+    max_tokens = payload.get("max_tokens")
+    if isinstance(max_tokens, int) and 0 < max_tokens < len(answer):
+        return answer[:max_tokens], "length"
+    return answer, "stop"
+
+
+class ScriptedReplyPolicy:
+    """
+    根据发给模型的消息生成合法的回复。
+    随机数由 种子 + 消息内容 决定，因此同样的请求总是得到同样的回复，与并发顺序无关。
+    """
+
+    def __init__(self, seed: int = 0, abstain_rate: float = 0.1, save_rate: float = 0.5, decision_rationale: bool = False):
+        self.seed = seed
+        self.abstain_rate = abstain_rate # 有可选目标时仍选择不行动(弃票/空过/不使用...)的概率
+        self.save_rate = save_rate # 女巫有解药时使用的概率
+        self.decision_rationale = decision_rationale # 目标选择后是否换行附上理由
+
+    def _rng_for(self, messages: List[Dict[str, Any]]) -> random.Random:
+        digest = hashlib.sha256(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+        return random.Random(f"{self.seed}:{digest}")
+
+    @staticmethod
+    def _action_instructions(messages: List[Dict[str, Any]]) -> str:
+        """取最后一条包含行动指示的用户消息中 '你的行动指示' 之后的部分。"""
+        for msg in reversed(messages):
+            content = _strip_ansi(msg.get("content", ""))
+            if msg.get("role") == "user" and "你的行动指示" in content:
+                return content.split("你的行动指示", 1)[1]
+        for msg in reversed(messages):
+            if msg.get("role") == "user":
+                return _strip_ansi(msg.get("content", ""))
+        return ""
+
+    def reply(self, messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """返回 (思考内容, 回答)。"""
+        rng = self._rng_for(messages)
+        instructions = self._action_instructions(messages)
+        lines = [line.strip() for line in instructions.splitlines() if line.strip()]
+
+        if "请发表你的遗言" in instructions:
+            return "我需要留下对好人有用的信息。", rng.choice(_LAST_WORDS_LINES)
+        if "轮到你发言了" in instructions:
+            return "先分析一下局势再发言。", rng.choice(_SPEECH_LINES)
+        if "是否要使用解药" in instructions:
+            return "考虑是否救人。", "是" if rng.random() < self.save_rate else "否"
+        if "没有解药" in instructions or "不需要使用解药" in instructions:
+            return "没有需要救的人。", "否"
+
+        target_line = next((line for line in reversed(lines) if any(marker in line for marker in _TARGET_LIST_MARKERS)), "")
+        candidates = [name for _, name in _PLAYER_ENTRY_RE.findall(target_line)]
+        reply_line = next((line for line in reversed(lines) if "回复" in line), "")
+        no_action_options = _QUOTED_OPTION_RE.findall(reply_line.split("或者回复", 1)[-1]) if reply_line else []
+        no_action = no_action_options[0] if no_action_options else "弃票"
+
+        if not candidates or rng.random() < self.abstain_rate:
+            return "没有合适的目标，选择不行动。", self._with_rationale(no_action, "没有合适的目标，选择不行动。")
+        return "综合发言和投票情况做出选择。", self._with_rationale(rng.choice(candidates), "综合发言和投票情况做出选择。")
+
+    def _with_rationale(self, decision: str, reasoning: str) -> str:
+        if not self.decision_rationale:
+            return decision
+        return f"{decision}\n理由：{reasoning}{_DECISION_RATIONALE_TAIL}"
+
+    @staticmethod
+    def constrain(answer: str, response_format: Optional[Dict[str, Any]]) -> str:
+        """模拟约束解码: 把回答映射到 schema 中 choice 的枚举值 (玩家枚举值形如 "玩家N 配置名")，按 JSON 返回。"""
+        try:
+            options = response_format["json_schema"]["schema"]["properties"]["choice"]["enum"]
+        except (KeyError, TypeError):
+            return answer
+        if not options:
+            return answer
+        answer = answer.split("\n", 1)[0] # 约束解码不会输出理由
+        choice = next((option for option in options if option == answer or option.endswith(f" {answer}")), options[-1]) # 其余(不行动)取最后一项
+        return json.dumps({"choice": choice}, ensure_ascii=False)
+
+
+class PrefixCacheSimulator:
+    """
+    按块模拟前缀缓存: 把 messages 按聊天模板的方式拼接成文本，切成 block_chars 字符的块，
+    每块的键是 (前一块的键, 本块文本) 的哈希。一个请求开头连续命中的块即可复用的前缀，
+    只有整个前缀逐字节相同时才会命中，与真实服务的行为一致。
+    """
+
+    def __init__(self, block_chars: int = 64):
+        self.block_chars = block_chars
+        self._blocks = set()
+        self._lock = threading.Lock()
+        self.prompt_chars = 0
+        self.cached_chars = 0
+
+    @staticmethod
+    def serialize(messages: List[Dict[str, Any]]) -> str:
+        return "".join(f"<|{msg.get('role', '')}|>\n{msg.get('content', '')}<|end|>\n" for msg in messages)
+
+    def observe(self, messages: List[Dict[str, Any]]) -> int:
+        """记录一个请求并返回命中的前缀字符数。"""
+        text = self.serialize(messages)
+        cached, parent, missed = 0, "", False
+        with self._lock:
+            for start in range(0, len(text) - self.block_chars + 1, self.block_chars): # 不完整的最后一块不缓存
+                key = hashlib.sha1(f"{parent}{text[start:start + self.block_chars]}".encode("utf-8")).hexdigest()
+                if not missed and key in self._blocks:
+                    cached += self.block_chars
+                else:
+                    missed = True
+                    self._blocks.add(key)
+                parent = key
+            self.prompt_chars += len(text)
+            self.cached_chars += cached
+        return cached
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"prompt_chars": self.prompt_chars, "cached_chars": self.cached_chars,
+                    "hit_rate": round(self.cached_chars / self.prompt_chars, 4) if self.prompt_chars else None}
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """带有回复策略、延迟/错误配置和请求统计的HTTP服务。"""
+    daemon_threads = True
+
+    def __init__(self, server_address, policy: ScriptedReplyPolicy, latency: float = 0.0, jitter: float = 0.0,
+                 tokens_per_second: float = 0.0, error_rate: float = 0.0, think_style: str = THINK_STYLE_NONE,
+                 seed: int = 0):
+        super().__init__(server_address, _MockRequestHandler)
+        self.policy = policy
+        self.latency = latency # 首个token前的固定延迟(秒)
+        self.jitter = jitter # 在固定延迟上叠加的 [0, jitter] 均匀随机延迟
+        self.tokens_per_second = tokens_per_second # 生成速度，0 表示瞬间生成 (按1个字符=1个token估算)
+        self.error_rate = error_rate # 随机返回 500/429 的概率
+        self.think_style = think_style
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "streamed": 0, "structured": 0, "aborted": 0}
+        self._stats_lock = threading.Lock()
+        self.prefix_cache = PrefixCacheSimulator()
+
+    def random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+
+class _MockRequestHandler(BaseHTTPRequestHandler):
+    server: MockLLMServer
+    protocol_version = "HTTP/1.1" # 支持 keep-alive，与客户端连接池配合
+    disable_nagle_algorithm = True # 头部和正文分两次写出，否则 keep-alive 连接上每个响应会多出 ~40ms 的延迟确认等待
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass # 压测时不在终端刷屏
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.count("aborted") # 客户端已超时断开
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON body"}})
+            return
+        server = self.server
+        server.count("requests")
+        server.prefix_cache.observe(payload.get("messages", []))
+
+        time.sleep(server.latency + server.jitter * server.random())
+        if server.error_rate and server.random() < server.error_rate:
+            server.count("errors")
+            status = 429 if server.random() < 0.5 else 500
+            self._send_json(status, {"error": {"message": f"mock injected error {status}"}})
+            return
+
+        reasoning, answer = server.policy.reply(payload.get("messages", []))
+        if payload.get("response_format"):
+            server.count("structured")
+            answer = server.policy.constrain(answer, payload["response_format"])
+        answer, finish_reason = _apply_generation_limits(answer, payload)
+        model = payload.get("model", "mock-model")
+        if payload.get("stream"):
+            server.count("streamed")
+            self._stream_reply(model, reasoning if payload.get("enable_thinking") else "", answer, finish_reason)
+        else:
+            self._json_reply(model, reasoning, answer, finish_reason)
+
+    def _sleep_for_tokens(self, text: str) -> None:
+        if self.server.tokens_per_second > 0 and text:
+            time.sleep(len(text) / self.server.tokens_per_second)
+
+    def _json_reply(self, model: str, reasoning: str, answer: str, finish_reason: str = "stop") -> None:
+        message: Dict[str, Any] = {"role": "assistant", "content": answer}
+        if self.server.think_style == THINK_STYLE_TAGS:
+            message["content"] = f"<think>{reasoning}</think>\n{answer}"
+        elif self.server.think_style == THINK_STYLE_SEPARATE:
+            message["reasoning_content"] = reasoning
+        self._sleep_for_tokens(message["content"] + message.get("reasoning_content", ""))
+        self._send_json(200, {
+            "id": f"mock-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(answer), "total_tokens": len(answer)},
+        })
+
+    def _stream_reply(self, model: str, reasoning: str, answer: str, finish_reason: str = "stop") -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close") # 流式响应没有 Content-Length，以关闭连接结束
+        self.end_headers()
+        self.close_connection = True
+
+        def send_event(body: Any) -> None:
+            data = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False)
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            for field, text in (("reasoning_content", reasoning), ("content", answer)):
+                for i in range(0, len(text), 4): # 每个事件约4个token
+                    piece = text[i:i + 4]
+                    self._sleep_for_tokens(piece)
+                    send_event({"object": "chat.completion.chunk", "model": model,
+                                "choices": [{"index": 0, "delta": {field: piece}, "finish_reason": None}]})
+            send_event({"object": "chat.completion.chunk", "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+            send_event({"object": "chat.completion.chunk", "model": model, "choices": [],
+                        "usage": {"completion_tokens": len(reasoning) + len(answer)}})
+            send_event("[DONE]")
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.count("aborted") # 客户端已断开 (如提前结束)，与真实服务一样停止生成
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, seed: int = 0, abstain_rate: float = 0.1,
+                      decision_rationale: bool = False, **server_options: Any) -> MockLLMServer:
+    """在后台线程中启动服务并立即返回 (port=0 时自动分配端口，通过 server.url 获取地址)。用完调用 server.shutdown()。"""
+    policy = ScriptedReplyPolicy(seed=seed, abstain_rate=abstain_rate, decision_rationale=decision_rationale)
+    server = MockLLMServer((host, port), policy, seed=seed, **server_options)
+    threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI狼人杀 - 本地模拟OpenAI兼容接口 (压测/基准用)")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="监听地址 (默认: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=1234, help="监听端口 (默认: 1234)")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求首个token前的延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="叠加的随机延迟上限(秒)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="生成速度，0表示不限速")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 500/429 错误的概率 (0~1)")
+    parser.add_argument("--think-style", choices=[THINK_STYLE_NONE, THINK_STYLE_TAGS, THINK_STYLE_SEPARATE], default=THINK_STYLE_NONE,
+                        help="非流式响应中思考内容的形式")
+    parser.add_argument("--abstain-rate", type=float, default=0.1, help="有可选目标时仍选择不行动的概率")
+    parser.add_argument("--decision-rationale", action="store_true", help="目标选择后换行附上一段理由")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        (args.host, args.port), ScriptedReplyPolicy(seed=args.seed, abstain_rate=args.abstain_rate, decision_rationale=args.decision_rationale),
+        latency=args.latency, jitter=args.jitter, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, think_style=args.think_style, seed=args.seed
+    )
+    print(f"模拟LLM服务已启动: {server.url}  (Ctrl+C 停止)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"已停止。请求统计: {server.stats}  前缀缓存: {server.prefix_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 # player_interaction.py (最终版，基于26K原始文件修改，保证终端功能完整)
+import re
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Callable, Tuple
-from ui_adapter import get_current_ui_adapter, is_gradio_mode, GMApprovalResult
+from ui_adapter import get_current_ui_adapter, get_autopilot_policy, is_gradio_mode, is_headless_mode, GMApprovalResult
 
 # 假设 terminal_colors.py 在项目根目录或者Python可以找到的路径下
 try:
@@ -28,13 +30,21 @@ except ImportError:
     def underline(text: str) -> str: return text
 
 
-from game_state import GameState
-from ai_interface import make_api_call_to_ai
-from werewolf_prompts import generate_prompt_for_action
+from game_state import GameState, normalize_player_reference
+from ai_interface import make_api_call_to_ai, run_api_calls_concurrently, get_endpoint_status
+from ai_resilience import RetryPolicy, get_error_kind
+from response_parser import unwrap_structured_choice
+from werewolf_prompts import generate_action_turn, assemble_prompt_messages
 import game_config
+from game_logger import LogMessage, is_log_enabled, resolve_log_message, emit_log_line
 
 MODULE_COLOR = Colors.CYAN
 
+# 后台预取单个AI响应(与其他角色的行动重叠执行)所用的线程池
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ai-prefetch")
+# API错误的自动重试策略 (按错误类别的次数、指数退避和抖动见 game_config.API_RETRY_*)
+_api_retry_policy = RetryPolicy()
+
 def _get_colored_player_display_name_from_interaction(game_state: GameState, player_config_name: Optional[str], show_role_to_gm: bool = False) -> str:
     if not player_config_name:
         return colorize("未知玩家", Colors.BRIGHT_BLACK)
@@ -43,7 +53,10 @@ def _get_colored_player_display_name_from_interaction(game_state: GameState, pla
     return player_name_color(base_display_name, player_data, game_state)
 
 
-def _log_player_interact(message: str, level: str = "INFO", player_config_name: Optional[str] = None, game_state_ref: Optional[GameState] = None):
+def _log_player_interact(message: LogMessage, level: str = "INFO", player_config_name: Optional[str] = None, game_state_ref: Optional[GameState] = None):
+    if not is_log_enabled(level):
+        return
+    message = resolve_log_message(message)
     level_colored = colorize(level, log_level_color(level))
     prefix_module = colorize("[PlayerInteract:", MODULE_COLOR)
     prefix = f"{prefix_module}{level_colored}]"
@@ -52,7 +65,44 @@ def _log_player_interact(message: str, level: str = "INFO", player_config_name:
         prefix += f" ({p_name_colored})"
     elif player_config_name:
         prefix += f" ({colorize(player_config_name, Colors.BRIGHT_YELLOW)})"
-    print(f"{prefix} {message}")
+    emit_log_line(f"{prefix} {message}")
+
+
+def _get_action_targets(game_state: GameState, player_config_name: str, action_type: str) -> Optional[Tuple[List[str], str, str]]:
+    """夜晚/猎人目标类行动的 (合法目标, 不行动时的回复, 目标类型描述)；其他行动返回 None。投票另行处理。"""
+    if action_type == "prophet_check":
+        prophet_info = game_state.get_player_info(player_config_name)
+        checked_targets = {entry["target"] for entry in prophet_info.get("prophet_check_history", [])} if prophet_info else set()
+        target_list = [p for p in game_state.get_alive_players(exclude_self_config_name=player_config_name) if p not in checked_targets]
+        return target_list, "不查验", "查验目标"
+    if action_type in ["wolf_nominate", "wolf_kill"]:
+        wolf_team = set(game_state.get_players_by_role("狼人"))
+        target_list = [p for p in game_state.get_alive_players() if p not in wolf_team]
+        return target_list, ("空刀" if action_type == "wolf_kill" else "不提名"), "袭击目标"
+    if action_type == "witch_poison":
+        return game_state.get_alive_players(exclude_self_config_name=player_config_name), "不使用", "用药目标"
+    if action_type == "hunter_shoot":
+        return game_state.get_alive_players(exclude_self_config_name=player_config_name), "不开枪", "开枪目标"
+    return None
+
+
+# 表示不行动的回复，按 normalize_player_reference 规范化后比较
+_VOTE_SKIP_KEYWORDS = frozenset({"弃票", "skip", "pass"})
+_NO_ACTION_KEYWORDS = frozenset({"skip", "pass", "不用", "不使用", "不验", "弃票", "不提名", "空过", "本回合不行动", "不开枪", "不射击", "不使用此能力"})
+
+
+_WITCH_SAVE_NEGATIVE_WORDS = ("否", "不救", "不是", "不会救", "不用", "不使用")
+_WITCH_SAVE_POSITIVE_WORDS = ("是", "救", "使用")
+
+
+def _parse_witch_save_answer(response: str) -> Optional[bool]:
+    """女巫解药回复: 先找否定字样 ("不救" 中也有 "救")，再找同意字样；两者都没有时返回 None。"""
+    lowered = response.lower()
+    if any(word in response for word in _WITCH_SAVE_NEGATIVE_WORDS) or re.search(r"\bno\b", lowered):
+        return False
+    if any(word in response for word in _WITCH_SAVE_POSITIVE_WORDS) or re.search(r"\byes\b", lowered):
+        return True
+    return None
 
 
 def _validate_ai_response(
@@ -66,7 +116,9 @@ def _validate_ai_response(
         return False, colorize("AI响应为空或仅包含空白。", Colors.RED), None, None
 
     response = response_text.strip()
-    cleaned_response_for_keyword_match = response.lower().strip(".。！!?？【】")
+    if action_type in game_config.STRUCTURED_DECISION_ACTIONS:
+        response = unwrap_structured_choice(response).strip() # 结构化输出 {"choice": ...} 取出其中的选项
+    cleaned_response_for_keyword_match = normalize_player_reference(response)
     use_colors = not is_gradio_mode()
 
     def create_error_and_choices(target_type: str, valid_targets: List[str], no_action_option: str) -> Tuple[str, List[str]]:
@@ -90,20 +142,18 @@ def _validate_ai_response(
 
     if action_type == "vote":
         alive_players = game_state.get_alive_players(exclude_self_config_name=player_config_name)
-        if cleaned_response_for_keyword_match in ["弃票", "skip", "pass"]:
+        if cleaned_response_for_keyword_match in _VOTE_SKIP_KEYWORDS:
             return True, None, game_config.VOTE_SKIP, None
-        for p_name in alive_players:
-            p_info = game_state.get_player_info(p_name)
-            if response == p_name or response == game_state.get_player_display_name(p_name, show_number=True) or (p_info and response == str(p_info.get("player_number"))):
-                return True, None, p_name, None
+        matched_player = game_state.find_player_by_reference(response)
+        if matched_player is not None and matched_player in alive_players:
+            return True, None, matched_player, None
         err_msg, choices = create_error_and_choices("投票目标", alive_players, game_config.VOTE_SKIP)
         return False, err_msg, None, choices
         
     if action_type == "witch_save":
-        if "是" in response or "yes" in response.lower() or "救" in response:
-            return True, None, True, None
-        if "否" in response or "no" in response.lower() or "不救" in response:
-            return True, None, False, None
+        use_save = _parse_witch_save_answer(response)
+        if use_save is not None:
+            return True, None, use_save, None
         
         killed_player_name = action_specific_info.get("killed_player_name", "未知玩家") if action_specific_info else "未知玩家"
         display_name = game_state.get_player_display_name(killed_player_name, show_number=True) if not use_colors else _get_colored_player_display_name_from_interaction(game_state, killed_player_name)
@@ -113,45 +163,318 @@ def _validate_ai_response(
         err_msg = f"对于是否拯救【{display_name}】，请明确回复【{option_yes}】或【{option_no}】。"
         return False, err_msg, None, ["是", "否"]
 
-    target_list: Optional[List[str]] = None
-    no_action_word: Optional[str] = None
-    target_type_str: Optional[str] = None
-    if action_type == "prophet_check":
-        prophet_info = game_state.get_player_info(player_config_name)
-        checked_targets = {entry["target"] for entry in prophet_info.get("prophet_check_history", [])} if prophet_info else set()
-        target_list = [p for p in game_state.get_alive_players(exclude_self_config_name=player_config_name) if p not in checked_targets]
-        no_action_word, target_type_str = "不查验", "查验目标"
-    elif action_type in ["wolf_nominate", "wolf_kill"]:
-        wolf_team = {p for p, d in game_state.players_data.items() if d["role"] == "狼人"}
-        target_list = [p for p in game_state.get_alive_players() if p not in wolf_team]
-        no_action_word, target_type_str = ("空刀" if action_type == "wolf_kill" else "不提名"), "袭击目标"
-    elif action_type == "witch_poison":
-        target_list = game_state.get_alive_players(exclude_self_config_name=player_config_name)
-        no_action_word, target_type_str = "不使用", "用药目标"
-    elif action_type == "hunter_shoot":
-        target_list = game_state.get_alive_players(exclude_self_config_name=player_config_name)
-        no_action_word, target_type_str = "不开枪", "开枪目标"
-
-    if target_list is not None:
-        no_action_keywords = [no_action_word.lower(), "skip", "pass", "不用", "不使用", "不验", "弃票", "不提名", "空过", "本回合不行动", "不开枪", "不射击", "不使用此能力"]
-        if cleaned_response_for_keyword_match in no_action_keywords:
+    action_targets = _get_action_targets(game_state, player_config_name, action_type)
+    if action_targets is not None:
+        target_list, no_action_word, target_type_str = action_targets
+        if cleaned_response_for_keyword_match in _NO_ACTION_KEYWORDS or cleaned_response_for_keyword_match == no_action_word:
             return True, None, no_action_word, None
-        for p_name in target_list:
-            p_info = game_state.get_player_info(p_name)
-            if response == p_name or response == game_state.get_player_display_name(p_name, show_number=True) or (p_info and response == str(p_info.get("player_number"))):
-                return True, None, p_name, None
+        matched_player = game_state.find_player_by_reference(response)
+        if matched_player is not None and matched_player in target_list:
+            return True, None, matched_player, None
         err_msg, choices = create_error_and_choices(target_type_str, target_list, no_action_word)
         return False, err_msg, None, choices
 
     return True, None, response, None
 
+class PrefetchedAIResponse:
+    """提前(通常是并发)取得的首轮AI响应，审核时代替第一次API调用使用。"""
+    def __init__(self, messages: List[Dict[str, str]], response_text: Optional[str], api_error_message: Optional[str]):
+        self.messages = messages
+        self.response_text = response_text
+        self.api_error_message = api_error_message
+
+
+def _get_structured_decision_choices(game_state: GameState, player_config_name: str, action_type: str) -> Optional[List[str]]:
+    """结构化输出允许的全部选项 (与 _validate_ai_response 接受的目标一致，玩家用 "玩家N 配置名" 表示)。"""
+    if action_type == game_config.ACTION_WITCH_SAVE:
+        return ["是", "否"]
+    if action_type == game_config.ACTION_VOTE:
+        target_list, no_action_word = game_state.get_alive_players(exclude_self_config_name=player_config_name), game_config.VOTE_SKIP
+    else:
+        action_targets = _get_action_targets(game_state, player_config_name, action_type)
+        if action_targets is None:
+            return None
+        target_list, no_action_word, _ = action_targets
+    return [game_state.get_player_display_name(p, show_number=True) for p in target_list] + [no_action_word]
+
+
+def _build_structured_response_format(game_state: GameState, player_config_name: str, action_type: Optional[str]) -> Optional[Dict[str, Any]]:
+    """玩家和行动都适用时，返回要求模型只回复 {"choice": 可选项之一} 的 response_format；否则返回 None。"""
+    player_info = game_state.get_player_info(player_config_name) or {}
+    enabled = player_info.get("structured_decisions")
+    if enabled is None:
+        enabled = game_config.STRUCTURED_DECISIONS
+    if not enabled or action_type not in game_config.STRUCTURED_DECISION_ACTIONS or \
+       player_info.get("response_handler_type", "standard") not in game_config.STRUCTURED_DECISION_HANDLERS:
+        return None
+    choices = _get_structured_decision_choices(game_state, player_config_name, action_type)
+    if not choices:
+        return None
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"{action_type}_decision",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"choice": {"type": "string", "enum": choices}},
+                "required": ["choice"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def _get_generation_params(
+    game_state: GameState,
+    player_config_name: str,
+    action_type: Optional[str],
+    structured_output: bool = False
+) -> Dict[str, Any]:
+    """
+    本次请求的生成参数: 依次合并 game_config.ACTION_GENERATION_PROFILES 的 default 和该行动的配置、
+    玩家 generation_profiles 的 default 和该行动的配置；值为 None 的参数不发送。
+    """
+    player_info = game_state.get_player_info(player_config_name) or {}
+    params: Dict[str, Any] = {}
+    for profiles in (game_config.ACTION_GENERATION_PROFILES, player_info.get("generation_profiles") or {}):
+        params.update(profiles.get("default") or {})
+        if action_type:
+            params.update(profiles.get(action_type) or {})
+    if player_info.get("response_handler_type", "standard") in game_config.THINKING_RESPONSE_HANDLERS and \
+       params.get("enable_thinking") is not False:
+        for key in game_config.GENERATION_CAP_PARAMS: # 思考内容也计入上限，不能截断
+            params.pop(key, None)
+    if structured_output:
+        params.pop("stop", None) # JSON 输出中可能出现换行
+    return {key: value for key, value in params.items() if value is not None}
+
+
+def _build_early_stop_check(
+    game_state: GameState,
+    player_config_name: str,
+    action_type: Optional[str],
+    action_specific_info: Optional[Dict[str, Any]] = None
+) -> Optional[Callable[[str], Optional[int]]]:
+    """
+    为目标选择类行动构造流式回复的提前结束判定 (见 ai_interface.make_api_call_to_ai 的 early_stop)。
+    判定函数接收目前已生成的回答，决定已经确定时返回决定性前缀的长度，否则返回 None。
+    Prompt 要求直接回复一个选项，因此只在回答的第一行写完 (出现换行) 后判定一次: 第一行本身通过
+    _validate_ai_response 时截断到第一行，之后的理由不再生成；否则不提前结束，由完整回复照常审核。
+    行内的逗号、空格不算结束，"玩家3，不对，我投玩家5"、"玩家3还是玩家5" 这类改口或犹豫不会被截断成玩家3。
+    """
+    if not game_config.EARLY_STOP_DECISIONS or action_type not in game_config.EARLY_STOP_ACTIONS:
+        return None
+
+    first_line_checked = False
+    def decided_prefix_length(partial_answer: str) -> Optional[int]:
+        nonlocal first_line_checked
+        if first_line_checked:
+            return None
+        answer_start = len(partial_answer) - len(partial_answer.lstrip())
+        line_end = partial_answer.find("\n", answer_start)
+        if line_end < 0:
+            return None
+        first_line_checked = True
+        if _validate_ai_response(partial_answer[:line_end], action_type, game_state, player_config_name, action_specific_info)[0]:
+            return line_end
+        return None
+    return decided_prefix_length
+
+
+def _build_api_call_kwargs(
+    game_state: GameState,
+    player_config_name: str,
+    messages_for_ai: List[Dict[str, str]],
+    action_type: Optional[str] = None,
+    action_specific_info: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    player_info = game_state.get_player_info(player_config_name) or {}
+    call_kwargs = {
+        "player_config_name": player_config_name, "messages": messages_for_ai,
+        "api_endpoint": player_info.get("api_endpoint"), "api_key": player_info.get("api_key"),
+        "model_name": player_info.get("model"), "response_handler_type": player_info.get("response_handler_type", "standard"),
+        "player_display_name_for_parser": game_state.get_player_display_name(player_config_name),
+        "action_type": action_type # 自适应超时按行动类型分别统计耗时
+    }
+    response_format = _build_structured_response_format(game_state, player_config_name, action_type)
+    generation_params = _get_generation_params(game_state, player_config_name, action_type, response_format is not None)
+    if generation_params:
+        call_kwargs["generation_params"] = generation_params
+    if response_format is not None:
+        call_kwargs["response_format"] = response_format
+    else: # 结构化输出本身只有一个选项，无需提前结束
+        early_stop = _build_early_stop_check(game_state, player_config_name, action_type, action_specific_info)
+        if early_stop is not None:
+            call_kwargs["early_stop"] = early_stop
+    return call_kwargs
+
+
+def _call_ai_for_decision(
+    game_state: GameState,
+    player_config_name: str,
+    messages_for_ai: List[Dict[str, str]],
+    action_type: str,
+    action_specific_info: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[str], Optional[str]]:
+    """发出一次决策请求。发言类行动在支持流式显示的界面上边生成边显示，返回的仍是完整回复。"""
+    call_kwargs = _build_api_call_kwargs(game_state, player_config_name, messages_for_ai, action_type, action_specific_info)
+    active_ui_adapter = get_current_ui_adapter()
+    if not (game_config.STREAM_SPEECHES_TO_UI and action_type in game_config.STREAMED_ACTIONS and
+            active_ui_adapter is not None and active_ui_adapter.supports_token_streaming):
+        return make_api_call_to_ai(**call_kwargs)
+
+    response_text, api_error_message = None, None
+    active_ui_adapter.begin_ai_stream(player_config_name, action_type)
+    try:
+        response_text, api_error_message = make_api_call_to_ai(
+            **call_kwargs, on_token=lambda token: active_ui_adapter.append_ai_stream(player_config_name, token)
+        )
+    finally:
+        active_ui_adapter.end_ai_stream(player_config_name, None if api_error_message else response_text)
+    return response_text, api_error_message
+
+
+def _start_prompt_turn(
+    game_state: GameState,
+    player_config_name: str,
+    action_type: str,
+    action_specific_info: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, str]]:
+    """
+    生成一个新行动回合的消息，并把回合内容记入玩家历史 (action_type 为 prompt_<行动>)。
+    之后的请求会原样重放这个回合，同一玩家的消息序列因此只追加、不改写。玩家不存在时返回空列表。
+    """
+    history = game_state.get_compacted_player_history(player_config_name)
+    turn_content = generate_action_turn(game_state, player_config_name, action_type, history, action_specific_info)
+    if turn_content is None:
+        return []
+    messages_for_ai = assemble_prompt_messages(game_state, player_config_name, history, turn_content, action_type)
+    game_state.add_player_message_to_history(player_config_name, turn_content, role="user", action_type=f"prompt_{action_type}")
+    return messages_for_ai
+
+
+def prefetch_ai_responses_concurrently(
+    game_state: GameState,
+    decision_requests: List[Tuple[str, str, Optional[Dict[str, Any]]]]
+) -> Dict[str, PrefetchedAIResponse]:
+    """
+    为多个互不依赖的决策同时发出API请求。
+    decision_requests 为 (player_config_name, action_type, action_specific_info) 列表；
+    Prompt 在当前线程按顺序生成 (此时游戏状态不变)，只有网络等待是并发的。
+    """
+    prepared: List[Tuple[str, List[Dict[str, str]], Dict[str, Any]]] = []
+    for player_config_name, action_type, action_specific_info in decision_requests:
+        if not game_state.get_player_info(player_config_name):
+            continue
+        messages_for_ai = _start_prompt_turn(game_state, player_config_name, action_type, action_specific_info)
+        if messages_for_ai:
+            prepared.append((player_config_name, messages_for_ai, _build_api_call_kwargs(game_state, player_config_name, messages_for_ai, action_type, action_specific_info)))
+
+    _log_player_interact(f"并发发出 {bold(str(len(prepared)))} 个AI请求...", "INFO")
+    results = run_api_calls_concurrently([call_kwargs for _, _, call_kwargs in prepared])
+    return {
+        name: PrefetchedAIResponse(msgs, response_text, api_error_message)
+        for (name, msgs, _), (response_text, api_error_message) in zip(prepared, results)
+    }
+
+
+def start_ai_response_prefetch(
+    game_state: GameState,
+    player_config_name: str,
+    action_type: str,
+    action_specific_info: Optional[Dict[str, Any]] = None
+) -> Optional["Future[PrefetchedAIResponse]"]:
+    """
+    立即生成Prompt并在后台线程发出API请求，返回的 Future 完成后交给 get_ai_decision_with_gm_approval 审核。
+    只适用于在审核之前其Prompt输入不会被其他行动改变的决策。Prompt无法生成时返回 None。
+    """
+    if not game_state.get_player_info(player_config_name):
+        return None
+    messages_for_ai = _start_prompt_turn(game_state, player_config_name, action_type, action_specific_info)
+    if not messages_for_ai:
+        return None
+    call_kwargs = _build_api_call_kwargs(game_state, player_config_name, messages_for_ai, action_type, action_specific_info)
+
+    def _fetch() -> PrefetchedAIResponse:
+        response_text, api_error_message = make_api_call_to_ai(**call_kwargs)
+        return PrefetchedAIResponse(messages_for_ai, response_text, api_error_message)
+
+    _log_player_interact(f"后台预取 {colorize(action_type, Colors.YELLOW)} 的AI响应。", "DEBUG", player_config_name, game_state_ref=game_state)
+    return _prefetch_executor.submit(_fetch)
+
+
+def get_ai_decisions_with_batch_gm_approval(
+    game_state: GameState,
+    decision_requests: List[Tuple[str, str, Optional[Dict[str, Any]]]]
+) -> Dict[str, Optional[Any]]:
+    """
+    并发获取多个独立决策，全部返回后作为一批交给GM审核。
+    GM (终端或Web界面) 可一次性采纳全部有效响应，无效或被要求复核的响应再逐个进入常规审核流程。
+    返回 {player_config_name: 决策值}，键的顺序与 decision_requests 一致。
+    """
+    prefetched_by_player = prefetch_ai_responses_concurrently(game_state, decision_requests)
+
+    validations: Dict[str, Tuple[bool, Optional[str], Optional[Any], Optional[List[str]]]] = {}
+    for player_config_name, action_type, action_specific_info in decision_requests:
+        prefetched = prefetched_by_player.get(player_config_name)
+        if prefetched and not prefetched.api_error_message:
+            validations[player_config_name] = _validate_ai_response(prefetched.response_text, action_type, game_state, player_config_name, action_specific_info)
+
+    # 自动审核时有效响应直接采纳，无效的交给逐个审核中的自动重试
+    batch_accept_valid = get_autopilot_policy() is not None
+    active_ui_adapter = get_current_ui_adapter()
+    if validations and not batch_accept_valid and active_ui_adapter and is_gradio_mode():
+        batch_entries: List[Tuple[str, str, str, bool]] = []
+        for player_config_name, action_type, _ in decision_requests:
+            prefetched = prefetched_by_player.get(player_config_name)
+            if player_config_name in validations:
+                is_valid, _, parsed_value, _ = validations[player_config_name]
+                preview = str(prefetched.response_text)[:60].replace(chr(10), ' ')
+                batch_entries.append((player_config_name, action_type, f"{preview} -> {parsed_value}" if is_valid else preview, is_valid))
+            else:
+                batch_entries.append((player_config_name, action_type, str(prefetched.api_error_message if prefetched else "Prompt生成失败"), False))
+        batch_accept_valid = active_ui_adapter.get_gm_batch_approval(batch_entries)
+    elif validations and not batch_accept_valid:
+        print(colorize(f"\n--- GM批量审核点: {len(decision_requests)} 个并发决策 ---", Colors.BOLD + Colors.MAGENTA))
+        for player_config_name, action_type, _ in decision_requests:
+            p_display = _get_colored_player_display_name_from_interaction(game_state, player_config_name, True)
+            prefetched = prefetched_by_player.get(player_config_name)
+            if player_config_name in validations:
+                is_valid, _, parsed_value, _ = validations[player_config_name]
+                status = green(f"有效 -> {parsed_value}") if is_valid else red("无效")
+                preview = str(prefetched.response_text)[:60].replace(chr(10), ' ')
+                print(f"  {p_display} ({colorize(action_type, Colors.YELLOW)}): {ai_response_color(preview)}  [{status}]")
+            else:
+                error_text = prefetched.api_error_message if prefetched else "Prompt生成失败"
+                print(f"  {p_display} ({colorize(action_type, Colors.YELLOW)}): {red(str(error_text))}")
+        batch_choice = input(
+            f"请选择操作: [{bold('A')}]采纳全部有效响应(无效的逐个审核), [{bold('I')}]逐个审核全部响应: "
+        ).strip().upper()
+        batch_accept_valid = batch_choice == 'A'
+
+    decisions: Dict[str, Optional[Any]] = {}
+    for player_config_name, action_type, action_specific_info in decision_requests:
+        validation = validations.get(player_config_name)
+        if batch_accept_valid and validation and validation[0]:
+            game_state.add_player_message_to_history(player_config_name, prefetched_by_player[player_config_name].response_text, role="assistant", action_type=action_type)
+            decisions[player_config_name] = validation[2]
+            continue
+        decisions[player_config_name] = get_ai_decision_with_gm_approval(
+            game_state, player_config_name, action_type, action_specific_info,
+            prefetched_response=prefetched_by_player.get(player_config_name)
+        )
+    return decisions
+
+
 def get_ai_decision_with_gm_approval(
     game_state: GameState,
     player_config_name: str,
     action_type: str,
     action_specific_info: Optional[Dict[str, Any]] = None,
-    max_api_error_auto_retries: int = 1,
-    ui_adapter=None
+    max_api_error_auto_retries: Optional[int] = None,
+    ui_adapter=None,
+    prefetched_response: Optional[PrefetchedAIResponse] = None
 ) -> Optional[Any]:
     player_info = game_state.get_player_info(player_config_name)
     p_display_name_colored = _get_colored_player_display_name_from_interaction(game_state, player_config_name, True)
@@ -164,11 +487,22 @@ def get_ai_decision_with_gm_approval(
     if "history" not in player_info or not isinstance(player_info["history"], list):
         player_info["history"] = []
 
+    turn_started = prefetched_response is not None # 预取时回合已在生成Prompt时记入历史
     while True:
-        current_history_for_prompt = game_state.get_player_history(player_config_name)
-        messages_for_ai = generate_prompt_for_action(game_state, player_config_name, action_type, current_history_for_prompt, action_specific_info)
+        if prefetched_response is not None:
+            messages_for_ai = prefetched_response.messages
+        elif not turn_started:
+            messages_for_ai = _start_prompt_turn(game_state, player_config_name, action_type, action_specific_info)
+            turn_started = True
+        else:
+            # GM要求重试: 原样重放本回合、无效回答和GM的修正指示，不重新生成回合
+            messages_for_ai = assemble_prompt_messages(game_state, player_config_name, game_state.get_compacted_player_history(player_config_name))
 
         if not messages_for_ai or len(messages_for_ai) < 1:
+            if get_autopilot_policy():
+                _log_player_interact(f"为 {p_display_name_colored} 生成的prompt为空或不完整，自动审核跳过行动 {action_type_colored}。", "WARN", player_config_name, game_state_ref=game_state)
+                game_state.add_player_message_to_history(player_config_name, f"GM跳过了此行动({action_type}) due to prompt error", role="system", action_type=f"gm_skip_{action_type}", is_gm_override=True)
+                return None
             _log_player_interact(f"为 {p_display_name_colored} 生成的prompt为空或不完整，GM需要介入。", "ERROR", player_config_name, game_state_ref=game_state)
             user_choice = input(
                 colorize(f"GM Alert: 无法为 {p_display_name_colored} 生成行动 '{action_type_colored}' 的有效Prompt。\n", Colors.RED) +
@@ -189,10 +523,11 @@ def get_ai_decision_with_gm_approval(
                 game_state.add_player_message_to_history(player_config_name, f"GM跳过了此行动({action_type}) due to prompt error", role="system", action_type=f"gm_skip_{action_type}", is_gm_override=True)
                 return None
 
-        _log_player_interact(f"准备为 {p_display_name_colored} (行动: {action_type_colored}) 调用API。将发送的消息:", "DEBUG", player_config_name, game_state_ref=game_state)
-        for i, msg in enumerate(messages_for_ai):
-            role_colored = colorize(msg['role'].upper(), Colors.BOLD + (Colors.GREEN if msg['role'] == 'user' else Colors.CYAN if msg['role'] == 'assistant' else Colors.BLUE))
-            _log_player_interact(f"  MSG[{i+1}/{len(messages_for_ai)}] Role: {role_colored}, Content(部分): {grey(str(msg['content'])[:250])}{grey('...') if len(str(msg['content'])) > 250 else ''}", "DEBUG", player_config_name, game_state_ref=game_state)
+        if is_log_enabled("DEBUG"):
+            _log_player_interact(f"准备为 {p_display_name_colored} (行动: {action_type_colored}) 调用API。将发送的消息:", "DEBUG", player_config_name, game_state_ref=game_state)
+            for i, msg in enumerate(messages_for_ai):
+                role_colored = colorize(msg['role'].upper(), Colors.BOLD + (Colors.GREEN if msg['role'] == 'user' else Colors.CYAN if msg['role'] == 'assistant' else Colors.BLUE))
+                _log_player_interact(f"  MSG[{i+1}/{len(messages_for_ai)}] Role: {role_colored}, Content(部分): {grey(str(msg['content'])[:250])}{grey('...') if len(str(msg['content'])) > 250 else ''}", "DEBUG", player_config_name, game_state_ref=game_state)
 
         ai_response_text = None
         api_error_message = None
@@ -200,35 +535,58 @@ def get_ai_decision_with_gm_approval(
 
         while True:
             api_call_attempts_current_round += 1
-            _log_player_interact(f"请求AI ({p_display_name_colored}) 执行 '{action_type_colored}' (API尝试 {colorize(str(api_call_attempts_current_round), Colors.BOLD)})", "INFO", player_config_name, game_state_ref=game_state)
-            ai_response_text, api_error_message = make_api_call_to_ai(
-                player_config_name=player_config_name, messages=messages_for_ai,
-                api_endpoint=player_info.get("api_endpoint"), api_key=player_info.get("api_key"),
-                model_name=player_info.get("model"), response_handler_type=player_info.get("response_handler_type", "standard"),
-                player_display_name_for_parser=game_state.get_player_display_name(player_config_name)
-            )
+            if prefetched_response is not None:
+                # 首轮使用预取的响应；之后的重试(API错误或GM要求重试)都重新请求
+                _log_player_interact(f"使用预取的AI ({p_display_name_colored}) '{action_type_colored}' 响应。", "INFO", player_config_name, game_state_ref=game_state)
+                ai_response_text, api_error_message = prefetched_response.response_text, prefetched_response.api_error_message
+                prefetched_response = None
+            else:
+                _log_player_interact(f"请求AI ({p_display_name_colored}) 执行 '{action_type_colored}' (API尝试 {colorize(str(api_call_attempts_current_round), Colors.BOLD)})", "INFO", player_config_name, game_state_ref=game_state)
+                ai_response_text, api_error_message = _call_ai_for_decision(game_state, player_config_name, messages_for_ai, action_type, action_specific_info)
             if not api_error_message: break
-            _log_player_interact(colorize(f"API调用失败: {api_error_message}", Colors.RED), "ERROR", player_config_name, game_state_ref=game_state)
-            if api_call_attempts_current_round <= max_api_error_auto_retries:
-                _log_player_interact(colorize(f"将在3秒后自动重试API调用 ({api_call_attempts_current_round}/{max_api_error_auto_retries})...", Colors.YELLOW), "WARN", player_config_name, game_state_ref=game_state)
-                time.sleep(3)
+            _log_player_interact(colorize(f"API调用失败 ({get_error_kind(api_error_message)}): {api_error_message}", Colors.RED), "ERROR", player_config_name, game_state_ref=game_state)
+            retries_done = api_call_attempts_current_round - 1
+            retry_delay = _api_retry_policy.next_delay(api_error_message, retries_done)
+            if max_api_error_auto_retries is not None and retries_done >= max_api_error_auto_retries:
+                retry_delay = None
+            if retry_delay is not None:
+                _log_player_interact(colorize(f"将在{retry_delay:.1f}秒后自动重试API调用 ({retries_done + 1}/{_api_retry_policy.max_retries(api_error_message)})...", Colors.YELLOW), "WARN", player_config_name, game_state_ref=game_state)
+                time.sleep(retry_delay)
                 continue
+            elif get_autopilot_policy() or is_headless_mode(): # 无人值守: 不阻塞，跳过该行动
+                _log_player_interact(f"API调用持续失败，自动跳过 {p_display_name_colored} 的行动 {action_type_colored}。", "WARN", player_config_name, game_state_ref=game_state)
+                if get_autopilot_policy():
+                    get_autopilot_policy().reset(player_config_name, action_type)
+                game_state.add_player_message_to_history(player_config_name, f"GM跳过了此行动({action_type}) due to persistent API error", role="system", action_type=f"gm_skip_{action_type}", is_gm_override=True)
+                return None
+
+            endpoint_health = get_endpoint_status(player_info.get("api_endpoint"))
+            active_ui_adapter = get_current_ui_adapter()
+            if active_ui_adapter and is_gradio_mode():
+                api_error_result = active_ui_adapter.get_gm_api_error_decision(player_config_name, action_type, api_error_message,
+                                                                               api_call_attempts_current_round, endpoint_health)
             else:
                 print(colorize(f"\n--- GM干预: API调用持续失败 ({p_display_name_colored}, 行动: {action_type_colored}) ---", Colors.BOLD + Colors.RED))
                 print(colorize(f"已尝试 {api_call_attempts_current_round} 次。最后错误: {api_error_message}", Colors.RED))
+                if endpoint_health:
+                    print(colorize(f"端点状态: {endpoint_health}", Colors.YELLOW))
                 gm_api_choice = input(
                     f"请选择操作: [{bold('R')}]再次尝试API调用, [{bold('M')}]手动输入此AI行动, [{bold('S')}]跳过此AI行动: "
                 ).strip().upper()
-                if gm_api_choice == 'R': continue
-                elif gm_api_choice == 'M':
-                    manual_input = input(f"请输入 {p_display_name_colored} 的 {action_type_colored} 内容: ").strip()
-                    game_state.add_player_message_to_history(player_config_name, manual_input, role="assistant", action_type=f"gm_override_{action_type}", is_gm_override=True)
-                    _, _, parsed_value, _ = _validate_ai_response(manual_input, action_type, game_state, player_config_name, action_specific_info)
-                    return parsed_value if parsed_value is not None else manual_input
-                else:
-                    _log_player_interact(f"GM选择跳过 {p_display_name_colored} 的行动 {action_type_colored} (因API持续错误)。", "WARN", player_config_name, game_state_ref=game_state)
-                    game_state.add_player_message_to_history(player_config_name, f"GM跳过了此行动({action_type}) due to persistent API error", role="system", action_type=f"gm_skip_{action_type}", is_gm_override=True)
-                    return None
+                api_error_result = GMApprovalResult({"R": "retry", "M": "manual"}.get(gm_api_choice, "skip"))
+                if api_error_result.action == "manual":
+                    api_error_result.content = input(f"请输入 {p_display_name_colored} 的 {action_type_colored} 内容: ").strip()
+
+            if api_error_result.action == "retry": continue
+            elif api_error_result.action == "manual":
+                manual_input = api_error_result.content or ""
+                game_state.add_player_message_to_history(player_config_name, manual_input, role="assistant", action_type=f"gm_override_{action_type}", is_gm_override=True)
+                _, _, parsed_value, _ = _validate_ai_response(manual_input, action_type, game_state, player_config_name, action_specific_info)
+                return parsed_value if parsed_value is not None else manual_input
+            else:
+                _log_player_interact(f"GM选择跳过 {p_display_name_colored} 的行动 {action_type_colored} (因API持续错误)。", "WARN", player_config_name, game_state_ref=game_state)
+                game_state.add_player_message_to_history(player_config_name, f"GM跳过了此行动({action_type}) due to persistent API error", role="system", action_type=f"gm_skip_{action_type}", is_gm_override=True)
+                return None
         
         is_valid, validation_error_msg, parsed_action_value, valid_choices = _validate_ai_response(
             ai_response_text, action_type, game_state, player_config_name, action_specific_info
@@ -236,7 +594,7 @@ def get_ai_decision_with_gm_approval(
 
         active_ui_adapter = get_current_ui_adapter()
         
-        if active_ui_adapter and is_gradio_mode():
+        if active_ui_adapter and (is_gradio_mode() or is_headless_mode()):
             result = active_ui_adapter.get_gm_approval(player_config_name, ai_response_text, action_type, validation_error_msg, parsed_action_value, valid_choices)
         else:
             # 终端模式逻辑（保持完整）
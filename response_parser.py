@@ -2,6 +2,8 @@
 import re
 import json # 主要用于调试时打印复杂的JSON对象
 
+from game_logger import LogMessage, is_log_enabled, resolve_log_message, emit_log_line
+
 # 假设 terminal_colors.py 在项目根目录或者Python可以找到的路径下
 try:
     from terminal_colors import colorize, log_level_color, Colors, red, yellow, blue, magenta, cyan, grey, bold
@@ -23,9 +25,24 @@ def _remove_think_tags(text_content):
         return re.sub(r"<think.*?>.*?</think>\s*", "", text_content, flags=re.DOTALL | re.IGNORECASE).strip()
     return text_content
 
+def unwrap_structured_choice(text_content: str) -> str:
+    """结构化输出 (见 player_interaction._build_structured_response_format) 的回复形如 {"choice": "..."}，取出选项；其他文本原样返回。"""
+    stripped = text_content.strip()
+    if not (stripped.startswith("{") and stripped.endswith("}")):
+        return text_content
+    try:
+        data = json.loads(stripped)
+    except json.JSONDecodeError:
+        return text_content
+    choice = data.get("choice") if isinstance(data, dict) else None
+    return choice if isinstance(choice, str) else text_content
+
 # 将 _log_parser_event 移到 parse_ai_response 前面，因为它被后者调用
-def _log_parser_event(message: str, level: str = "INFO", model_name_for_logging="未知模型", player_display_name_for_log="AI玩家"):
+def _log_parser_event(message: LogMessage, level: str = "INFO", model_name_for_logging="未知模型", player_display_name_for_log="AI玩家"):
     """解析器模块的日志记录器。"""
+    if not is_log_enabled(level):
+        return
+    message = resolve_log_message(message)
     level_colored = colorize(level, log_level_color(level))
     prefix_module = colorize("[ResponseParser:", MODULE_COLOR)
     model_colored = colorize(model_name_for_logging, Colors.CYAN)
@@ -36,7 +53,7 @@ def _log_parser_event(message: str, level: str = "INFO", model_name_for_logging=
     # 更稳健的做法是修改调用 _log_parser_event 的地方，不传入这些信息到 message 字符串中
     message_cleaned = message.replace(f"[{player_display_name_for_log}]", "").replace(f"使用 {model_name_for_logging}", "").strip()
     
-    print(f"{prefix_module}{level_colored}:{model_colored}] ({player_colored}) {message_cleaned}")
+    emit_log_line(f"{prefix_module}{level_colored}:{model_colored}] ({player_colored}) {message_cleaned}")
 
 
 def parse_ai_response(response_data, handler_type, model_name_for_logging="未知模型", player_display_name="AI玩家"):
@@ -46,16 +63,13 @@ def parse_ai_response(response_data, handler_type, model_name_for_logging="未
     content_raw = None
     final_content = colorize("（AI未能按预期格式回应）", Colors.RED) # 默认错误消息上色
 
-    player_name_colored = colorize(player_display_name, Colors.BRIGHT_MAGENTA)
-    model_name_colored = colorize(model_name_for_logging, Colors.CYAN)
     handler_type_colored = colorize(handler_type, Colors.YELLOW)
 
     try:
         if handler_type == "qwen_stream_with_thinking":
             content_raw = response_data
             if not isinstance(content_raw, str):
-                # 直接使用 print 而不是 _log_parser_event，因为这个日志格式更特定
-                print(colorize(f"!! [{player_name_colored} 使用 {model_name_colored}] {handler_type_colored} 类型期望得到字符串，实际为 {colorize(str(type(content_raw)), Colors.RED)}", Colors.RED))
+                _log_parser_event(colorize(f"{handler_type_colored} 类型期望得到字符串，实际为 {str(type(content_raw))}", Colors.RED), "ERROR", model_name_for_logging, player_display_name_for_log=player_display_name)
                 return final_content
         elif isinstance(response_data, dict):
             if "choices" in response_data and response_data["choices"]:
@@ -63,19 +77,19 @@ def parse_ai_response(response_data, handler_type, model_name_for_logging="未
                 if "message" in choice and "content" in choice["message"]:
                     content_raw = choice["message"]["content"]
                 else:
-                    print(colorize(f"!! [{player_name_colored} 使用 {model_name_colored}] 在 'choices[0]' 中未找到 'message.content'。响应: {grey(str(choice)[:200])}", Colors.RED))
+                    _log_parser_event(lambda: colorize(f"在 'choices[0]' 中未找到 'message.content'。响应: {str(choice)[:200]}", Colors.RED), "ERROR", model_name_for_logging, player_display_name_for_log=player_display_name)
             else:
-                print(colorize(f"!! [{player_name_colored} 使用 {model_name_colored}] 响应数据 'choices' 缺失/为空。响应: {grey(str(response_data)[:200])}", Colors.RED))
+                _log_parser_event(lambda: colorize(f"响应数据 'choices' 缺失/为空。响应: {str(response_data)[:200]}", Colors.RED), "ERROR", model_name_for_logging, player_display_name_for_log=player_display_name)
         else:
-            print(colorize(f"!! [{player_name_colored} 使用 {model_name_colored}] 未知响应数据格式。类型: {colorize(str(type(response_data)), Colors.RED)}, 数据(部分): {grey(str(response_data)[:200])}", Colors.RED))
+            _log_parser_event(lambda: colorize(f"未知响应数据格式。类型: {str(type(response_data))}, 数据(部分): {str(response_data)[:200]}", Colors.RED), "ERROR", model_name_for_logging, player_display_name_for_log=player_display_name)
             return final_content
         
         if content_raw is None and handler_type != "qwen_stream_with_thinking":
-             print(colorize(f"!! [{player_name_colored} 使用 {model_name_colored}] 未能从响应中提取到核心内容字符串。", Colors.RED))
+             _log_parser_event(colorize("未能从响应中提取到核心内容字符串。", Colors.RED), "ERROR", model_name_for_logging, player_display_name_for_log=player_display_name)
              return final_content
 
     except Exception as e:
-        print(colorize(f"!! [{player_name_colored} 使用 {model_name_colored}] 初始内容提取阶段出错: {red(str(e))}", Colors.RED))
+        _log_parser_event(colorize(f"初始内容提取阶段出错: {e}", Colors.RED), "ERROR", model_name_for_logging, player_display_name_for_log=player_display_name)
         return final_content
 
     if handler_type == "think_tags_in_content":
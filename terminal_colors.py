@@ -1,5 +1,8 @@
 # terminal_colors.py
-from typing import Optional
+import re
+import threading
+from contextlib import contextmanager
+from typing import Optional, Iterator
 
 # ANSI 转义码
 class Colors:
@@ -37,9 +40,43 @@ class Colors:
     BG_BRIGHT_BLACK = '\033[100m'
     # ... 其他背景色
 
+# --- 输出目标 ---
+# 同一段文本可能发往终端(带颜色)、模型(messages)或Gradio界面，后两者都只需要纯文本。
+OUTPUT_TARGET_TERMINAL = "terminal"
+OUTPUT_TARGET_MODEL = "model"
+OUTPUT_TARGET_GRADIO = "gradio"
+
+_ANSI_ESCAPE_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+_render_state = threading.local() # 按线程记录当前输出目标，后台预取线程生成Prompt时互不影响
+
+def get_output_target() -> str:
+    return getattr(_render_state, "target", OUTPUT_TARGET_TERMINAL)
+
+@contextmanager
+def output_target(target: str) -> Iterator[None]:
+    """在此范围内 colorize 及所有颜色便捷函数按 target 渲染: 终端带ANSI颜色，其他目标直接输出纯文本。"""
+    previous = get_output_target()
+    _render_state.target = target
+    try:
+        yield
+    finally:
+        _render_state.target = previous
+
+def strip_ansi_codes(text: str) -> str:
+    """移除文本中的ANSI转义码 (用于处理已经上过色的文本)。"""
+    if not isinstance(text, str):
+        return str(text)
+    return _ANSI_ESCAPE_RE.sub('', text) if '\x1b' in text else text
+
+def render_for_target(text: str, target: str) -> str:
+    """把可能带颜色的文本转换为适合 target 的形式。"""
+    return text if target == OUTPUT_TARGET_TERMINAL else strip_ansi_codes(text)
+
 # 辅助函数，用于包裹文本
 def colorize(text: str, color_code: str) -> str:
-    """用指定的颜色代码包裹文本。"""
+    """用指定的颜色代码包裹文本 (非终端输出目标下原样返回)。"""
+    if get_output_target() != OUTPUT_TARGET_TERMINAL:
+        return f"{text}"
     return f"{color_code}{text}{Colors.RESET}"
 
 # 常用颜色组合的便捷函数
@@ -0,0 +1,39 @@
+# tests/conftest.py
+# 项目模块都在仓库根目录，测试直接按模块名导入
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Any, Callable, List, Optional
+
+import pytest
+
+import game_config
+from game_logger import configure_logging, get_log_level
+from game_state import GameState, Player
+
+
+@pytest.fixture(autouse=True)
+def _quiet_logs():
+    """测试期间关闭日志输出，结束后恢复原来的级别。"""
+    previous_level = get_log_level()
+    configure_logging("OFF")
+    yield
+    configure_logging(previous_level)
+
+
+@pytest.fixture
+def make_game_state() -> Callable[..., GameState]:
+    """
+    返回创建对局的函数: 按 roles (默认 ROLE_DISTRIBUTIONS[num_players] 的顺序) 注册玩家
+    {name_prefix}1..{name_prefix}n，编号从1开始，其余关键字参数作为每名玩家的字段。
+    """
+    def _make(num_players: int = 6, roles: Optional[List[str]] = None, name_prefix: str = "P", **player_fields: Any) -> GameState:
+        game_state = GameState()
+        for i, role in enumerate(roles or game_config.ROLE_DISTRIBUTIONS[num_players]):
+            name = f"{name_prefix}{i + 1}"
+            game_state.register_player(name, Player.for_role(name, i + 1, role, **player_fields))
+        game_state.ai_player_config_names = list(game_state.players_data)
+        return game_state
+    return _make
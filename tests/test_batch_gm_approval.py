@@ -0,0 +1,59 @@
+# tests/test_batch_gm_approval.py
+"""Web界面下并发投票的批量审核: 通过 UIAdapter.get_gm_batch_approval 一次询问GM，采纳后不再逐个审核有效投票。"""
+import pytest
+
+import game_config
+import ui_adapter
+from game_state import GameState
+from mock_llm_server import start_mock_server
+from player_interaction import get_ai_decisions_with_batch_gm_approval
+from ui_adapter import GradioUIAdapter, GMApprovalResult, set_current_ui_adapter
+
+
+class _RecordingGradioAdapter(GradioUIAdapter):
+    def __init__(self, accept_all_valid: bool):
+        super().__init__()
+        self.accept_all_valid = accept_all_valid
+        self.batches = []
+        self.single_approvals = []
+
+    def get_gm_batch_approval(self, entries):
+        self.batches.append(entries)
+        return self.accept_all_valid
+
+    def get_gm_approval(self, player_config_name, ai_response, action_type, validation_error=None, parsed_value=None, valid_choices=None):
+        self.single_approvals.append(player_config_name)
+        return GMApprovalResult("accept")
+
+
+@pytest.fixture
+def game_state(make_game_state):
+    server = start_mock_server(abstain_rate=0.0)
+    previous_adapter = ui_adapter.get_current_ui_adapter()
+    yield make_game_state(api_endpoint=server.url, api_key="EMPTY", model="mock", response_handler_type="standard", history=[])
+    set_current_ui_adapter(previous_adapter)
+    server.shutdown()
+    server.server_close()
+
+
+def _vote_requests(game_state: GameState):
+    return [(name, game_config.ACTION_VOTE, None) for name in game_state.get_alive_players()] # 与 game_flow_manager 中的并发投票相同
+
+
+@pytest.mark.parametrize("accept_all_valid", [True, False])
+def test_gradio_batch_approval(game_state, accept_all_valid):
+    adapter = _RecordingGradioAdapter(accept_all_valid)
+    adapter.set_game_state(game_state)
+    set_current_ui_adapter(adapter)
+
+    decisions = get_ai_decisions_with_batch_gm_approval(game_state, _vote_requests(game_state))
+
+    assert len(adapter.batches) == 1
+    entries = adapter.batches[0]
+    assert [entry[0] for entry in entries] == list(decisions) == game_state.get_alive_players()
+    valid_voters = [name for name, _, _, is_valid in entries if is_valid]
+    assert valid_voters
+    if accept_all_valid: # 有效投票直接采纳，只有无效的逐个审核
+        assert not set(adapter.single_approvals) & set(valid_voters)
+    else:
+        assert adapter.single_approvals == list(decisions)
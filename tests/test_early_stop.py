@@ -0,0 +1,90 @@
+# tests/test_early_stop.py
+"""决策流的提前结束 (_build_early_stop_check) 与女巫解药回复的解析。"""
+from typing import Optional
+
+import pytest
+
+import game_config
+from player_interaction import _build_early_stop_check, _parse_witch_save_answer, _validate_ai_response
+
+VOTER = "P2"
+
+
+@pytest.fixture
+def game_state(make_game_state):
+    return make_game_state(11)
+
+
+@pytest.fixture
+def early_stop_enabled(monkeypatch):
+    monkeypatch.setattr(game_config, "EARLY_STOP_DECISIONS", True)
+
+
+def _streamed_stop(game_state, action_type: str, reply: str, action_specific_info=None) -> Optional[int]:
+    """逐字符模拟流式生成，返回判定函数第一次给出的截断长度 (不提前结束时为 None)。"""
+    check = _build_early_stop_check(game_state, VOTER, action_type, action_specific_info)
+    for end in range(1, len(reply) + 1):
+        decided = check(reply[:end])
+        if decided is not None:
+            return decided
+    return None
+
+
+@pytest.mark.parametrize("reply, expected_vote", [
+    ("玩家5\n因为他的发言前后矛盾。", "P5"),
+    ("玩家1\n理由略。", "P1"), # 不会等到 "玩家10" 才确定
+    ("玩家10\n理由略。", "P10"),
+    ("\n３号\n理由略。", "P3"), # 开头的空行不算回答
+    ("弃票\n没有足够信息。", game_config.VOTE_SKIP),
+])
+def test_stops_after_a_valid_first_line(game_state, early_stop_enabled, reply, expected_vote):
+    decided = _streamed_stop(game_state, game_config.ACTION_VOTE, reply)
+    assert decided is not None and reply[decided] == "\n"
+    is_valid, _, parsed_value, _ = _validate_ai_response(reply[:decided], game_config.ACTION_VOTE, game_state, VOTER)
+    assert is_valid and parsed_value == expected_vote
+
+
+@pytest.mark.parametrize("reply", [
+    "玩家3，不对，我投玩家5", # 行内改口
+    "玩家3，不对，我投玩家5\n理由略。",
+    "玩家3 还是 玩家5\n我再想想。", # 犹豫
+    "玩家3还是玩家5",
+    "我想想\n玩家5", # 第一行不是合法目标，之后不再判定
+    "玩家5", # 没有换行: 回复自然结束，不需要截断
+])
+def test_does_not_stop_on_corrections_or_hedges(game_state, early_stop_enabled, reply):
+    assert _streamed_stop(game_state, game_config.ACTION_VOTE, reply) is None
+
+
+def test_corrected_vote_is_not_mistaken_for_the_first_name(game_state, early_stop_enabled):
+    reply = "玩家3，不对，我投玩家5"
+    assert _streamed_stop(game_state, game_config.ACTION_VOTE, reply) is None
+    assert _validate_ai_response(reply, game_config.ACTION_VOTE, game_state, VOTER)[2] != "P3"
+
+
+def test_disabled_by_default(game_state):
+    assert _build_early_stop_check(game_state, VOTER, game_config.ACTION_VOTE) is None
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("是", True), ("救", True), ("使用解药", True), ("Yes", True), ("yes, I know", True),
+    ("否", False), ("不救", False), ("不是", False), ("否，不救他", False), ("不会救", False),
+    ("不使用", False), ("no", False), ("No, save the potion", False),
+    ("让我想想", None), ("", None),
+])
+def test_parse_witch_save_answer(reply, expected):
+    assert _parse_witch_save_answer(reply) is expected
+
+
+@pytest.mark.parametrize("reply, expected_save", [
+    ("不救\n留着解药。", False),
+    ("否，不救他\n理由略。", False),
+    ("不是现在\n", False),
+    ("是\n救他。", True),
+])
+def test_witch_save_stops_on_either_answer(game_state, early_stop_enabled, reply, expected_save):
+    info = {"killed_player_name": "P5"}
+    decided = _streamed_stop(game_state, game_config.ACTION_WITCH_SAVE, reply, info)
+    assert decided == reply.index("\n")
+    is_valid, _, use_save, _ = _validate_ai_response(reply[:decided], game_config.ACTION_WITCH_SAVE, game_state, VOTER, info)
+    assert is_valid and use_save is expected_save
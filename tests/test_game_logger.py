@@ -0,0 +1,83 @@
+# tests/test_game_logger.py
+"""BufferedLogSink 的写出时机，以及流程日志在Web模式下不受 LOG_LEVEL 过滤。"""
+import io
+import time
+
+import pytest
+
+import ui_adapter
+from game_flow_manager import _log_flow_event
+from game_logger import BufferedLogSink, MemoryLogSink, configure_logging
+from ui_adapter import GradioUIAdapter, set_current_ui_adapter
+
+
+def _wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_buffered_sink_writes_when_full():
+    stream = io.StringIO()
+    sink = BufferedLogSink(stream, max_lines=3, flush_seconds=0)
+    sink.write("a")
+    sink.write("b")
+    assert stream.getvalue() == ""
+    sink.write("c")
+    assert stream.getvalue() == "a\nb\nc\n"
+
+
+def test_buffered_sink_flushes_in_the_background():
+    stream = io.StringIO()
+    sink = BufferedLogSink(stream, max_lines=1000, flush_seconds=0.05)
+    sink.write("[WARN] 请求失败，10秒后重试") # 之后没有新的日志行
+    assert _wait_for(lambda: stream.getvalue() == "[WARN] 请求失败，10秒后重试\n")
+    sink.close()
+
+
+def test_buffered_sink_close_writes_the_rest():
+    stream = io.StringIO()
+    sink = BufferedLogSink(stream, max_lines=1000, flush_seconds=60)
+    sink.write("a")
+    sink.close()
+    assert stream.getvalue() == "a\n"
+
+
+class _RecordingGradioAdapter(GradioUIAdapter):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def log_flow_event(self, message, level="INFO", day=None, phase=None):
+        self.events.append((message, level))
+
+
+@pytest.fixture
+def gradio_adapter():
+    previous_adapter = ui_adapter.get_current_ui_adapter()
+    adapter = _RecordingGradioAdapter()
+    set_current_ui_adapter(adapter)
+    yield adapter
+    set_current_ui_adapter(previous_adapter)
+
+
+def test_flow_events_reach_gradio_regardless_of_log_level(gradio_adapter):
+    configure_logging("ERROR")
+    _log_flow_event(lambda: "第1天开始", "INFO")
+    assert gradio_adapter.events == [("第1天开始", "INFO")]
+
+
+def test_flow_events_in_terminal_follow_log_level():
+    previous_adapter = ui_adapter.get_current_ui_adapter()
+    set_current_ui_adapter(None)
+    try:
+        sink = MemoryLogSink()
+        configure_logging("WARN", sink)
+        _log_flow_event("第1天开始", "INFO")
+        _log_flow_event("没有存活玩家", "WARN")
+        assert len(sink.lines()) == 1 and "没有存活玩家" in sink.lines()[0]
+    finally:
+        set_current_ui_adapter(previous_adapter)
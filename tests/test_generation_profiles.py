@@ -0,0 +1,43 @@
+# tests/test_generation_profiles.py
+"""默认不发送生成参数；回复因 max_tokens 被截断 (finish_reason 为 length) 时记录警告。"""
+import pytest
+
+import game_config
+from ai_interface import make_api_call_to_ai
+from game_logger import MemoryLogSink, configure_logging
+from mock_llm_server import start_mock_server
+from player_interaction import _get_generation_params
+
+MESSAGES = [{"role": "user", "content": "你的行动指示: 现在轮到你发言了，请发表你的看法。"}] # 模拟服务返回一段完整发言
+
+
+@pytest.fixture
+def server():
+    server = start_mock_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("action_type", [game_config.ACTION_SPEECH, game_config.ACTION_LAST_WORDS, game_config.ACTION_VOTE, None])
+def test_default_profile_sends_nothing(make_game_state, action_type):
+    assert _get_generation_params(make_game_state(), "P1", action_type) == {}
+
+
+def test_player_profile_overrides_the_decision_profile(make_game_state):
+    game_state = make_game_state(generation_profiles={**game_config.DECISION_GENERATION_PROFILES, "vote": {"max_tokens": 64}})
+    assert _get_generation_params(game_state, "P1", game_config.ACTION_VOTE) == {"max_tokens": 64}
+    assert _get_generation_params(game_state, "P1", game_config.ACTION_SPEECH) == {} # 决策配置不限制发言
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+@pytest.mark.parametrize("max_tokens, expect_warning", [(5, True), (100000, False)])
+def test_length_cut_reply_is_logged(server, streamed, max_tokens, expect_warning):
+    sink = MemoryLogSink()
+    configure_logging("WARN", sink)
+    response_text, api_error = make_api_call_to_ai(
+        "P1", MESSAGES, server.url, "EMPTY", "mock", generation_params={"max_tokens": max_tokens},
+        on_token=(lambda token: None) if streamed else None
+    )
+    assert api_error is None and response_text
+    assert any("finish_reason=length" in line for line in sink.lines()) is expect_warning
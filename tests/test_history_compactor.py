@@ -0,0 +1,125 @@
+# tests/test_history_compactor.py
+"""按天折叠的历史摘要: 摘要内容只包含该玩家应知道的信息，最新一天保留原文，折叠的天数取放得进预算的最少天数。"""
+import pytest
+
+from game_config import PLAYER_STATUS_DEAD
+from game_state import GameState
+from history_compactor import DIGEST_HEADER, _get_digest_cache, compact_player_history, estimate_tokens
+
+PROPHET = "P1"
+VILLAGER = "P4"
+LONG_TEXT = "我仔细分析了场上每个人的发言和投票。" * 8
+
+
+@pytest.fixture
+def game_state(make_game_state):
+    roles = ["预言家", "女巫", "猎人", "平民", "狼人", "狼人"]
+    return make_game_state(roles=roles)
+
+
+def _play_day(game_state: GameState, day: int, turns: int = 2) -> None:
+    game_state.game_day = day
+    for name in (PROPHET, VILLAGER):
+        for turn in range(turns):
+            game_state.add_player_message_to_history(name, f"第{day}天第{turn}回合的行动指示。" + LONG_TEXT, role="user", action_type="speech")
+            game_state.add_player_message_to_history(name, f"第{day}天第{turn}回合: " + LONG_TEXT, role="assistant", action_type="speech")
+
+
+def _digest_text(game_state: GameState, player: str, budget: int = 1) -> str:
+    digest = compact_player_history(game_state, player, budget)[0]
+    assert digest["_meta"]["action_type"] == "history_digest"
+    return digest["content"]
+
+
+def test_night_deaths_do_not_reveal_the_cause(game_state):
+    _play_day(game_state, 1)
+    game_state.update_player_status("P3", PLAYER_STATUS_DEAD, reason="夜晚1被狼人袭击")
+    game_state.update_player_status("P2", PLAYER_STATUS_DEAD, reason="夜晚1被女巫能力作用")
+    _play_day(game_state, 2)
+
+    digest = _digest_text(game_state, VILLAGER)
+    assert "3号(夜晚出局)" in digest and "2号(夜晚出局)" in digest
+    assert "狼人袭击" not in digest and "女巫" not in digest
+
+
+def test_vote_and_hunter_deaths_are_public(game_state):
+    _play_day(game_state, 1)
+    game_state.update_player_status("P5", PLAYER_STATUS_DEAD, reason="白天1被投票出局")
+    game_state.update_player_status("P6", PLAYER_STATUS_DEAD, reason="被猎人P3能力作用")
+    _play_day(game_state, 2)
+
+    digest = _digest_text(game_state, VILLAGER)
+    assert "5号(被投票出局)" in digest and "6号(被猎人带走)" in digest
+
+
+def test_only_the_prophet_sees_their_own_checks(game_state):
+    _play_day(game_state, 1)
+    game_state.players_data[PROPHET]["prophet_check_history"] = [
+        {"day": 1, "target": "P5", "is_wolf": True},
+        {"day": 2, "target": "P4", "is_wolf": False},
+    ]
+    _play_day(game_state, 2)
+    _play_day(game_state, 3)
+
+    prophet_digest = _digest_text(game_state, PROPHET)
+    assert "5号是狼人阵营" in prophet_digest and "4号是好人阵营" in prophet_digest
+    day_one = prophet_digest.split("第2天")[0]
+    assert "4号是好人阵营" not in day_one # 查验结果记在查验当天
+    assert "查验结果" not in _digest_text(game_state, VILLAGER)
+
+
+def test_newest_day_is_kept_verbatim(game_state):
+    for day in (1, 2, 3):
+        _play_day(game_state, day)
+    history = game_state.players_data[VILLAGER]["history"]
+    newest_day = [entry for entry in history if entry["_meta"]["day"] == 3]
+
+    compacted = compact_player_history(game_state, VILLAGER, 1) # 预算小到任何折叠都放不下
+    assert compacted[0]["content"].startswith(DIGEST_HEADER)
+    assert "第1天" in compacted[0]["content"] and "第2天" in compacted[0]["content"]
+    assert all(a is b for a, b in zip(compacted[1:], newest_day)) and len(compacted) == len(newest_day) + 1
+
+
+def test_history_within_budget_is_unchanged(game_state):
+    _play_day(game_state, 1)
+    _play_day(game_state, 2)
+    history = game_state.players_data[VILLAGER]["history"]
+    assert compact_player_history(game_state, VILLAGER, 10 ** 6) == history
+    assert compact_player_history(game_state, VILLAGER, 0) == history # 0 表示不限制
+
+
+def _tokens(entries) -> int:
+    return sum(estimate_tokens(entry["content"]) for entry in entries)
+
+
+def _collapsing_costs(game_state: GameState, player: str):
+    """每种折叠天数 k 的总token数 (摘要 + 其余原文)，以及不折叠时的原文总数。"""
+    history = game_state.players_data[player]["history"]
+    days = sorted({entry["_meta"]["day"] for entry in history})
+    by_day = [[entry for entry in history if entry["_meta"]["day"] == day] for day in days]
+    cache = _get_digest_cache(game_state)
+    closed = [cache.day_summary(game_state, player, day, entries) for day, entries in zip(days[:-1], by_day[:-1])]
+    raw = [_tokens(entries) for entries in by_day]
+    costs = {k: estimate_tokens(DIGEST_HEADER) + sum(summary[2] for summary in closed[:k]) + sum(raw[k:]) for k in range(1, len(days))}
+    return costs, sum(raw), by_day
+
+
+def _collapsed_days(compacted, by_day) -> int:
+    return sum(1 for entries in by_day if not any(entry is kept for entry in entries for kept in compacted))
+
+
+@pytest.mark.parametrize("days", [3, 5])
+def test_collapses_the_fewest_days_that_fit(game_state, days):
+    for day in range(1, days + 1):
+        _play_day(game_state, day)
+    costs, full_tokens, by_day = _collapsing_costs(game_state, VILLAGER)
+
+    assert _collapsed_days(compact_player_history(game_state, VILLAGER, costs[1]), by_day) == 1
+    assert _collapsed_days(compact_player_history(game_state, VILLAGER, costs[1] - 1), by_day) == 2
+
+    for budget in range(full_tokens - 1, 0, -37):
+        fitting = [k for k, cost in costs.items() if cost <= budget]
+        expected = min(fitting) if fitting else min(costs, key=lambda k: (costs[k], k)) # 都放不下时取总量最小的
+        compacted = compact_player_history(game_state, VILLAGER, budget)
+        assert _collapsed_days(compacted, by_day) == expected, budget
+        assert all(a is b for a, b in zip(compacted[-len(by_day[-1]):], by_day[-1])) # 最新一天总是原文
@@ -0,0 +1,82 @@
+# tests/test_player_references.py
+"""AI回复中玩家指代的解析: normalize_player_reference、别名索引和 find_player_by_reference。"""
+import pytest
+
+import game_config
+from game_config import PLAYER_STATUS_DEAD
+from game_state import GameState, Player, _player_reference_aliases, normalize_player_reference
+from player_interaction import _validate_ai_response
+
+
+@pytest.fixture
+def game_state(make_game_state):
+    return make_game_state(11, name_prefix="PlayerAI")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("玩家3 (PlayerAI3)", "玩家3playerai3"),
+    ("【３号】", "3号"),
+    ("playerai3。", "playerai3"),
+    ("ＰｌａｙｅｒＡＩ１０", "playerai10"),
+    (" 玩家 5 ！\n", "玩家5"),
+    ("弃票。", "弃票"),
+])
+def test_normalize_player_reference(text, expected):
+    assert normalize_player_reference(text) == expected
+
+
+def test_aliases_cover_number_and_name_forms():
+    aliases = _player_reference_aliases("PlayerAI3", 3)
+    assert {"playerai3", "3", "3号", "玩家3", "3号玩家", "玩家3playerai3", "3号playerai3", "3playerai3", "playerai3玩家3"} == set(aliases)
+    assert _player_reference_aliases("PlayerAI3", None) == ["playerai3"]
+
+
+@pytest.mark.parametrize("reference, expected", [
+    ("PlayerAI3", "PlayerAI3"),
+    ("playerai3", "PlayerAI3"),
+    ("3", "PlayerAI3"),
+    ("３", "PlayerAI3"), # 全角数字
+    ("3号", "PlayerAI3"),
+    ("３号", "PlayerAI3"),
+    ("玩家3", "PlayerAI3"),
+    ("3号玩家", "PlayerAI3"),
+    ("玩家3 (PlayerAI3)", "PlayerAI3"),
+    ("玩家3（PlayerAI3）", "PlayerAI3"), # 全角括号
+    ("玩家3。", "PlayerAI3"), # 结尾标点
+    ("“玩家3”！", "PlayerAI3"),
+    ("玩家1", "PlayerAI1"), # "玩家1" 不是 "玩家10" 的前缀匹配
+    ("玩家10", "PlayerAI10"),
+    ("1号", "PlayerAI1"),
+    ("10号", "PlayerAI10"),
+    ("PlayerAI1", "PlayerAI1"),
+    ("PlayerAI11", "PlayerAI11"),
+    ("玩家12", None),
+    ("玩家3还是玩家5", None),
+    ("", None),
+])
+def test_find_player_by_reference(game_state, reference, expected):
+    assert game_state.find_player_by_reference(reference) == expected
+
+
+def test_dead_player_is_found_but_rejected_by_callers(game_state):
+    game_state.update_player_status("PlayerAI3", PLAYER_STATUS_DEAD, reason="夜晚1被狼人袭击")
+    assert game_state.find_player_by_reference("3号") == "PlayerAI3" # 索引不关心存活状态
+    for action_type in (game_config.ACTION_VOTE, game_config.ACTION_WITCH_POISON, game_config.ACTION_HUNTER_SHOOT):
+        is_valid, _, _, choices = _validate_ai_response("3号", action_type, game_state, "PlayerAI1")
+        assert not is_valid and "PlayerAI3" not in choices
+
+
+def test_ambiguous_alias_returns_none():
+    game_state = GameState()
+    game_state.register_player("1", Player.for_role("1", 2, "平民")) # 配置名 "1" 与1号玩家的编号别名冲突
+    game_state.register_player("X", Player.for_role("X", 1, "狼人"))
+    assert game_state.find_player_by_reference("１") is None # 规范化后为 "1"，两名玩家都可能
+    assert game_state.find_player_by_reference("1") == "1" # 与配置名完全相同时直接采用
+    assert game_state.find_player_by_reference("1号") == "X"
+    assert game_state.find_player_by_reference("2号") == "1"
+
+
+def test_reregistering_updates_the_alias_index(game_state):
+    game_state.register_player("PlayerAI3", Player.for_role("PlayerAI3", 12, "平民")) # 编号改变
+    assert game_state.find_player_by_reference("玩家12") == "PlayerAI3"
+    assert game_state.find_player_by_reference("玩家3") is None
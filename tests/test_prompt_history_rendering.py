@@ -0,0 +1,75 @@
+# tests/test_prompt_history_rendering.py
+"""历史压缩生效时，PlayerPromptContext 对同一玩家的下一次Prompt只渲染新增的历史条目。"""
+import pytest
+
+import werewolf_prompts
+from game_state import GameState
+from werewolf_prompts import get_player_prompt_context
+
+PLAYER = "P1"
+
+
+@pytest.fixture
+def game_state(make_game_state):
+    return make_game_state(history_token_budget=300)
+
+
+def _play_turn(game_state: GameState, day: int, turn: int) -> None:
+    game_state.game_day = day
+    game_state.add_player_message_to_history(PLAYER, f"第{day}天第{turn}个回合，请发言。" + "场上局势说明。" * 10, role="user", action_type="speech")
+    game_state.add_player_message_to_history(PLAYER, f"我是{day}-{turn}的发言。" + "分析内容。" * 10, role="assistant", action_type="speech")
+
+
+def _record_rendered_entries(monkeypatch) -> list:
+    rendered_batches = []
+    original = werewolf_prompts._append_history_messages
+
+    def recording(rendered, entries, player_config_name=None):
+        rendered_batches.append(len(entries))
+        return original(rendered, entries, player_config_name)
+
+    monkeypatch.setattr(werewolf_prompts, "_append_history_messages", recording)
+    return rendered_batches
+
+
+def test_second_prompt_renders_only_new_entries_while_compacted(game_state, monkeypatch):
+    for day in (1, 2, 3):
+        for turn in range(3):
+            _play_turn(game_state, day, turn)
+    context = get_player_prompt_context(game_state, PLAYER)
+    first_history = game_state.get_compacted_player_history(PLAYER)
+    assert first_history[0]["_meta"]["action_type"] == "history_digest"
+    context.history_messages(first_history)
+
+    rendered_batches = _record_rendered_entries(monkeypatch)
+    _play_turn(game_state, 3, 3) # 同一天追加，折叠的天数不变
+    second_history = game_state.get_compacted_player_history(PLAYER)
+    assert second_history[0] is first_history[0]
+    messages = context.history_messages(second_history)
+
+    assert rendered_batches == [2] # 只渲染新增的 user/assistant 两条
+    fresh_messages = []
+    werewolf_prompts._append_history_messages(fresh_messages, second_history, PLAYER)
+    assert messages == fresh_messages
+
+
+def test_newly_collapsed_day_rebuilds_history(game_state, monkeypatch):
+    for day in (1, 2):
+        for turn in range(3):
+            _play_turn(game_state, day, turn)
+    context = get_player_prompt_context(game_state, PLAYER)
+    first_history = game_state.get_compacted_player_history(PLAYER)
+    context.history_messages(first_history)
+
+    rendered_batches = _record_rendered_entries(monkeypatch)
+    for day in (3, 4):
+        for turn in range(3):
+            _play_turn(game_state, day, turn)
+    second_history = game_state.get_compacted_player_history(PLAYER)
+    assert second_history[0] is not first_history[0]
+    messages = context.history_messages(second_history)
+
+    assert rendered_batches == [len(second_history)]
+    fresh_messages = []
+    werewolf_prompts._append_history_messages(fresh_messages, second_history, PLAYER)
+    assert messages == fresh_messages
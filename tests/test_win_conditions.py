@@ -0,0 +1,98 @@
+# tests/test_win_conditions.py
+"""
+按计数器判断胜负的 check_for_win_conditions 与原来逐个扫描 players_data 的实现对照:
+随机注册玩家、改变存活状态 (包括猎人开枪)，每次变化后两者的结果必须相同。
+"""
+import random
+from typing import Optional
+
+import pytest
+
+from game_config import ROLE_DISTRIBUTIONS, PLAYER_STATUS_ALIVE, PLAYER_STATUS_DEAD
+from game_rules_engine import check_for_win_conditions
+from game_state import GameState, Player
+
+
+def _reference_winner(game_state: GameState) -> Optional[str]:
+    """原实现 (逐个扫描存活玩家) 的胜负规则，去掉了日志。"""
+    alive_players_data = [p_data for p_data in game_state.players_data.values() if p_data["status"] == PLAYER_STATUS_ALIVE]
+    if not alive_players_data:
+        return "异常平局"
+
+    num_alive_wolves = sum(1 for p in alive_players_data if p["role"] == "狼人")
+    num_alive_prophets = sum(1 for p in alive_players_data if p["role"] == "预言家")
+    num_alive_witches = sum(1 for p in alive_players_data if p["role"] == "女巫")
+    num_alive_hunters = sum(1 for p in alive_players_data if p["role"] == "猎人")
+    num_alive_villagers = sum(1 for p in alive_players_data if p["role"] == "平民")
+
+    num_alive_gods = num_alive_prophets + num_alive_witches + num_alive_hunters
+    num_alive_good_guys = num_alive_gods + num_alive_villagers
+
+    if num_alive_wolves == 0 and num_alive_good_guys > 0:
+        return "好人胜利"
+    if num_alive_wolves > 0:
+        if num_alive_wolves >= num_alive_good_guys:
+            return "狼人胜利"
+        if num_alive_gods == 0 and num_alive_villagers > 0:
+            return "狼人胜利"
+        if num_alive_villagers == 0 and num_alive_gods > 0:
+            return "狼人胜利"
+    return None
+
+
+def _assert_same_winner(game_state: GameState, step: str) -> None:
+    assert check_for_win_conditions(game_state) == _reference_winner(game_state), step
+
+
+def _hunter_shoot(game_state: GameState, rng: random.Random) -> bool:
+    """让一名已出局、还能开枪的猎人带走一名存活玩家 (与 game_flow_manager 中的顺序相同)。"""
+    hunters = [name for name in game_state.get_players_by_role("猎人") if game_state.can_hunter_shoot(name)]
+    alive_players = game_state.get_alive_players()
+    if not hunters or not alive_players:
+        return False
+    hunter, target = rng.choice(hunters), rng.choice(alive_players)
+    game_state.update_player_status(target, PLAYER_STATUS_DEAD, reason=f"被猎人{hunter}能力作用")
+    game_state.hunter_uses_shot(hunter)
+    return True
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_counter_based_winner_matches_scan(seed):
+    rng = random.Random(seed)
+    num_players = rng.choice(sorted(ROLE_DISTRIBUTIONS))
+    roles = ROLE_DISTRIBUTIONS[num_players][:]
+    rng.shuffle(roles)
+    game_state = GameState()
+    names = [f"P{i + 1}" for i in range(num_players)]
+
+    for i, role in enumerate(roles): # 逐个注册，注册过程中的每一步也要一致
+        game_state.register_player(names[i], Player.for_role(names[i], i + 1, role))
+        _assert_same_winner(game_state, f"seed={seed} 注册 {names[i]}")
+
+    for step in range(rng.randint(1, 4 * num_players)):
+        operation = rng.random()
+        if operation < 0.15 and _hunter_shoot(game_state, rng):
+            _assert_same_winner(game_state, f"seed={seed} 第{step}步 猎人开枪")
+            continue
+        if operation < 0.25: # 重新注册 (角色和存活状态都可能改变)，索引和计数器必须随之更新
+            name = rng.choice(names)
+            number = game_state.players_data[name]["player_number"]
+            status = rng.choice([PLAYER_STATUS_ALIVE, PLAYER_STATUS_DEAD])
+            game_state.register_player(name, Player.for_role(name, number, rng.choice(roles), status=status))
+            _assert_same_winner(game_state, f"seed={seed} 第{step}步 重新注册 {name}")
+            continue
+        name = rng.choice(names)
+        new_status = rng.choice([PLAYER_STATUS_DEAD, PLAYER_STATUS_DEAD, PLAYER_STATUS_ALIVE])
+        game_state.update_player_status(name, new_status, reason="test")
+        _assert_same_winner(game_state, f"seed={seed} 第{step}步 {name} -> {new_status}")
+
+
+def test_empty_game_is_abnormal_draw():
+    assert check_for_win_conditions(GameState()) == _reference_winner(GameState()) == "异常平局"
+
+
+def test_register_player_returns_registered_player():
+    game_state = GameState()
+    registered = game_state.register_player("P1", {"config_name": "P1", "player_number": 1, "role": "狼人", "status": PLAYER_STATUS_ALIVE})
+    assert isinstance(registered, Player)
+    assert registered is game_state.players_data["P1"]
@@ -0,0 +1,276 @@
+# tournament_runner.py
+"""
+批量对局评测入口：在多个工作进程中并行运行 N 局完整的无人值守游戏，
+并把胜负、天数和各角色/各模型的胜率汇总到一个JSON结果文件中。
+
+用法示例:
+    python tournament_runner.py --games 200 --workers 8 --seed 42
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+import traceback
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional
+
+try:
+    from terminal_colors import (
+        colorize, log_level_color, Colors, red, green, yellow, cyan, bold, strip_ansi_codes
+    )
+except ImportError:
+    def colorize(text: str, _color_code: str) -> str: return text
+    def log_level_color(_level: str) -> str: return ""
+    class Colors: RESET = ""; BOLD = ""; RED = ""; GREEN = ""; YELLOW = ""; BLUE = ""; MAGENTA = ""; CYAN = ""; BRIGHT_BLACK = ""
+    def red(text: str) -> str: return text
+    def green(text: str) -> str: return text
+    def yellow(text: str) -> str: return text
+    def cyan(text: str) -> str: return text
+    def bold(text: str) -> str: return text
+    def strip_ansi_codes(text: str) -> str: return text
+
+import game_config
+from game_config import CONFIG_FILENAME
+from game_logger import LogMessage, BufferedLogSink, MemoryLogSink, configure_logging, emit_log_line, flush_log_sink, is_log_enabled, resolve_log_message
+from llm_response_cache import CACHE_MODES
+
+MODULE_COLOR = Colors.BLUE
+
+WINNER_GOOD = "好人胜利"
+WINNER_WOLF = "狼人胜利"
+WINNER_NONE = "未分胜负" # 平局、达到最大天数或对局出错
+
+
+def _log_tournament_event(message: LogMessage, level: str = "INFO"):
+    if not is_log_enabled(level):
+        return
+    level_colored = colorize(level, log_level_color(level))
+    prefix_module = colorize("[Tournament:", MODULE_COLOR)
+    emit_log_line(f"{prefix_module}{level_colored}] {resolve_log_message(message)}")
+
+
+def _classify_winner(winner_message: Optional[str]) -> str:
+    if winner_message == WINNER_GOOD: return WINNER_GOOD
+    if winner_message == WINNER_WOLF: return WINNER_WOLF
+    return WINNER_NONE
+
+
+def _run_single_game(game_index: int, seed: int, config_filename: str, log_dir: Optional[str],
+                     llm_cache_mode: Optional[str] = None, llm_cache_dir: Optional[str] = None,
+                     early_stop_decisions: bool = False) -> Dict[str, Any]:
+    """
+    在工作进程中运行一局无头游戏并返回可JSON序列化的结果。
+    对局的全部终端输出写入 log_dir 下的单独文件，避免多个进程的输出交错；此时日志级别为 game_config.LOG_LEVEL。
+    未指定 log_dir 时输出被丢弃，日志级别降为 LOG_LEVEL_HEADLESS 并只在内存中保留最近的日志行，对局出错时附在 error 里。
+    llm_cache_mode/llm_cache_dir 覆盖 game_config 中的录制/回放设置，early_stop_decisions 设置 game_config.EARLY_STOP_DECISIONS。
+    """
+    # 在工作进程内导入，确保每个进程都有独立的模块级状态 (当前UI适配器、HTTP会话等)
+    from game_state import GameState
+    from game_setup import initialize_game
+    from game_flow_manager import run_game_loop
+    from ui_adapter import create_ui_adapter, set_current_ui_adapter
+    from llm_response_cache import configure_llm_cache
+    from ai_resilience import get_endpoint_health, get_latency_stats
+
+    configure_llm_cache(llm_cache_mode, llm_cache_dir)
+    game_config.EARLY_STOP_DECISIONS = early_stop_decisions
+    random.seed(seed)
+    game_state = GameState()
+    started_at = time.time()
+    error = None
+    memory_sink = None
+    if log_dir:
+        configure_logging(game_config.LOG_LEVEL, BufferedLogSink())
+    else:
+        memory_sink = MemoryLogSink()
+        configure_logging(game_config.LOG_LEVEL_HEADLESS, memory_sink)
+
+    log_path = os.path.join(log_dir, f"game_{game_index:04d}_seed{seed}.log") if log_dir else os.devnull
+    with open(log_path, "w", encoding="utf-8") as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            if not initialize_game(game_state, config_filename):
+                error = "游戏初始化失败"
+            else:
+                ui_adapter = create_ui_adapter("headless")
+                ui_adapter.set_game_state(game_state)
+                set_current_ui_adapter(ui_adapter)
+                run_game_loop(game_state, ui_adapter=ui_adapter)
+        except Exception as e:
+            error = f"{e}\n{traceback.format_exc()}"
+        finally:
+            flush_log_sink() # 缓冲的日志写到 stdout 被重定向到的本局日志文件
+    if error and memory_sink is not None and memory_sink.lines():
+        error += "\n--- 最近的日志 ---\n" + "\n".join(strip_ansi_codes(line) for line in memory_sink.lines())
+
+    winner = _classify_winner(game_state.game_winner_message) if not error else WINNER_NONE
+    players = []
+    for p_data in sorted(game_state.players_data.values(), key=lambda p: p.get("player_number", 0)):
+        role = p_data.get("role")
+        is_wolf_side = role == "狼人"
+        players.append({
+            "name": p_data.get("config_name"),
+            "player_number": p_data.get("player_number"),
+            "model": p_data.get("model"),
+            "role": role,
+            "survived": p_data.get("status") == "alive",
+            "won": (winner == WINNER_WOLF and is_wolf_side) or (winner == WINNER_GOOD and not is_wolf_side),
+        })
+    return {
+        "game_index": game_index,
+        "seed": seed,
+        "winner": winner,
+        "winner_message": game_state.game_winner_message,
+        "days": game_state.game_day,
+        "duration_seconds": round(time.time() - started_at, 2),
+        "players": players,
+        "endpoint_health": get_endpoint_health(), # 本进程中各端点的熔断状态和失败计数
+        "latency": get_latency_stats(), # 本进程中各 端点|模型|行动类型 的耗时分位数和当前超时
+        "error": error,
+    }
+
+
+def _new_outcome_counter() -> Dict[str, int]:
+    return {"games": 0, "wins": 0, "survived": 0}
+
+
+def _add_outcome(counter: Dict[str, int], player_result: Dict[str, Any]) -> None:
+    counter["games"] += 1
+    counter["wins"] += int(player_result["won"])
+    counter["survived"] += int(player_result["survived"])
+
+
+def _with_rates(counter: Dict[str, int]) -> Dict[str, Any]:
+    games = counter["games"]
+    return {**counter,
+            "win_rate": round(counter["wins"] / games, 4) if games else None,
+            "survival_rate": round(counter["survived"] / games, 4) if games else None}
+
+
+def aggregate_results(game_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """把单局结果汇总为胜方分布、天数统计、按角色/按玩家/按模型(及模型x角色)的胜率。"""
+    finished = [g for g in game_results if not g["error"]]
+    winners = Counter(g["winner"] for g in game_results)
+    days = [g["days"] for g in finished]
+
+    by_role: Dict[str, Dict[str, int]] = defaultdict(_new_outcome_counter)
+    by_player: Dict[str, Dict[str, int]] = defaultdict(_new_outcome_counter)
+    by_model: Dict[str, Dict[str, int]] = defaultdict(_new_outcome_counter)
+    by_model_role: Dict[str, Dict[str, Dict[str, int]]] = defaultdict(lambda: defaultdict(_new_outcome_counter))
+    for game in finished:
+        for p in game["players"]:
+            model = p["model"] or "未指定模型"
+            _add_outcome(by_role[p["role"]], p)
+            _add_outcome(by_player[p["name"]], p)
+            _add_outcome(by_model[model], p)
+            _add_outcome(by_model_role[model][p["role"]], p)
+
+    total = len(game_results)
+    return {
+        "games_total": total,
+        "games_failed": total - len(finished),
+        "winners": dict(winners),
+        "win_rates": {w: round(c / total, 4) for w, c in winners.items()} if total else {},
+        "days": {
+            "mean": round(sum(days) / len(days), 2) if days else None,
+            "min": min(days) if days else None,
+            "max": max(days) if days else None,
+            "distribution": {str(d): c for d, c in sorted(Counter(days).items())},
+        },
+        "by_role": {k: _with_rates(v) for k, v in by_role.items()},
+        "by_player": {k: _with_rates(v) for k, v in by_player.items()},
+        "by_model": {k: _with_rates(v) for k, v in by_model.items()},
+        "by_model_role": {m: {r: _with_rates(v) for r, v in roles.items()} for m, roles in by_model_role.items()},
+    }
+
+
+def run_tournament(num_games: int, workers: Optional[int] = None, base_seed: int = 0,
+                   config_filename: str = CONFIG_FILENAME, log_dir: Optional[str] = None,
+                   llm_cache_mode: Optional[str] = None, llm_cache_dir: Optional[str] = None,
+                   early_stop_decisions: bool = False) -> Dict[str, Any]:
+    """
+    并行运行 num_games 局游戏。第 i 局使用种子 base_seed + i，因此同一组参数可以复现相同的角色分配。
+    返回包含设置、汇总和逐局结果的字典。
+    """
+    workers = workers or os.cpu_count() or 1
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    _log_tournament_event(f"开始批量对局: {bold(str(num_games))} 局，{bold(str(workers))} 个工作进程，基础种子 {base_seed}。")
+
+    started_at = time.time()
+    game_results: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_run_single_game, i, base_seed + i, config_filename, log_dir, llm_cache_mode, llm_cache_dir,
+                            early_stop_decisions): i
+            for i in range(num_games)
+        }
+        for future in as_completed(futures):
+            game_index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e: # 工作进程异常退出等
+                result = {"game_index": game_index, "seed": base_seed + game_index, "winner": WINNER_NONE,
+                          "winner_message": None, "days": 0, "duration_seconds": 0.0, "players": [], "error": str(e)}
+            game_results.append(result)
+            status = red(f"出错: {str(result['error']).splitlines()[0]}") if result["error"] else f"{result['winner']} (第{result['days']}天)"
+            _log_tournament_event(f"[{len(game_results)}/{num_games}] 第 {game_index} 局 (种子 {result['seed']}): {status}",
+                                  "ERROR" if result["error"] else "INFO")
+
+    game_results.sort(key=lambda g: g["game_index"])
+    return {
+        "settings": {
+            "num_games": num_games,
+            "workers": workers,
+            "base_seed": base_seed,
+            "config_filename": config_filename,
+            "llm_cache_mode": llm_cache_mode,
+            "early_stop_decisions": early_stop_decisions,
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at)),
+            "wall_time_seconds": round(time.time() - started_at, 2),
+        },
+        "summary": aggregate_results(game_results),
+        "games": game_results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI狼人杀 - 多进程批量对局评测")
+    parser.add_argument("-n", "--games", type=int, default=10, help="要运行的对局数 (默认: 10)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="工作进程数 (默认: CPU核数)")
+    parser.add_argument("--seed", type=int, default=0, help="基础随机种子，第i局使用 seed+i (默认: 0)")
+    parser.add_argument("--config", type=str, default=CONFIG_FILENAME, help=f"玩家配置文件 (默认: {CONFIG_FILENAME})")
+    parser.add_argument("--output", type=str, default=None, help="结果JSON文件路径 (默认: tournament_results/tournament_<时间戳>.json)")
+    parser.add_argument("--log-dir", type=str, default=None, help="保存每局完整输出的目录 (默认不保存)")
+    parser.add_argument("--llm-cache", type=str, default=None, choices=CACHE_MODES, help="LLM响应录制/回放模式 (默认取 game_config.LLM_CACHE_MODE)")
+    parser.add_argument("--llm-cache-dir", type=str, default=None, help="录制结果目录 (默认取 game_config.LLM_CACHE_DIR)")
+    parser.add_argument("--early-stop", action="store_true", help="决策回答的第一行确定后提前结束流式请求 (见 game_config.EARLY_STOP_DECISIONS)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.config):
+        _log_tournament_event(red(f"错误: 玩家配置文件 '{args.config}' 未找到。"), "CRITICAL")
+        sys.exit(1)
+
+    results = run_tournament(args.games, args.workers, args.seed, args.config, args.log_dir, args.llm_cache, args.llm_cache_dir,
+                             args.early_stop)
+
+    output_path = args.output or os.path.join("tournament_results", f"tournament_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    summary = results["summary"]
+    _log_tournament_event(bold(green(f"批量对局完成，用时 {results['settings']['wall_time_seconds']} 秒。结果已保存到 {output_path}")))
+    _log_tournament_event(f"胜方分布: {summary['winners']}  平均天数: {summary['days']['mean']}")
+    for model, stats in summary["by_model"].items():
+        _log_tournament_event(f"  模型 {cyan(model)}: {stats['wins']}/{stats['games']} 胜 (胜率 {stats['win_rate']})")
+    if summary["games_failed"]:
+        _log_tournament_event(yellow(f"{summary['games_failed']} 局出错，详见结果文件中的 error 字段。"), "WARN")
+
+
+if __name__ == "__main__":
+    main()
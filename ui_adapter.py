@@ -1,6 +1,6 @@
 # ui_adapter.py (最终完整版)
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, Callable, Union
+from typing import List, Dict, Any, Optional, Callable, Tuple, Union
 from enum import Enum
 
 # 导入现有的颜色模块和游戏模块
@@ -29,11 +29,14 @@ except ImportError:
     def bold(text: str) -> str: return text
 
 from assets_base64 import format_gm_action_message
+import game_config
+from game_logger import is_log_enabled, emit_log_line
 
 class UIMode(Enum):
     """UI模式枚举"""
     TERMINAL = "terminal"
     GRADIO = "gradio"
+    HEADLESS = "headless"
 
 class GMApprovalResult:
     """GM审核结果"""
@@ -41,12 +44,41 @@ class GMApprovalResult:
         self.action = action  # 'accept', 'retry', 'manual', 'skip', 'accept_invalid'
         self.content = content  # 如果是manual，这里是手动输入的内容
 
+class AutopilotPolicy:
+    """
+    无人值守时代替GM做审核决定的策略:
+    - 有效响应直接采纳；
+    - 无效响应让AI带着修正提示重试，同一玩家同一行动最多重试 max_invalid_retries 次；
+    - 重试用尽后跳过该行动 (各流程把跳过的 None 视为弃权/不行动)，保证结果确定。
+    """
+    def __init__(self, max_invalid_retries: Optional[int] = None):
+        self.max_invalid_retries = game_config.AUTOPILOT_MAX_INVALID_RETRIES if max_invalid_retries is None else max_invalid_retries
+        self._invalid_retries_used: Dict[tuple, int] = {}
+
+    def decide(self, player_config_name: str, action_type: str,
+               validation_error: Optional[str] = None) -> GMApprovalResult:
+        key = (player_config_name, action_type)
+        if not validation_error:
+            self._invalid_retries_used.pop(key, None)
+            return GMApprovalResult("accept")
+        used = self._invalid_retries_used.get(key, 0)
+        if used < self.max_invalid_retries:
+            self._invalid_retries_used[key] = used + 1
+            return GMApprovalResult("retry")
+        self._invalid_retries_used.pop(key, None)
+        return GMApprovalResult("skip")
+
+    def reset(self, player_config_name: str, action_type: str) -> None:
+        """行动在审核之外结束(如API持续失败被跳过)时清除其重试计数。"""
+        self._invalid_retries_used.pop((player_config_name, action_type), None)
+
 class UIAdapter(ABC):
     """UI适配器抽象基类"""
     
     def __init__(self, mode: UIMode):
         self.mode = mode
         self.game_state = None  # 会在初始化时设置
+        self.autopilot_policy: Optional[AutopilotPolicy] = None  # 设置后由策略代替GM审核
     
     def set_game_state(self, game_state):
         """设置游戏状态引用"""
@@ -166,6 +198,40 @@ class UIAdapter(ABC):
         """
         pass
 
+    def get_gm_api_error_decision(self, player_config_name: str, action_type: str, api_error_message: str,
+                                  attempts: int, endpoint_status: Optional[Dict[str, Any]] = None) -> GMApprovalResult:
+        """
+        API自动重试用尽后询问GM: 返回 'retry' (再次请求)、'manual' (content 为手动输入的行动) 或 'skip'。
+        默认跳过；有GM界面的适配器应覆盖此方法。
+        """
+        return GMApprovalResult("skip")
+
+    def get_gm_batch_approval(self, entries: List[Tuple[str, str, str, bool]]) -> bool:
+        """
+        一批并发决策全部返回后询问GM。entries 为 (玩家配置名, 行动类型, 响应摘要, 是否有效)。
+        返回 True 表示采纳全部有效响应 (无效的再逐个审核)，False 表示逐个审核全部响应。
+        默认逐个审核；有GM界面的适配器应覆盖此方法。
+        """
+        return False
+
+    # --- 流式显示 (可选能力，默认不支持；见 player_interaction._call_ai_for_decision) ---
+    supports_token_streaming = False
+
+    def begin_ai_stream(self, player_config_name: str, action_type: str) -> None:
+        """AI开始生成一段需要逐token显示的回复。"""
+        pass
+
+    def append_ai_stream(self, player_config_name: str, token: str) -> None:
+        """追加一段刚收到的回复正文。在游戏线程中调用，实现需要尽快返回。"""
+        pass
+
+    def end_ai_stream(self, player_config_name: str, final_text: Optional[str]) -> None:
+        """
+        回复生成结束。final_text 为完整回复，请求失败时为 None。
+        随后的 get_gm_approval 审核的就是这段完整文本。
+        """
+        pass
+
 
 class TerminalUIAdapter(UIAdapter):
     """终端UI适配器 - 包装现有的终端逻辑，保持完全兼容"""
@@ -253,13 +319,37 @@ class TerminalUIAdapter(UIAdapter):
             prefix += f" [{colorize('Day ' + str(day), Colors.BOLD)}]"
         if phase:
             prefix += f" [{game_phase_color(phase)}]"
-        print(f"{prefix} {message}")
+        emit_log_line(f"{prefix} {message}")
 
     def wait_for_continue(self, prompt: str) -> None:
         """终端模式下，使用input()来阻塞和等待。"""
         input(cyan(prompt)).strip().lower()
 
 
+class HeadlessUIAdapter(TerminalUIAdapter):
+    """无头UI适配器 - 沿用终端输出，但所有GM审核由 AutopilotPolicy 自动完成，从不等待输入"""
+
+    def __init__(self, autopilot_policy: Optional[AutopilotPolicy] = None):
+        UIAdapter.__init__(self, UIMode.HEADLESS)
+        self.autopilot_policy = autopilot_policy or AutopilotPolicy()
+
+    def get_gm_approval(self, player_config_name: str, ai_response: str,
+                       action_type: str, validation_error: Optional[str] = None,
+                       parsed_value: Any = None, valid_choices: Optional[List[str]] = None) -> GMApprovalResult:
+        result = self.autopilot_policy.decide(player_config_name, action_type, validation_error)
+        if is_log_enabled("DEBUG"):
+            player_display = self.game_state.get_player_display_name(player_config_name) if self.game_state else player_config_name
+            outcome = f"解析值: '{str(parsed_value)[:60]}'" if result.action == "accept" else f"校验失败: {validation_error}"
+            emit_log_line(grey(f"[Autopilot] {player_display} ({action_type}) -> {result.action} ({outcome})"))
+        return result
+
+    def get_user_input(self, prompt: str, input_type: str = "text") -> str:
+        return ""
+
+    def wait_for_continue(self, prompt: str) -> None:
+        pass
+
+
 class GradioUIAdapter(UIAdapter):
     """Gradio UI适配器 - 接口定义，具体实现在gradio_game_controller.py中"""
     
@@ -318,6 +408,8 @@ def create_ui_adapter(mode: str) -> UIAdapter:
     elif mode == "gradio":
         # 返回基类，具体实现将在controller中被注入
         return GradioUIAdapter()
+    elif mode == "headless":
+        return HeadlessUIAdapter()
     else:
         raise ValueError(f"不支持的UI模式: {mode}")
 
@@ -333,5 +425,12 @@ def get_current_ui_adapter() -> Optional[UIAdapter]:
 def is_gradio_mode() -> bool:
     return _current_ui_adapter and _current_ui_adapter.mode == UIMode.GRADIO
 
+def is_headless_mode() -> bool:
+    return _current_ui_adapter and _current_ui_adapter.mode == UIMode.HEADLESS
+
+def get_autopilot_policy() -> Optional[AutopilotPolicy]:
+    """当前适配器启用了自动审核时返回其策略，否则返回 None (需要人工GM)。"""
+    return _current_ui_adapter.autopilot_policy if _current_ui_adapter else None
+
 def is_terminal_mode() -> bool:
-    return not is_gradio_mode() # 简化
\ No newline at end of file
+    return not is_gradio_mode() and not is_headless_mode()
\ No newline at end of file
@@ -38,6 +38,7 @@ from gm_tools import (
 import game_config # 确保 game_config 被导入
 from game_config import PLAYER_STATUS_ALIVE, PLAYER_STATUS_DEAD, PHASE_GAME_SETUP, PHASE_START_GAME # 显式导入用到的常量
 from game_report_generator import export_game_reports
+from game_logger import configure_logging, flush_log_sink, BufferedLogSink
 
 
 def run_gm_command_interface(game_state: GameState, during_game: bool = False):
@@ -96,12 +97,20 @@ def run_gm_command_interface(game_state: GameState, during_game: bool = False):
         input(grey("按回车键继续GM操作或返回..."))
 
 
-def main(ui_mode="terminal"):
+def main(ui_mode="terminal", autopilot=False):
+    """
+    ui_mode: "terminal" 由GM在终端逐个审核; "gradio" 启动Web界面; "headless" 无人值守，
+    由 AutopilotPolicy 自动审核且不等待任何输入，结束后自动导出报告。
+    autopilot: 仅对 gradio 模式有效，开启后Web界面也由 AutopilotPolicy 自动审核。
+    """
+    headless = ui_mode == "headless"
+    if headless:
+        configure_logging(game_config.LOG_LEVEL_HEADLESS, BufferedLogSink()) # 无人值守时只输出警告和错误 (批量写出)，对局进程和GM广播照常显示
     if ui_mode == "gradio":
         print("启动Web界面模式...")
         try:
             from gradio_game_controller import create_gradio_controller
-            controller = create_gradio_controller()
+            controller = create_gradio_controller(autopilot=autopilot)
             app = controller.create_interface()
             print(green("Web界面已准备就绪！"))
             app.launch(
@@ -148,13 +157,16 @@ def main(ui_mode="terminal"):
         return
 
     num_players_colored = bold(str(len(game_state.ai_player_config_names)))
-    ui_adapter = create_ui_adapter("terminal")
+    ui_adapter = create_ui_adapter("headless" if headless else "terminal")
     ui_adapter.set_game_state(game_state)
     set_current_ui_adapter(ui_adapter)
     print(green(f"\n游戏设置完毕！共有 {num_players_colored} 名玩家参与。"))
-    print(cyan("GM可以随时通过特定指令（如果实现）或在阶段间隙介入。"))
     display_all_player_statuses(game_state, ui_adapter=None)
-    input(bold(cyan("\n按回车键开始第一夜...")))
+    if headless:
+        print(cyan("无人值守模式: 所有AI响应由自动审核策略处理。"))
+    else:
+        print(cyan("GM可以随时通过特定指令（如果实现）或在阶段间隙介入。"))
+        input(bold(cyan("\n按回车键开始第一夜...")))
 
     try:
         run_game_loop(game_state, ui_adapter=ui_adapter)
@@ -167,6 +179,7 @@ def main(ui_mode="terminal"):
         print(grey(tb_str)) # Traceback用灰色
         game_state.add_game_event_log("GameError", f"游戏主循环严重错误: {e}", {"traceback": tb_str, "day": game_state.game_day, "phase": game_state.current_game_phase})
     finally:
+        flush_log_sink() # 先写出缓冲的日志，再输出结算信息
         print(magenta("\n" + "=" * 30))
         print(bold(magenta("--- 游戏会话结束 ---")))
         
@@ -182,14 +195,18 @@ def main(ui_mode="terminal"):
         print(f"游戏结果: {final_result_colored}")
 
         if game_state.game_day > 0 or game_state.game_log:
-            export_choice = input(cyan("是否要导出本局游戏报告? (y/n): ")).strip().lower()
-            if export_choice == 'y':
+            if headless:
                 export_game_reports(game_state)
+            else:
+                export_choice = input(cyan("是否要导出本局游戏报告? (y/n): ")).strip().lower()
+                if export_choice == 'y':
+                    export_game_reports(game_state)
         else:
             print(yellow("游戏未实际开始或无日志记录，跳过报告导出。"))
 
-        print(cyan("\n你可以使用GM工具查看更多信息。"))
-        run_gm_command_interface(game_state, during_game=False)
+        if not headless:
+            print(cyan("\n你可以使用GM工具查看更多信息。"))
+            run_gm_command_interface(game_state, during_game=False)
         print(bold(green("\n感谢游玩！")))
 
 
@@ -197,7 +214,9 @@ if __name__ == "__main__":
     import sys
     
     # 检查命令行参数
-    if len(sys.argv) > 1 and sys.argv[1] == "--web":
-        main("gradio")
+    if "--web" in sys.argv[1:]:
+        main("gradio", autopilot="--autopilot" in sys.argv[1:])
+    elif "--headless" in sys.argv[1:]:
+        main("headless")
     else:
         main("terminal")
\ No newline at end of file
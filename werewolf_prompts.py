@@ -1,9 +1,14 @@
 # werewolf_prompts.py (修改版 - 支持狼人提名和最终决策 + 颜色日志)
-from typing import List, Dict, Any, Optional
+import weakref
+from contextlib import nullcontext
+from typing import List, Dict, Any, Optional, Callable, Tuple
 
 # 假设 terminal_colors.py 在项目根目录或者Python可以找到的路径下
 try:
-    from terminal_colors import colorize, log_level_color, Colors, player_name_color, role_color, magenta
+    from terminal_colors import (
+        colorize, log_level_color, Colors, player_name_color, role_color, magenta,
+        output_target, OUTPUT_TARGET_TERMINAL, OUTPUT_TARGET_MODEL
+    )
 except ImportError:
     # Fallback if terminal_colors is not found, to prevent crashing
     def colorize(text: str, _color_code: str) -> str: return text
@@ -12,14 +17,23 @@ except ImportError:
     def player_name_color(name: str, _player_data=None, _game_state=None) -> str: return name
     def role_color(name: str) -> str: return name
     def magenta(text: str) -> str: return text
+    def output_target(_target: str): return nullcontext()
+    OUTPUT_TARGET_TERMINAL = "terminal"; OUTPUT_TARGET_MODEL = "model"
 
 
 from game_state import GameState
 import game_config # For role names, VOTE_SKIP etc.
+from game_logger import LogMessage, is_log_enabled, resolve_log_message, emit_log_line
 
 MODULE_COLOR = Colors.MAGENTA # PromptGen 用洋红色
 
-def _log_prompt_event(message: str, level: str = "INFO", player_config_name: Optional[str]=None):
+def _log_prompt_event(message: LogMessage, level: str = "INFO", player_config_name: Optional[str]=None):
+    if not is_log_enabled(level):
+        return
+    with output_target(OUTPUT_TARGET_TERMINAL): # 生成Prompt期间 colorize 输出纯文本，日志前缀仍按终端上色
+        _print_prompt_event(resolve_log_message(message), level, player_config_name)
+
+def _print_prompt_event(message: str, level: str, player_config_name: Optional[str]):
     level_colored = colorize(level, log_level_color(level))
     prefix_module = colorize("[PromptGen:", MODULE_COLOR)
 
@@ -38,7 +52,7 @@ def _log_prompt_event(message: str, level: str = "INFO", player_config_name: Opt
             p_name_colored = colorize(player_config_name, Colors.BRIGHT_MAGENTA) # 通用玩家名颜色
         prefix += f" ({p_name_colored})"
     
-    print(f"{prefix} {message}")
+    emit_log_line(f"{prefix} {message}")
 
 def _is_api_strict_alternating(player_info: Dict[str, Any]) -> bool:
     """
@@ -48,109 +62,240 @@ def _is_api_strict_alternating(player_info: Dict[str, Any]) -> bool:
     """
     return True # 默认所有API都采用最严格的user/assistant交替模式
 
-def _validate_and_normalize_history(
-    history: List[Dict[str, str]],
+# 历史中只作记录的条目：发言/遗言的广播副本与玩家自己的回答重复，不再单独发给模型
+_OBSERVATION_ACTION_TYPES = {"speech_taken", "last_words_broadcast_night", "last_words_broadcast_vote"}
+
+
+def _append_history_messages(
+    rendered: List[Dict[str, str]],
+    entries: List[Dict[str, Any]],
     player_config_name: Optional[str] = None # 保持 player_config_name 以便日志能识别来源
-) -> List[Dict[str, str]]:
+) -> None:
     """
-    验证历史记录并尝试规范化为 user/assistant 交替。
-    - 移除开头的 assistant 消息。
-    - 合并连续的同角色消息。
+    把历史条目渲染为紧跟在角色前缀之后的 user/assistant 消息，追加到 rendered。
+    - 记录过的行动回合(user)和玩家的回答(assistant)按原样、按顺序输出，因此同一玩家相邻两次请求的消息是追加关系；
+    - 开头的 assistant 消息被忽略 (前缀以 assistant 确认结尾)；
+    - 连续的同角色消息合并 (例如被跳过的行动后紧跟下一个回合)，合并只在末尾追加内容，不改变已发送过的前缀；
+      合并时替换为新的字典，已交给调用方的消息不会被改动；
+    - system 消息不在这里输出，由 _pending_private_notes 并入下一个回合。
     """
-    if not history:
-        return []
-
-    normalized_history = []
-
-    # 移除所有非 user/assistant 的消息，并确保不以 assistant 开头
-    temp_history = []
-    started_with_user = False
-    for msg in history:
-        if msg["role"] == "user":
-            started_with_user = True
-            temp_history.append(msg)
-        elif msg["role"] == "assistant":
-            if started_with_user: # 只有在 user 消息之后才接受 assistant
-                temp_history.append(msg)
-            else:
-                _log_prompt_event(f"历史记录中，在第一个user消息前出现assistant，已忽略: {colorize(str(msg['content'])[:50], Colors.YELLOW)}", "DEBUG", player_config_name)
-        # 其他 role (如 system) 在此阶段被忽略，因为 system prompt 会被合并
-
-    if not temp_history:
-        return []
-
-    # 合并连续的同角色消息
-    normalized_history.append(temp_history[0])
-    for i in range(1, len(temp_history)):
-        current_msg = temp_history[i]
-        last_added_msg = normalized_history[-1]
-        if current_msg["role"] == last_added_msg["role"]:
-            _log_prompt_event(f"历史记录中连续出现'{colorize(current_msg['role'], Colors.YELLOW)}'，将合并内容。", "DEBUG", player_config_name)
-            last_added_msg["content"] += "\n" + current_msg["content"]
+    for entry in entries:
+        role = entry.get("role")
+        action_type = entry.get("_meta", {}).get("action_type")
+        if role not in ("user", "assistant") or action_type in _OBSERVATION_ACTION_TYPES:
+            continue
+        if role == "assistant" and not rendered:
+            _log_prompt_event(f"历史记录中，在第一个user消息前出现assistant，已忽略: {colorize(str(entry['content'])[:50], Colors.YELLOW)}", "DEBUG", player_config_name)
+            continue
+        if rendered and rendered[-1]["role"] == role:
+            rendered[-1] = {"role": role, "content": rendered[-1]["content"] + "\n\n" + entry["content"]}
         else:
-            normalized_history.append(current_msg)
+            rendered.append({"role": role, "content": entry["content"]})
+
+
+def _pending_private_notes(history: List[Dict[str, Any]]) -> List[str]:
+    """最后一个 user 消息之后记录的 system 消息 (例如预言家的查验结果)，尚未出现在任何已发送的回合中。"""
+    notes: List[str] = []
+    for entry in reversed(history):
+        if entry.get("role") == "user":
+            break
+        action_type = entry.get("_meta", {}).get("action_type") or ""
+        if entry.get("role") == "system" and not action_type.startswith("gm_skip_"):
+            notes.append(entry["content"])
+    return list(reversed(notes))
+
+
+_ROLE_SYSTEM_BLOCKS: Dict[str, str] = {}
+_ROLE_ACK_TEMPLATE = "明白。我会始终以【{role}】的身份思考和行动，并按要求直接给出发言或决策。"
+
+
+def _build_role_system_block(role: str) -> str:
+    """系统指令与角色设定。只取决于角色，生成一次后缓存，保证逐字节不变。"""
+    cached = _ROLE_SYSTEM_BLOCKS.get(role)
+    if cached is not None:
+        return cached
+    with output_target(OUTPUT_TARGET_MODEL):
+        system_prompt_content_parts = []
+        system_prompt_content_parts.append(f"你正在参与一场狼人杀推理游戏。你的身份是【{role_color(role)}】。")
+        system_prompt_content_parts.append("你的目标是与你的阵营一起获得胜利。")
+        system_prompt_content_parts.append("请始终以你的角色身份进行思考和回应。")
+        system_prompt_content_parts.append(
+            "当你需要公开发言或发表遗言时，请务必使用【第一人称】（例如“我认为...”、“我怀疑...”）。"
+            "你最终输出的公开发言或行动决策，应该是简洁明了的、符合你角色的直接表达，不应包含你的内心分析过程。"
+        )
+        system_prompt_content_parts.append("在描述较为激烈的行动时，请使用委婉的说法，例如用“出局”、“淘汰”、“使其离开游戏”、“引导信息”等词语代替直接的负面词汇。")
+
+        if role == "平民":
+            system_prompt_content_parts.append("你的目标是找出所有“狼人伙伴”并将他们票选出局。你没有任何特殊能力，需要通过逻辑分析和听取他人发言来判断。")
+        elif role == "狼人":
+            system_prompt_content_parts.append("你的目标是逐步淘汰好人阵营的玩家（包括神职和平民），直到狼人数量达到或超过好人数量，或者所有神职或所有平民均已出局。")
+            system_prompt_content_parts.append("夜晚，你需要和你的狼队友一起商议，选择一位玩家使其在本回合结束时“出局”。白天你需要隐藏身份，混淆视听，争取不被票选出局。")
+        elif role == "预言家":
+            system_prompt_content_parts.append("你的目标是找出狼人并带领好人获胜。每晚你可以查验一名玩家的阵营（好人阵营或狼人阵营的成员）。白天你需要用你的信息引导好人。")
+        elif role == "女巫":
+            system_prompt_content_parts.append("你的目标是帮助好人获胜。你拥有一瓶【解药】，可以使一名当晚被狼人团队选择使其出局的玩家免于出局（只可使用一次）。")
+            system_prompt_content_parts.append("你也拥有一种特殊的【夜晚能力药剂】，可以选择一名玩家使其在当晚结束时出局（只可使用一次）。")
+            system_prompt_content_parts.append("【夜晚能力药剂】是你强大的武器，应该优先用于你高度怀疑是“狼人伙伴”的玩家，或者在关键时刻用于打破场上僵局以帮助好人阵营。请谨慎使用，避免误伤好人阵营的同伴。")
+            system_prompt_content_parts.append("【重要规则】：你【不能】在同一个夜晚同时使用解药和夜晚能力药剂。一旦使用其中一种，当晚便不能再使用另一种。")
+        elif role == "猎人":
+            system_prompt_content_parts.append("你的目标是帮助好人获胜。当你因为任何原因（被票选、被狼人团队选择、被女巫的特殊药剂选择）出局时，你可以选择场上任意一名其他存活玩家与你一同出局，除非你被女巫的特殊药剂明确阻止了此能力。此能力只能使用一次。")
+
+        full_system_content = "\n".join(system_prompt_content_parts)
+        block = f"--- {colorize('系统指令与角色设定', Colors.BLUE + Colors.BOLD)} ---\n" + full_system_content + \
+                f"\n--- {colorize('系统指令结束', Colors.BLUE + Colors.BOLD)} ---"
+    _ROLE_SYSTEM_BLOCKS[role] = block
+    return block
+
+
+class PlayerPromptContext:
+    """
+    单个玩家的Prompt构建缓存，避免每次行动都从头渲染：
+    - 角色前缀在创建时生成一次；
+    - 历史消息按条增量渲染。传入的历史与上次相同并只在末尾追加时，只渲染新增的条目；
+      开头变化 (例如又有一天被折叠进摘要) 时整体重建。history_compactor 在折叠的天数不变时返回同一个摘要条目，
+      所以压缩生效后同样是增量渲染；
+    - 存活玩家、昨晚出局等情境段落以 GameState.state_version 为键缓存，本轮公开发言按条追加。
+    缓存的消息字典不会被修改，返回的列表可以安全地交给调用方。
+    """
 
-    return normalized_history
+    def __init__(self, game_state: GameState, player_config_name: str):
+        self.player_config_name = player_config_name
+        self.role = game_state.players_data[player_config_name]["role"]
+        self.system_block = _build_role_system_block(self.role)
+        self.ack = _ROLE_ACK_TEMPLATE.format(role=self.role)
+        self._history_messages: List[Dict[str, str]] = []
+        self._history_len = 0
+        self._history_first: Optional[Dict[str, Any]] = None
+        self._history_last: Optional[Dict[str, Any]] = None
+        self._sections: Dict[str, Tuple[Any, Any]] = {}
+        self._speech_log: Optional[List[Dict[str, str]]] = None
+        self._speech_lines: List[str] = []
+
+    def history_messages(self, history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        # 历史条目是同一批字典对象时，首尾两条相同即说明之前渲染过的部分没有变化
+        unchanged_prefix = (self._history_len and len(history) >= self._history_len
+                            and history[0] is self._history_first and history[self._history_len - 1] is self._history_last)
+        if not unchanged_prefix:
+            self._history_messages, self._history_len = [], 0
+        if len(history) > self._history_len:
+            _append_history_messages(self._history_messages, history[self._history_len:], self.player_config_name)
+            self._history_len = len(history)
+            self._history_first, self._history_last = history[0], history[-1]
+        return list(self._history_messages)
+
+    def _cached_section(self, name: str, key: Any, build: Callable[[], Any]) -> Any:
+        cached = self._sections.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        value = build()
+        self._sections[name] = (key, value)
+        return value
+
+    def sorted_alive_players(self, game_state: GameState) -> List[str]:
+        return self._cached_section("sorted_alive", game_state.state_version, game_state.get_alive_players) # 已按编号排序
+
+    def alive_players_line(self, game_state: GameState) -> str:
+        def build() -> str:
+            alive_players_display_colored = []
+            for p_name in self.sorted_alive_players(game_state):
+                p_data_temp = game_state.get_player_info(p_name)
+                display_entry_colored = player_name_color(f"玩家{p_data_temp['player_number']} ({p_name})", p_data_temp)
+                if p_name == self.player_config_name:
+                    display_entry_colored += colorize(" [你]", Colors.GREEN + Colors.BOLD)
+                elif self.role == "狼人" and p_data_temp["role"] == "狼人":
+                    display_entry_colored += colorize(" [狼队友]", Colors.RED + Colors.BOLD)
+                alive_players_display_colored.append(display_entry_colored)
+            return f"目前场上存活的玩家: {', '.join(alive_players_display_colored)}。"
+        return self._cached_section("alive_line", game_state.state_version, build)
+
+    def night_deaths_line(self, game_state: GameState) -> Optional[str]:
+        def build() -> Optional[str]:
+            if game_state.current_game_phase in [game_config.PHASE_NIGHT_START, game_config.PHASE_GAME_SETUP, game_config.PHASE_START_GAME]:
+                return None
+            if game_state.last_night_events.get("final_deaths_this_night"):
+                night_deaths_display_colored = [
+                    player_name_color(game_state.get_player_display_name(dead_p_name), game_state.get_player_info(dead_p_name))
+                    for dead_p_name in game_state.last_night_events["final_deaths_this_night"]
+                ]
+                return f"昨晚出局的玩家是: {colorize(', '.join(night_deaths_display_colored), Colors.RED)}。"
+            if game_state.game_day > 0:
+                return colorize("昨晚平安无事，没有人出局。", Colors.GREEN)
+            return None
+        key = (game_state.state_version, game_state.game_day, game_state.current_game_phase)
+        return self._cached_section("night_deaths", key, build)
+
+    def speech_lines(self, game_state: GameState) -> List[str]:
+        speech_log = game_state.round_speeches_log
+        if speech_log is not self._speech_log or len(speech_log) < len(self._speech_lines): # 新的一轮 (reset_daily_round_data 换了列表)
+            self._speech_log, self._speech_lines = speech_log, []
+        for speech_entry in speech_log[len(self._speech_lines):]:
+            speaker_p_data = game_state.get_player_info(speech_entry["player"])
+            speaker_name_display_colored = player_name_color(game_state.get_player_display_name(speech_entry["player"]), speaker_p_data)
+            self._speech_lines.append(f"  {speaker_name_display_colored}: \"{speech_entry['speech']}\"") # Speech content not colored here
+        return list(self._speech_lines)
+
+
+_PLAYER_PROMPT_CONTEXTS: "weakref.WeakKeyDictionary[GameState, Dict[str, PlayerPromptContext]]" = weakref.WeakKeyDictionary()
+
+
+def get_player_prompt_context(game_state: GameState, player_config_name: str) -> PlayerPromptContext:
+    """取得(必要时创建)该局游戏中该玩家的 PlayerPromptContext。游戏对象被回收时缓存随之释放。"""
+    contexts = _PLAYER_PROMPT_CONTEXTS.get(game_state)
+    if contexts is None:
+        contexts = _PLAYER_PROMPT_CONTEXTS[game_state] = {}
+    context = contexts.get(player_config_name)
+    if context is None or context.role != game_state.players_data[player_config_name]["role"]:
+        context = contexts[player_config_name] = PlayerPromptContext(game_state, player_config_name)
+    return context
 
 
 def generate_prompt_for_action(
     game_state: GameState, # game_state 实例在这里传递，所以 _log_prompt_event 可以尝试使用它
     player_config_name: str,
     action_type: str,
-    current_player_history: List[Dict[str, str]],
+    current_player_history: List[Dict[str, Any]],
     action_specific_info: Optional[Dict[str, Any]] = None
 ) -> List[Dict[str, str]]:
     """
     为AI生成包含完整上下文的提示信息。
-    通用策略：
-    1. System Prompt 内容预置到第一个 User 消息的开头。
-    2. Messages 列表严格为 User/Assistant 交替，以 User 开始，以 User 结束。
+    消息布局 (同一玩家相邻两次请求，前一次的消息总是后一次的前缀，服务端的前缀/KV缓存可以复用)：
+    1. 固定前缀: 只取决于角色的系统指令(user) + 固定的确认(assistant)，同一角色的所有玩家、所有回合逐字节相同；
+    2. 历史: 之前记录的行动回合与回答，按原样重放；
+    3. 当前回合(user): 游戏情境、私下获得的新信息和行动指示，易变的数据(存活玩家、药剂状态等)只出现在这里。
+    Messages 列表严格为 User/Assistant 交替，以 User 开始，以 User 结束。
+    调用方需要把当前回合记入历史 (见 player_interaction)，下一次请求才能保持追加关系。
     """
-    player_info = game_state.get_player_info(player_config_name)
-    if not player_info:
-        _log_prompt_event(f"错误: 无法为不存在的玩家 {colorize(player_config_name, Colors.YELLOW)} 生成prompt。", "ERROR", player_config_name)
+    turn_content = generate_action_turn(game_state, player_config_name, action_type, current_player_history, action_specific_info)
+    if turn_content is None:
         return [{"role": "user", "content": "关键内部错误：玩家数据丢失。请告知游戏主持人此问题。"}]
+    return assemble_prompt_messages(game_state, player_config_name, current_player_history, turn_content, action_type)
 
-    role = player_info["role"]
-    colored_role = role_color(role)
 
+def generate_action_turn(
+    game_state: GameState,
+    player_config_name: str,
+    action_type: str,
+    current_player_history: List[Dict[str, Any]],
+    action_specific_info: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """生成当前回合的 user 消息内容 (以模型为输出目标渲染)。玩家不存在时返回 None。"""
+    with output_target(OUTPUT_TARGET_MODEL):
+        return _build_action_turn_content(game_state, player_config_name, action_type, current_player_history, action_specific_info)
 
-    # --- 1. 构建 System Prompt 的内容字符串 ---
-    system_prompt_content_parts = []
-    system_prompt_content_parts.append(f"你正在参与一场狼人杀推理游戏。你的身份是【{colored_role}】。") # 给角色上色
-    system_prompt_content_parts.append("你的目标是与你的阵营一起获得胜利。")
-    system_prompt_content_parts.append("请始终以你的角色身份进行思考和回应。")
-    system_prompt_content_parts.append(
-        "当你需要公开发言或发表遗言时，请务必使用【第一人称】（例如“我认为...”、“我怀疑...”）。"
-        "你最终输出的公开发言或行动决策，应该是简洁明了的、符合你角色的直接表达，不应包含你的内心分析过程。"
-    )
-    system_prompt_content_parts.append("在描述较为激烈的行动时，请使用委婉的说法，例如用“出局”、“淘汰”、“使其离开游戏”、“引导信息”等词语代替直接的负面词汇。")
-
-    if role == "平民":
-        system_prompt_content_parts.append("你的目标是找出所有“狼人伙伴”并将他们票选出局。你没有任何特殊能力，需要通过逻辑分析和听取他人发言来判断。")
-    elif role == "狼人":
-        system_prompt_content_parts.append("你的目标是逐步淘汰好人阵营的玩家（包括神职和平民），直到狼人数量达到或超过好人数量，或者所有神职或所有平民均已出局。")
-        system_prompt_content_parts.append("夜晚，你需要和你的狼队友一起商议，选择一位玩家使其在本回合结束时“出局”。白天你需要隐藏身份，混淆视听，争取不被票选出局。")
-    elif role == "预言家":
-        system_prompt_content_parts.append("你的目标是找出狼人并带领好人获胜。每晚你可以查验一名玩家的阵营（好人阵营或狼人阵营的成员）。白天你需要用你的信息引导好人。")
-    elif role == "女巫":
-        system_prompt_content_parts.append("你的目标是帮助好人获胜。你拥有一瓶【解药】，可以使一名当晚被狼人团队选择使其出局的玩家免于出局（只可使用一次）。")
-        system_prompt_content_parts.append("你也拥有一种特殊的【夜晚能力药剂】，可以选择一名玩家使其在当晚结束时出局（只可使用一次）。")
-        system_prompt_content_parts.append("【夜晚能力药剂】是你强大的武器，应该优先用于你高度怀疑是“狼人伙伴”的玩家，或者在关键时刻用于打破场上僵局以帮助好人阵营。请谨慎使用，避免误伤好人阵营的同伴。")
-        system_prompt_content_parts.append("【重要规则】：你【不能】在同一个夜晚同时使用解药和夜晚能力药剂。一旦使用其中一种，当晚便不能再使用另一种。")
-        has_save = player_info.get(game_config.WITCH_HAS_SAVE_POTION_KEY, False)
-        has_poison = player_info.get(game_config.WITCH_HAS_POISON_POTION_KEY, False)
-        system_prompt_content_parts.append(f"当前解药状态: {colorize('可用', Colors.GREEN) if has_save else colorize('已使用', Colors.RED)}。")
-        system_prompt_content_parts.append(f"当前夜晚能力药剂状态: {colorize('可用', Colors.GREEN) if has_poison else colorize('已使用', Colors.RED)}。")
-    elif role == "猎人":
-        system_prompt_content_parts.append("你的目标是帮助好人获胜。当你因为任何原因（被票选、被狼人团队选择、被女巫的特殊药剂选择）出局时，你可以选择场上任意一名其他存活玩家与你一同出局，除非你被女巫的特殊药剂明确阻止了此能力。此能力只能使用一次。")
-        can_shoot = player_info.get(game_config.HUNTER_CAN_SHOOT_KEY, True)
-        system_prompt_content_parts.append(f"当前特殊能力状态: {colorize('可用', Colors.GREEN) if can_shoot else colorize('已使用或被阻止', Colors.RED)}。")
 
-    full_system_content = "\n".join(system_prompt_content_parts)
-    system_wrapper_start = f"--- {colorize('系统指令与角色设定', Colors.BLUE + Colors.BOLD)} ---\n"
-    system_wrapper_end = f"\n--- {colorize('系统指令结束', Colors.BLUE + Colors.BOLD)} ---\n"
+def _build_action_turn_content(
+    game_state: GameState,
+    player_config_name: str,
+    action_type: str,
+    current_player_history: List[Dict[str, Any]],
+    action_specific_info: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    player_info = game_state.get_player_info(player_config_name)
+    if not player_info:
+        _log_prompt_event(f"错误: 无法为不存在的玩家 {colorize(player_config_name, Colors.YELLOW)} 生成prompt。", "ERROR", player_config_name)
+        return None
 
+    role = player_info["role"]
 
     # --- 2. 构建当前的 User Prompt 内容 ---
     current_action_user_prompt_parts = []
@@ -158,42 +303,31 @@ def generate_prompt_for_action(
         f"--- {colorize('当前游戏情境', Colors.YELLOW)}：第 {colorize(str(game_state.game_day), Colors.BOLD)} 天，阶段：{colorize(game_state.current_game_phase, Colors.BOLD)} ---"
     )
 
-    alive_players_display_colored = []
-    sorted_alive_players = sorted(
-        game_state.get_alive_players(),
-        key=lambda name: game_state.players_data[name]["player_number"]
-    )
-    for p_name in sorted_alive_players:
-        p_data_temp = game_state.get_player_info(p_name)
-        p_num = p_data_temp["player_number"]
-        
-        display_entry_base = f"玩家{p_num} ({p_name})"
-        display_entry_colored = player_name_color(display_entry_base, p_data_temp)
-
-        if p_name == player_config_name:
-            display_entry_colored += colorize(" [你]", Colors.GREEN + Colors.BOLD)
-        elif role == "狼人" and p_data_temp["role"] == "狼人":
-            display_entry_colored += colorize(" [狼队友]", Colors.RED + Colors.BOLD)
-        alive_players_display_colored.append(display_entry_colored)
-    current_action_user_prompt_parts.append(f"目前场上存活的玩家: {', '.join(alive_players_display_colored)}。")
-
-    if game_state.current_game_phase not in [game_config.PHASE_NIGHT_START, game_config.PHASE_GAME_SETUP, game_config.PHASE_START_GAME]:
-        night_deaths_display_colored = []
-        if game_state.last_night_events.get("final_deaths_this_night"):
-            for dead_p_name in game_state.last_night_events["final_deaths_this_night"]:
-                dead_p_data = game_state.get_player_info(dead_p_name)
-                night_deaths_display_colored.append(player_name_color(game_state.get_player_display_name(dead_p_name), dead_p_data))
-            current_action_user_prompt_parts.append(f"昨晚出局的玩家是: {colorize(', '.join(night_deaths_display_colored), Colors.RED)}。")
-        elif game_state.game_day > 0:
-             current_action_user_prompt_parts.append(colorize("昨晚平安无事，没有人出局。", Colors.GREEN))
+    context = get_player_prompt_context(game_state, player_config_name)
+    sorted_alive_players = context.sorted_alive_players(game_state)
+    current_action_user_prompt_parts.append(context.alive_players_line(game_state))
+    night_deaths_line = context.night_deaths_line(game_state)
+    if night_deaths_line:
+        current_action_user_prompt_parts.append(night_deaths_line)
+
+    if role == "女巫":
+        has_save = player_info.get(game_config.WITCH_HAS_SAVE_POTION_KEY, False)
+        has_poison = player_info.get(game_config.WITCH_HAS_POISON_POTION_KEY, False)
+        current_action_user_prompt_parts.append(f"当前解药状态: {colorize('可用', Colors.GREEN) if has_save else colorize('已使用', Colors.RED)}。")
+        current_action_user_prompt_parts.append(f"当前夜晚能力药剂状态: {colorize('可用', Colors.GREEN) if has_poison else colorize('已使用', Colors.RED)}。")
+    elif role == "猎人":
+        can_shoot = player_info.get(game_config.HUNTER_CAN_SHOOT_KEY, True)
+        current_action_user_prompt_parts.append(f"当前特殊能力状态: {colorize('可用', Colors.GREEN) if can_shoot else colorize('已使用或被阻止', Colors.RED)}。")
+
+    private_notes = _pending_private_notes(current_player_history)
+    if private_notes:
+        current_action_user_prompt_parts.append(f"\n--- {colorize('你私下获得的新信息', Colors.YELLOW)} ---")
+        current_action_user_prompt_parts.extend(f"  {note}" for note in private_notes)
 
     if action_type == game_config.ACTION_SPEECH or action_type == game_config.ACTION_VOTE:
         if game_state.round_speeches_log:
             current_action_user_prompt_parts.append(f"\n--- {colorize('本轮已进行的公开发言', Colors.YELLOW)} ---")
-            for speech_entry in game_state.round_speeches_log:
-                speaker_p_data = game_state.get_player_info(speech_entry["player"])
-                speaker_name_display_colored = player_name_color(game_state.get_player_display_name(speech_entry["player"]), speaker_p_data)
-                current_action_user_prompt_parts.append(f"  {speaker_name_display_colored}: \"{speech_entry['speech']}\"") # Speech content not colored here
+            current_action_user_prompt_parts.extend(context.speech_lines(game_state))
         else:
             if action_type == game_config.ACTION_SPEECH:
                 current_action_user_prompt_parts.append(colorize("你是本轮第一个发言。", Colors.CYAN))
@@ -226,11 +360,10 @@ def generate_prompt_for_action(
 
     elif action_type == game_config.ACTION_WOLF_NOMINATE:
         current_action_user_prompt_parts.append("你是狼人团队的一员。现在是狼人内部提名袭击目标的时间。")
-        alive_wolves_config_names = [name for name, data in game_state.players_data.items() if data["role"] == "狼人" and data["status"] == game_config.PLAYER_STATUS_ALIVE]
+        alive_wolves_config_names = game_state.get_players_by_role("狼人", alive_only=True)
         decision_maker_wolf_name = action_specific_info.get("decision_maker_name") if action_specific_info else None
         if not decision_maker_wolf_name and alive_wolves_config_names: # Fallback
-            sorted_wolves = sorted(alive_wolves_config_names, key=lambda n: game_state.players_data[n]["player_number"])
-            if sorted_wolves: decision_maker_wolf_name = sorted_wolves[-1]
+            decision_maker_wolf_name = alive_wolves_config_names[-1] # 已按编号排序
 
         wolf_team_display_colored = []
         for wolf_name in alive_wolves_config_names:
@@ -254,7 +387,7 @@ def generate_prompt_for_action(
 
     elif action_type == game_config.ACTION_WOLF_KILL:
         current_action_user_prompt_parts.append(f"你是狼人团队的【{colorize('决策者', Colors.BOLD + Colors.YELLOW)}】。现在你需要做出本回合最终的袭击决定。")
-        alive_wolves_config_names = [name for name, data in game_state.players_data.items() if data["role"] == "狼人" and data["status"] == game_config.PLAYER_STATUS_ALIVE]
+        alive_wolves_config_names = game_state.get_players_by_role("狼人", alive_only=True)
         wolf_team_display_colored = [] # (Similar logic as ACTION_WOLF_NOMINATE for displaying team)
         for wolf_name in alive_wolves_config_names:
             wolf_p_data = game_state.get_player_info(wolf_name)
@@ -350,63 +483,63 @@ def generate_prompt_for_action(
         current_action_user_prompt_parts.append("如果需要发言，请使用第一人称。如果需要做决策，请给出明确的决策结果。")
 
 
-    final_current_action_user_content = "\n".join(current_action_user_prompt_parts)
+    return "\n".join(current_action_user_prompt_parts)
 
-    # --- 3. 组合消息列表 ---
-    messages: List[Dict[str, str]] = []
-    normalized_history = _validate_and_normalize_history(current_player_history, player_config_name)
 
-    if not normalized_history:
-        user_content_with_system = system_wrapper_start + full_system_content + system_wrapper_end + final_current_action_user_content
-        messages.append({"role": "user", "content": user_content_with_system})
-    else:
-        temp_messages = []
-        system_prompt_prepended_to_history = False
-        for hist_msg in normalized_history:
-            if hist_msg["role"] == "user" and not system_prompt_prepended_to_history:
-                merged_content = system_wrapper_start + full_system_content + system_wrapper_end + \
-                                 f"--- {colorize('历史对话回顾', Colors.BLUE)} ---\n" + hist_msg["content"]
-                temp_messages.append({"role": "user", "content": merged_content})
-                system_prompt_prepended_to_history = True
-            elif hist_msg["role"] == "assistant":
-                if not temp_messages or temp_messages[-1]["role"] != "user":
-                    _log_prompt_event(f"修正历史：在assistant消息前补充占位user消息。", "DEBUG", player_config_name)
-                    temp_messages.append({"role": "user", "content": colorize("(之前的对话继续...)", Colors.BRIGHT_BLACK)})
-                temp_messages.append(hist_msg)
-            elif hist_msg["role"] == "user":
-                 temp_messages.append(hist_msg)
-        if not system_prompt_prepended_to_history and temp_messages:
-             _log_prompt_event(f"警告：历史记录在规范化后仍不以user开头，这不应发生。", "WARN", player_config_name)
-        messages.extend(temp_messages)
-        if not messages:
-            user_content_with_system = system_wrapper_start + full_system_content + system_wrapper_end + final_current_action_user_content
-            messages.append({"role": "user", "content": user_content_with_system})
-        elif messages[-1]["role"] == "assistant":
-            messages.append({"role": "user", "content": final_current_action_user_content})
-        elif messages[-1]["role"] == "user":
-             _log_prompt_event(f"历史最后是user，将当前新指令合并到最后一个user消息。", "DEBUG", player_config_name)
-             messages[-1]["content"] += f"\n\n--- {colorize('当前新指令', Colors.YELLOW + Colors.BOLD)} ---\n" + final_current_action_user_content
+def assemble_prompt_messages(
+    game_state: GameState,
+    player_config_name: str,
+    current_player_history: List[Dict[str, Any]],
+    new_turn_content: Optional[str] = None,
+    action_type: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """
+    组合 固定前缀 + 历史 + 当前回合。new_turn_content 为 None 时只重放历史
+    (用于GM要求重试：历史以GM的修正指示结尾，之前的回合和无效回答原样保留)。
+    """
+    with output_target(OUTPUT_TARGET_MODEL):
+        return _assemble_prompt_messages(game_state, player_config_name, current_player_history, new_turn_content, action_type)
+
+
+def _assemble_prompt_messages(
+    game_state: GameState,
+    player_config_name: str,
+    current_player_history: List[Dict[str, Any]],
+    new_turn_content: Optional[str],
+    action_type: Optional[str]
+) -> List[Dict[str, str]]:
+    player_info = game_state.get_player_info(player_config_name)
+    if not player_info:
+        _log_prompt_event(f"错误: 无法为不存在的玩家 {colorize(player_config_name, Colors.YELLOW)} 组合消息。", "ERROR", player_config_name)
+        return []
+    role = player_info["role"]
+    action_label = action_type or "retry"
+
+    context = get_player_prompt_context(game_state, player_config_name)
+    messages: List[Dict[str, str]] = [
+        {"role": "user", "content": context.system_block},
+        {"role": "assistant", "content": context.ack},
+    ]
+    messages.extend(context.history_messages(current_player_history))
+    if new_turn_content is not None:
+        if messages[-1]["role"] == "user":
+            _log_prompt_event(f"历史最后是user，将当前回合追加到最后一个user消息。", "DEBUG", player_config_name)
+            messages[-1] = {"role": "user", "content": messages[-1]["content"] + "\n\n" + new_turn_content}
         else:
-             _log_prompt_event(f"组合消息时出现意外的最后角色: {colorize(messages[-1]['role'], Colors.RED)}", "ERROR", player_config_name)
-             messages.append({"role": "user", "content": final_current_action_user_content})
+            messages.append({"role": "user", "content": new_turn_content})
 
     # --- 最后一步校验和日志 ---
-    if not messages or messages[0]["role"] != "user":
-        _log_prompt_event(f"严重错误: 生成的messages列表为空或不以user开始! Player: {colorize(player_config_name, Colors.YELLOW)}, Action: {colorize(action_type, Colors.RED)}", "CRITICAL")
-        return [{"role": "user", "content": system_wrapper_start + full_system_content + system_wrapper_end + \
-                                            "发生内部提示生成错误。请根据你的角色和当前已知情境行动。"}]
     if messages[-1]["role"] != "user":
-        _log_prompt_event(f"严重错误: 生成的messages列表不以user结束! Player: {colorize(player_config_name, Colors.YELLOW)}, Action: {colorize(action_type, Colors.RED)}", "CRITICAL")
+        _log_prompt_event(f"严重错误: 生成的messages列表不以user结束! Player: {colorize(player_config_name, Colors.YELLOW)}, Action: {colorize(action_label, Colors.RED)}", "CRITICAL")
         messages.append({"role": "user", "content": "（请根据以上信息行动，确保你的回复是针对此用户消息的。）"})
 
-    p_role_colored = role_color(role)
-    _log_prompt_event(f"为 {player_name_color(player_config_name, player_info)} ({p_role_colored}) 生成 {colorize(action_type, Colors.YELLOW)} 的Prompt。最终消息数: {len(messages)}", "DEBUG")
+    _log_prompt_event(lambda: f"为 {player_name_color(player_config_name, player_info)} ({role_color(role)}) 生成 {colorize(action_label, Colors.YELLOW)} 的Prompt。最终消息数: {len(messages)}", "DEBUG")
 
-    if True: # 调试时可以始终打印 (或者你可以添加一个全局开关)
-        _log_prompt_event(f"--- 为 {player_name_color(player_config_name, player_info)} 生成的最终消息列表 (Action: {colorize(action_type, Colors.YELLOW)}) ---", "TRACE")
+    if is_log_enabled("TRACE"): # 逐条预览很耗时，只在 TRACE 级别生成
+        _log_prompt_event(f"--- 为 {player_name_color(player_config_name, player_info)} 生成的最终消息列表 (Action: {colorize(action_label, Colors.YELLOW)}) ---", "TRACE")
         for i, msg in enumerate(messages):
             content_preview = str(msg.get('content',''))[:300] + ('...' if len(str(msg.get('content',''))) > 300 else '')
             msg_role_colored = colorize(msg.get('role','unknown').upper(), Colors.BOLD + (Colors.GREEN if msg.get('role') == 'user' else Colors.CYAN if msg.get('role') == 'assistant' else Colors.BLUE))
             _log_prompt_event(f"  MSG[{i+1}/{len(messages)}] Role: {msg_role_colored}\n      Content: {content_preview.replace(chr(10), chr(10)+'      ')}", "TRACE")
-            
-    return messages
\ No newline at end of file
+
+    return messages